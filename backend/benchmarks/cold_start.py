@@ -0,0 +1,104 @@
+"""
+Бенчмарк холодного старту: час від запуску процесу uvicorn до першої успішної
+відповіді GET /templates.
+
+Для порівняння той самий сервер запускається з примусовим імпортом openai, groq
+і python-docx до старту (так стартував воркер до лінивих імпортів).
+Окремо перевіряється, що `import main` не тягне жодного з цих SDK.
+
+Скрипт повертає код 1, якщо важкий SDK імпортується на старті або медіана
+перевищує --max-seconds, тож його можна ставити кроком у CI.
+
+Запуск (з папки backend):
+    python -m benchmarks.cold_start --runs 5 --max-seconds 3
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+HEAVY_SDKS = ("openai", "groq", "docx")
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVE = "import uvicorn; uvicorn.run('main:app', host='127.0.0.1', port={port}, log_level='warning')"
+EAGER_SERVE = "import openai, groq, docx; " + SERVE
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_first_request(code: str, timeout: float) -> float:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/templates"
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-c", code.format(port=port)],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"сервер завершився з кодом {proc.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError(f"немає відповіді від {url} за {timeout} с")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def heavy_modules_on_import() -> list:
+    code = f"import sys, json, main; print(json.dumps([m for m in {HEAVY_SDKS!r} if m in sys.modules]))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--max-seconds", type=float, default=None, help="поріг медіани для CI")
+    parser.add_argument("--no-compare", action="store_true", help="не міряти запуск з eager-імпортами")
+    args = parser.parse_args()
+
+    failed = False
+    loaded = heavy_modules_on_import()
+    if loaded:
+        print(f"FAIL: import main завантажує {', '.join(loaded)}")
+        failed = True
+    else:
+        print(f"import main не завантажує {', '.join(HEAVY_SDKS)}")
+
+    # Перший запуск прогріває файловий кеш ОС і створює БД — не рахуємо
+    time_to_first_request(SERVE, args.timeout)
+    lazy = [time_to_first_request(SERVE, args.timeout) for _ in range(args.runs)]
+    lazy_median = statistics.median(lazy)
+    print(f"Лінивий старт: медіана {lazy_median * 1000:.0f} ms, мін {min(lazy) * 1000:.0f} ms ({args.runs} запусків)")
+
+    if not args.no_compare:
+        eager = [time_to_first_request(EAGER_SERVE, args.timeout) for _ in range(args.runs)]
+        eager_median = statistics.median(eager)
+        print(f"Eager-імпорти: медіана {eager_median * 1000:.0f} ms"
+              f" (лінивий старт швидший на {(eager_median - lazy_median) * 1000:.0f} ms)")
+
+    if args.max_seconds is not None and lazy_median > args.max_seconds:
+        print(f"FAIL: медіана {lazy_median:.2f} с перевищує поріг {args.max_seconds} с")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Бенчмарк: серіалізація відповідей і JSON-колонок — стандартний шлях FastAPI
+(jsonable_encoder + json.dumps) vs fast_json (orjson).
+
+Корпус — відповіді start_session (схема шаблону + групи полів), submit_answer
+(усі відповіді сесії) і /templates. Схема синтезується на --fields полів,
+щоб імітувати великі шаблони. Для кожної відповіді перевіряється, що обидва
+шляхи дають однаковий JSON, і показується розмір після gzip.
+
+Запуск (з папки backend):
+    python -m benchmarks.json_responses --fields 200
+"""
+
+import argparse
+import gzip
+import json
+import time
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import fast_json
+import field_groups
+from benchmarks.render_engines import ANSWERS
+
+
+def build_payloads(fields: int, templates: int) -> dict:
+    schema = {f"FIELD_{i}_NAME": {"question": f"Вкажіть значення поля номер {i} для договору"} for i in range(fields)}
+    answers = dict(ANSWERS, **{f"field_{i}_name": f"Значення {i} — ТОВ «Епік Софт»" for i in range(fields)})
+    groups = field_groups.get_group_info("nadannya_poslug")
+    progress = {"filled": 16, "total": 16, "percent": 100, "current_group": None,
+                "current_group_index": 7, "groups_total": 7, "complete": True}
+    return {
+        "start_session": {
+            "session_id": "0b6f6a47-9a51-4a61-a5a6-4f1d6c1f1d7e",
+            "schema": schema,
+            "field_groups": groups,
+            "progress": progress,
+            "start_message": "Вітаю! Я ваш персональний помічник ДІЯ. 🇺🇦\n" + groups[0]["prompt"],
+        },
+        "submit_answer": {
+            "status": "updated",
+            "current_answers": answers,
+            "updated_fields": list(ANSWERS),
+            "progress": progress,
+        },
+        "templates": [
+            {"id": i, "name": f"Шаблон {i}", "code": f"template_{i}", "json_schema": schema,
+             "docx_path": f"storage/templates/template_{i}.docx", "created_at": datetime(2025, 1, 15, 12, 0)}
+            for i in range(templates)
+        ],
+    }
+
+
+def per_call(func, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fields", type=int, default=200)
+    parser.add_argument("--templates", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"Серіалізатор: {'orjson' if fast_json.orjson else 'json (orjson не встановлено)'}")
+    for label, payload in build_payloads(args.fields, args.templates).items():
+        default_body = JSONResponse(jsonable_encoder(payload)).body
+        fast_body = fast_json.FastJSONResponse(payload).body
+        if json.loads(default_body) != json.loads(fast_body):
+            raise AssertionError(f"{label}: різний JSON")
+
+        default_time = per_call(lambda: JSONResponse(jsonable_encoder(payload)).body, args.repeat)
+        fast_time = per_call(lambda: fast_json.FastJSONResponse(payload).body, args.repeat)
+        gzipped = len(gzip.compress(fast_body, fast_json.JSON_GZIP_LEVEL))
+        print(f"[{label}] {len(default_body) / 1024:.0f} KB -> {len(fast_body) / 1024:.0f} KB"
+              f" (gzip {gzipped / 1024:.0f} KB)")
+        print(f"  FastAPI default: {default_time * 1e6:8.0f} µs/запит")
+        print(f"  fast_json:       {fast_time * 1e6:8.0f} µs/запит  (x{default_time / fast_time:.1f},"
+              f" економія {(default_time - fast_time) * 1e6:.0f} µs)")
+
+    answers = build_payloads(args.fields, 0)["submit_answer"]["current_answers"]
+    raw = json.dumps(answers)
+    column_default = per_call(lambda: json.loads(json.dumps(answers)), args.repeat)
+    column_fast = per_call(lambda: fast_json.loads(fast_json.dumps(answers)), args.repeat)
+    print(f"[JSON-колонка answers, {len(raw) / 1024:.0f} KB] запис+читання:"
+          f" json {column_default * 1e6:.0f} µs, fast_json {column_fast * 1e6:.0f} µs"
+          f" (x{column_default / column_fast:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Бенчмарк: пошук плейсхолдерів через python-docx vs потоковий ooxml_scanner.
+
+Збирає великий шаблон (тіло nadannya_poslug.docx, повторене N разів ≈ N*4 сторінки)
+і порівнює час та пікову пам'ять обох підходів.
+
+Запуск (з папки backend):
+    python -m benchmarks.placeholder_scan --copies 25
+"""
+
+import argparse
+import copy
+import os
+import tempfile
+import time
+import tracemalloc
+
+from docx import Document
+
+import ooxml_scanner
+from templates_importer import extract_placeholders
+
+BASE_TEMPLATE = "storage/templates/nadannya_poslug.docx"
+
+
+def build_large_template(copies: int, path: str):
+    doc = Document(BASE_TEMPLATE)
+    body = doc.element.body
+    original = [el for el in body if not el.tag.endswith("}sectPr")]
+    sect_pr = body[-1]
+    for _ in range(copies - 1):
+        for el in original:
+            sect_pr.addprevious(copy.deepcopy(el))
+    doc.save(path)
+
+
+def keys_via_python_docx(path: str) -> set:
+    doc = Document(path)
+    keys = set()
+    for para in doc.paragraphs:
+        keys.update(extract_placeholders(para.text))
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                for para in cell.paragraphs:
+                    keys.update(extract_placeholders(para.text))
+    return keys
+
+
+def measure(func, path: str, repeat: int):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func(path)
+    elapsed = (time.perf_counter() - started) / repeat
+
+    # Пам'ять міряємо окремим прогоном: tracemalloc сильно сповільнює код
+    tracemalloc.start()
+    func(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--copies", type=int, default=25, help="скільки разів повторити тіло шаблону")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "large.docx")
+        build_large_template(args.copies, path)
+        print(f"Шаблон: {args.copies} копій, {os.path.getsize(path) / 1024:.0f} KB")
+
+        docx_keys, docx_time, docx_peak = measure(keys_via_python_docx, path, args.repeat)
+        scan_keys, scan_time, scan_peak = measure(ooxml_scanner.extract_keys, path, args.repeat)
+
+    # extract_keys бачить ще й колонтитули (їх заповнює рендер), тому ключів може бути більше, але не менше
+    missing = docx_keys - scan_keys
+    print(f"python-docx:   {docx_time * 1000:8.1f} ms, пік пам'яті {docx_peak / 1024 / 1024:6.1f} MB, ключів {len(docx_keys)}")
+    print(f"ooxml_scanner: {scan_time * 1000:8.1f} ms, пік пам'яті {scan_peak / 1024 / 1024:6.1f} MB, ключів {len(scan_keys)}")
+    print(f"Прискорення: x{docx_time / scan_time:.1f}")
+    if missing:
+        raise SystemExit(f"Сканер пропустив ключі: {sorted(missing)}")
+
+
+if __name__ == "__main__":
+    main()
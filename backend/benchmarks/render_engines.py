@@ -0,0 +1,140 @@
+"""
+Бенчмарк і перевірка: рендер через python-docx vs zip-рендер (ooxml_renderer).
+
+Корпус: вбудований шаблон, великий шаблон (тіло повторене N разів) і шаблон
+з великою кількістю картинок. Для кожного перевіряється, що обидва рушії дають
+однаковий вміст (document.xml — побайтово, інші XML — після канонікалізації,
+бінарні частини — побайтово), і міряється час та пікова пам'ять.
+
+Запуск (з папки backend):
+    python -m benchmarks.render_engines --images 20
+"""
+
+import argparse
+import io
+import os
+import struct
+import tempfile
+import time
+import tracemalloc
+import zipfile
+import zlib
+
+from docx import Document
+from docx.shared import Cm
+from lxml import etree
+
+import services
+import template_cache
+from benchmarks.placeholder_scan import BASE_TEMPLATE, build_large_template
+
+ANSWERS = {
+    "city": "Київ",
+    "enterprise": "ТОВ «Епік Софт»",
+    "date": "15.01.2025",
+    "full_name_customer": "Іванова Івана Івановича",
+    "full_name_performer": "Петров Петро Петрович",
+    "customer_phone_number": "+380991234567",
+    "performer_phone_number": "+380997654321",
+    "customer_edrpou": "12345678",
+    "performer_edrpou": "87654321",
+    "customer_iban": "UA123456789012345678901234567",
+    "performer_iban": "UA987654321098765432109876543",
+    "customer_postal_address_and_zip_code": "01001, м. Київ, вул. Хрещатик, 1",
+    "performer_postal_address_and_zip_code": "02000, м. Київ, вул. Шевченка, 10",
+    "date_act_signed": 15,
+    "money_transfer_deadline": 5,
+    "contract_validity_period": "1 рік",
+}
+
+
+def make_png(width: int, height: int) -> bytes:
+    """PNG з випадковим шумом — погано стискається, як справжні фото/скани."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    rows = b"".join(b"\x00" + os.urandom(width * 3) for _ in range(height))
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">2I5B", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows, 1))
+            + chunk(b"IEND", b""))
+
+
+def build_image_template(images: int, path: str):
+    doc = Document(BASE_TEMPLATE)
+    for _ in range(images):
+        doc.add_picture(io.BytesIO(make_png(600, 600)), width=Cm(5))
+    doc.save(path)
+
+
+def part_key(name: str, data: bytes):
+    if name == "[Content_Types].xml":
+        root = etree.fromstring(data)
+        return sorted((c.tag, sorted(c.attrib.items())) for c in root)
+    if name.endswith(".xml") or name.endswith(".rels"):
+        return etree.tostring(etree.fromstring(data), method="c14n")
+    return data
+
+
+def assert_same_content(expected_path: str, actual_path: str):
+    with zipfile.ZipFile(expected_path) as expected, zipfile.ZipFile(actual_path) as actual:
+        if actual.testzip() is not None:
+            raise AssertionError("пошкоджений архів")
+        if sorted(expected.namelist()) != sorted(actual.namelist()):
+            raise AssertionError("різний набір частин")
+        for name in expected.namelist():
+            a, b = expected.read(name), actual.read(name)
+            if name == "word/document.xml":
+                if a != b:
+                    raise AssertionError("document.xml відрізняється")
+            elif part_key(name, a) != part_key(name, b):
+                raise AssertionError(f"{name} відрізняється")
+
+
+def measure(engine: str, template: str, output: str, repeat: int):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        services.generate_contract_docx(template, ANSWERS, output, engine=engine)
+    elapsed = (time.perf_counter() - started) / repeat
+
+    tracemalloc.start()
+    services.generate_contract_docx(template, ANSWERS, output, engine=engine)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--copies", type=int, default=25)
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        large = os.path.join(tmp, "large.docx")
+        images = os.path.join(tmp, "images.docx")
+        build_large_template(args.copies, large)
+        build_image_template(args.images, images)
+        corpus = {"bundled": BASE_TEMPLATE, f"{args.copies} copies": large, f"{args.images} images": images}
+
+        for label, template in corpus.items():
+            docx_out = os.path.join(tmp, "docx.docx")
+            zip_out = os.path.join(tmp, "zip.docx")
+            docx_time, docx_peak = measure("python-docx", template, docx_out, args.repeat)
+            zip_time, zip_peak = measure("zip", template, zip_out, args.repeat)
+            assert_same_content(docx_out, zip_out)
+
+            size = os.path.getsize(template) / 1024
+            print(f"[{label}, {size:.0f} KB] вміст ідентичний")
+            print(f"  python-docx: {docx_time * 1000:8.1f} ms, пік {docx_peak / 1024 / 1024:6.1f} MB")
+            print(f"  zip:         {zip_time * 1000:8.1f} ms, пік {zip_peak / 1024 / 1024:6.1f} MB"
+                  f"  (x{docx_time / zip_time:.1f})")
+
+    stats = template_cache.cache.stats()
+    print(f"Кеш шаблонів: hit ratio {stats['hit_ratio']}, {stats['entries']} шаблонів, "
+          f"{stats['memory_bytes'] / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
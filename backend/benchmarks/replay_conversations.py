@@ -0,0 +1,252 @@
+"""
+Офлайн-відтворення записаних розмов (conversation_recorder) проти поточного коду.
+
+Кожна записана сесія проганяється через POST /session/{id}/turn у процесі (TestClient,
+окрема тимчасова БД). Замість провайдера LLM відповідають записані відповіді — по черзі
+для кожного ендпоінта (conversational_collect, clarify, review_mode). Промпти при цьому
+будує поточний код, тож зміни промптів видно в токенах, а зміни маршрутизації —
+у кількості викликів і в тому, чи розмова ще доходить до генерації.
+
+Звіт — записаний прогін проти відтворення:
+- викликів LLM на завершений договір;
+- токенів на завершений договір: промпти з обох боків рахуються одним лічильником
+  (tiktoken, якщо встановлений, інакше оцінка за довжиною) — у записі з записаних
+  запитів, при відтворенні з промптів поточного коду; відповідь — usage із запису;
+- наскрізна затримка на договір (усі ходи + генерація; з --llm-latency recorded
+  фейковий LLM "відповідає" із записаною затримкою);
+- викликів, для яких у записі не знайшлося відповіді, і невикористаних відповідей.
+
+Запуск (з папки backend):
+    python -m benchmarks.replay_conversations storage/recordings --llm-latency recorded
+    python -m benchmarks.replay_conversations storage/recordings --max-regression 10   # для CI
+"""
+
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import deque
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:  # pragma: no cover - необов'язкова залежність
+    _ENCODING = None
+
+# Відповідь на виклик, якого в записі немає (нова гілка маршрутизації)
+MISS_RESPONSES = {
+    "conversational_collect": json.dumps({"action": "chat", "message": ""}),
+    "review_mode": json.dumps({"action": "chat", "message": ""}),
+    "clarify": "",
+    "chat": "",
+}
+HISTORY_LIMIT = 20
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    # Грубо для суміші кирилиці й JSON: ~3 символи на токен
+    return max(1, len(text) // 3)
+
+
+def messages_tokens(messages: list) -> int:
+    return sum(count_tokens(m.get("content") or "") + 4 for m in messages)
+
+
+def load_recording(path: str) -> dict:
+    recording = {"path": path, "session": None, "template_code": None, "turns": [], "generate": None}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if event["type"] == "session":
+                recording["session"] = event["session"]
+                recording["template_code"] = event["template_code"]
+            elif event["type"] == "turn":
+                recording["turns"].append(event)
+            elif event["type"] == "generate":
+                recording["generate"] = event
+    return recording
+
+
+def recorded_metrics(recording: dict) -> dict:
+    calls = prompt = completion = 0
+    for turn in recording["turns"]:
+        for call in turn["llm_calls"]:
+            usage = call.get("usage") or {}
+            calls += 1
+            # Не usage провайдера: відтворення рахує промпти тим самим лічильником
+            prompt += messages_tokens(call["request"])
+            completion += usage.get("completion_tokens") or count_tokens(call["response"])
+    latency = sum(turn["elapsed"] for turn in recording["turns"])
+    if recording["generate"]:
+        latency += recording["generate"]["elapsed"]
+    return {"calls": calls, "tokens": prompt + completion, "prompt_tokens": prompt,
+            "completion_tokens": completion, "latency": latency,
+            "completed": recording["generate"] is not None, "misses": 0, "unused": 0}
+
+
+class ReplayLLM:
+    """Підміняє main.complete_chat: відповідає записаними відповідями по черзі для кожного ендпоінта."""
+
+    def __init__(self, recording: dict, use_latency: bool):
+        self.use_latency = use_latency
+        self.queues = {}
+        for turn in recording["turns"]:
+            for call in turn["llm_calls"]:
+                self.queues.setdefault(call["endpoint"], deque()).append(call)
+        self.calls = 0
+        self.misses = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def complete_chat(self, endpoint: str, session_id, messages: list, temperature: float,
+                      json_mode: bool = False) -> str:
+        self.calls += 1
+        self.prompt_tokens += messages_tokens(messages)
+        queue = self.queues.get(endpoint)
+        if not queue:
+            self.misses += 1
+            return MISS_RESPONSES.get(endpoint, "")
+        call = queue.popleft()
+        if self.use_latency:
+            time.sleep(call["latency"])
+        usage = call.get("usage") or {}
+        self.completion_tokens += usage.get("completion_tokens") or count_tokens(call["response"])
+        return call["response"]
+
+    @property
+    def unused(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+
+def replay(client, main, recording: dict, use_latency: bool) -> dict:
+    llm = ReplayLLM(recording, use_latency)
+    main.complete_chat = llm.complete_chat
+
+    started = time.perf_counter()
+    response = client.post("/start_session", params={"template_code": recording["template_code"]})
+    response.raise_for_status()
+    session_id = response.json()["session_id"]
+
+    history = []
+    completed = False
+    for turn in recording["turns"]:
+        # Історія — та, що надіслав клієнт у записі; для старих записів без неї — зібрана тут
+        chat_history = turn["chat_history"] if "chat_history" in turn else history[-HISTORY_LIMIT:]
+        data = client.post(f"/session/{session_id}/turn", json={
+            "user_message": turn["user_message"],
+            "chat_history": chat_history,
+        }).json()
+        history.append({"role": "user", "content": turn["user_message"]})
+        history.extend({"role": "assistant", "content": m["text"]} for m in data.get("messages", []) if m["type"] == "bot")
+        if data.get("phase") == "generate":
+            completed = client.post(f"/session/{session_id}/generate").status_code == 200
+            break
+    latency = time.perf_counter() - started
+
+    return {"calls": llm.calls, "tokens": llm.prompt_tokens + llm.completion_tokens,
+            "prompt_tokens": llm.prompt_tokens, "completion_tokens": llm.completion_tokens,
+            "latency": latency, "completed": completed, "misses": llm.misses, "unused": llm.unused}
+
+
+def summarize(results: list) -> dict:
+    completed = [r for r in results if r["completed"]]
+    per_contract = lambda key: sum(r[key] for r in results) / len(completed) if completed else float("nan")
+    return {
+        "sessions": len(results),
+        "completed": len(completed),
+        "calls_per_contract": per_contract("calls"),
+        "tokens_per_contract": per_contract("tokens"),
+        "latency_per_contract": statistics.mean(r["latency"] for r in completed) if completed else float("nan"),
+        "misses": sum(r["misses"] for r in results),
+        "unused": sum(r["unused"] for r in results),
+    }
+
+
+def prepare_environment(workdir: str):
+    """Окрема БД і сховище; без запису розмов і прогріву. Має бути до import main."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'replay.db')}"
+    os.environ["GENERATED_DIR"] = os.path.join(workdir, "generated")
+    os.environ["STARTUP_LOCK_PATH"] = os.path.join(workdir, ".startup.lock")
+    os.environ["CONVERSATION_RECORD_DIR"] = ""
+    os.environ["WARMUP_IMPORTS"] = "0"
+    os.environ.setdefault("CODEMIE_API_KEY", "replay")
+    # Відтворення йде без пауз між ходами — ліміт на сесію тут лише заважав би
+    os.environ["LLM_SESSION_BURST"] = "1000000"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("recordings", nargs="+", help="файли .jsonl або папки із записами")
+    parser.add_argument("--llm-latency", choices=("zero", "recorded"), default="zero")
+    parser.add_argument("--json", help="записати підсумок і результати по сесіях у файл")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="код 1, якщо викликів або токенів на договір більше, ніж у записі, на стільки %%")
+    args = parser.parse_args()
+
+    paths = []
+    for item in args.recordings:
+        paths.extend(sorted(glob.glob(os.path.join(item, "**", "*.jsonl"), recursive=True)) if os.path.isdir(item) else [item])
+    recordings = [r for r in map(load_recording, paths) if r["template_code"] and r["turns"]]
+    if not recordings:
+        print("Записів не знайдено.")
+        sys.exit(1)
+
+    workdir = tempfile.mkdtemp(prefix="replay-")
+    prepare_environment(workdir)
+    from fastapi.testclient import TestClient
+    import main as app_main
+
+    recorded, replayed = [], []
+    with TestClient(app_main.app) as client:
+        for recording in recordings:
+            before = recorded_metrics(recording)
+            after = replay(client, app_main, recording, args.llm_latency == "recorded")
+            recorded.append(before)
+            replayed.append(after)
+            status = "OK" if after["completed"] == before["completed"] else "CHANGED"
+            print(f"[{status}] {recording['session']} ({recording['template_code']}): "
+                  f"викликів {before['calls']} -> {after['calls']}, токенів {before['tokens']} -> {after['tokens']}, "
+                  f"договір {'так' if before['completed'] else 'ні'} -> {'так' if after['completed'] else 'ні'}"
+                  + (f", без запису {after['misses']}" if after["misses"] else ""))
+
+    base, new = summarize(recorded), summarize(replayed)
+    print(f"\nСесій: {base['sessions']}, завершених договорів: {base['completed']} -> {new['completed']}")
+    for label, key, fmt in (("Викликів LLM на договір", "calls_per_contract", "{:.2f}"),
+                            ("Токенів на договір", "tokens_per_contract", "{:.0f}"),
+                            ("Затримка на договір, с", "latency_per_contract", "{:.2f}")):
+        delta = (new[key] - base[key]) / base[key] * 100 if base[key] else float("nan")
+        print(f"  {label:<26} {fmt.format(base[key]):>10} -> {fmt.format(new[key]):>10}  ({delta:+.1f}%)")
+    print(f"  Викликів без записаної відповіді: {new['misses']}, невикористаних відповідей: {new['unused']}")
+    if _ENCODING is None:
+        print("  (tiktoken не встановлено — токени промптів оцінено за довжиною тексту)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"recorded": base, "replayed": new,
+                       "sessions": [{"path": r["path"], "recorded": b, "replayed": a}
+                                    for r, b, a in zip(recordings, recorded, replayed)]},
+                      f, ensure_ascii=False, indent=2)
+
+    failed = new["completed"] < base["completed"]
+    if args.max_regression is not None:
+        for key in ("calls_per_contract", "tokens_per_contract"):
+            if base[key] and (new[key] - base[key]) / base[key] * 100 > args.max_regression:
+                print(f"FAIL: {key} зріс більше ніж на {args.max_regression}%")
+                failed = True
+    if failed and new["completed"] < base["completed"]:
+        print("FAIL: менше розмов доходить до генерації договору")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
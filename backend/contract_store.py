@@ -0,0 +1,122 @@
+"""
+Контент-адресоване сховище згенерованих договорів.
+
+Кожен файл лежить за своїм sha256 (storage/generated/ab/abcd....docx), тому однакові
+документи зберігаються один раз, а повторне завантаження — це просто читання з диска.
+Один файл може належати кільком записам generated_contracts, тож видаляється він лише тоді,
+коли на його вміст не посилається жоден запис (remove_unreferenced, collect_garbage).
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import models
+
+GENERATED_DIR = os.getenv("GENERATED_DIR", "storage/generated")
+HASH_CHUNK = 1024 * 1024
+# Файл без запису молодший за це — можливо, його запис ще не закомічено (рендер щойно завершився)
+STORE_GC_GRACE_SECONDS = float(os.getenv("STORE_GC_GRACE_SECONDS", "3600"))
+
+
+def content_path(content_hash: str) -> str:
+    return os.path.join(GENERATED_DIR, content_hash[:2], f"{content_hash}.docx")
+
+
+def new_temp_path() -> str:
+    """Тимчасовий файл у тому ж розділі, що й сховище, щоб os.replace був атомарним."""
+    tmp_dir = os.path.join(GENERATED_DIR, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=".docx", dir=tmp_dir)
+    os.close(fd)
+    return path
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_file(tmp_path: str) -> tuple[str, str, int]:
+    """
+    Переносить готовий файл у сховище. Якщо такий вміст уже є — тимчасовий файл видаляється.
+    Повертає (content_hash, path, size).
+    """
+    content_hash = file_sha256(tmp_path)
+    path = content_path(content_hash)
+    size = os.path.getsize(tmp_path)
+
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    return content_hash, path, size
+
+
+def answers_fingerprint(template, answers: dict) -> str:
+    """Відбиток вхідних даних рендеру: шаблон (з mtime файлу) + відповіді."""
+    try:
+        template_mtime = os.path.getmtime(template.docx_path)
+    except OSError:
+        template_mtime = None
+    payload = {
+        "template": template.code,
+        "template_mtime": template_mtime,
+        "answers": answers or {},
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def remove_unreferenced(db, files) -> int:
+    """
+    Викликається після видалення записів (і commit): `files` — пари (content_hash, file_path)
+    видалених документів. Видаляє файли, на вміст яких більше не посилається жоден запис.
+    """
+    files = dict(files)
+    hashes = list(files)
+    still_used = set()
+    for start in range(0, len(hashes), 500):
+        still_used.update(content_hash for (content_hash,) in db.query(models.GeneratedContract.content_hash).filter(
+            models.GeneratedContract.content_hash.in_(hashes[start:start + 500])
+        ).distinct())
+    return sum(_remove(path) for content_hash, path in files.items() if content_hash not in still_used)
+
+
+def collect_garbage(db, grace_seconds: float = STORE_GC_GRACE_SECONDS) -> int:
+    """
+    Повний прохід по сховищу: видаляє файли, на які не посилається жоден запис
+    (напр. записи видалено раніше, ніж з'явилось прибирання файлів), і забуті тимчасові файли.
+    """
+    cutoff = time.time() - grace_seconds
+    stored = {}
+    removed = 0
+    for root, _, names in os.walk(GENERATED_DIR):
+        in_tmp = os.path.basename(root) == "tmp"
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            if in_tmp:
+                # Тимчасовий файл рендеру, який так і не перенесли у сховище
+                removed += _remove(path)
+            elif name.endswith(".docx"):
+                stored[os.path.splitext(name)[0]] = path
+    return removed + remove_unreferenced(db, stored.items())
+
+
+def _remove(path: str) -> int:
+    try:
+        os.remove(path)
+        return 1
+    except FileNotFoundError:
+        return 0
@@ -0,0 +1,232 @@
+"""
+Запис розмов для регресійних замірів вартості LLM (вмикається CONVERSATION_RECORD_DIR).
+
+Пишеться серверний цикл розмови (POST /session/{id}/turn і WebSocket-канал):
+на кожен хід — один рядок JSONL з повідомленням користувача (і хвостом історії,
+яку надіслав клієнт), усіма викликами LLM
+цього ходу (endpoint, запит, відповідь, usage, затримка) і результатом (фаза,
+оновлені поля, помилки валідації, час ходу). Генерація документа — окремий рядок.
+Файл на сесію: CONVERSATION_RECORD_DIR/<дата>/<псевдонім сесії>.jsonl.
+Відтворення — benchmarks/replay_conversations.py.
+
+Анонімізація (до запису на диск) потребує CONVERSATION_RECORD_SALT: без явно заданої солі
+запис вимкнений (випадкова сіль процесу давала б різні псевдоніми після кожного рестарту).
+- id сесії замінюється псевдонімом (HMAC-sha256 із сіллю);
+- значення полів, які LLM витягнув з повідомлень, замінюються сурогатами тієї ж форми:
+  кирилиця -> випадкова кирилиця того ж регістру, цифри -> випадкові цифри, латиниця,
+  пробіли і розділові знаки лишаються (тому IBAN "UA...", телефон, ЄДРПОУ проходять
+  ту саму валідацію). Та сама заміна застосовується до всього тексту сесії —
+  повідомлень, історії в промптах і відповідей LLM. Таблиця замін щоходу доповнюється
+  збереженими відповідями сесії, тож працює і після рестарту процесу;
+- e-mail і послідовності з 5+ цифр, що лишилися у вільному тексті, теж замінюються.
+Хід пишеться лише після його завершення, коли значення вже відомі.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+CONVERSATION_RECORD_DIR = os.getenv("CONVERSATION_RECORD_DIR", "")
+CONVERSATION_RECORD_SALT = os.getenv("CONVERSATION_RECORD_SALT", "").encode()
+
+# Скільки сесій тримати в пам'яті (таблиця замін, відкритий хід)
+MAX_TRACKED_SESSIONS = 2000
+# Скільки останніх повідомлень історії клієнта писати з ходом (промпти беруть не більше 10)
+RECORDED_HISTORY = 10
+
+_UA_UPPER = "АБВГҐДЕЄЖЗИІЇЙКЛМНОПРСТУФХЦЧШЩЬЮЯ"
+_UA_LOWER = _UA_UPPER.lower()
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_DIGIT_RUN = re.compile(r"\d[\d\s()-]{3,}\d")
+
+
+def _keystream(value: str, salt: bytes):
+    digest = hmac.new(salt, value.encode("utf-8"), hashlib.sha256).digest()
+    while True:
+        for byte in digest:
+            yield byte
+        digest = hashlib.sha256(digest).digest()
+
+
+def surrogate(value: str, salt: bytes) -> str:
+    """Детермінований (для тієї ж солі) сурогат тієї ж форми."""
+    keys = _keystream(value, salt)
+    out = []
+    for ch in value:
+        if ch.isdigit():
+            out.append(str(next(keys) % 10))
+        elif ch in _UA_UPPER:
+            out.append(_UA_UPPER[next(keys) % len(_UA_UPPER)])
+        elif ch in _UA_LOWER:
+            out.append(_UA_LOWER[next(keys) % len(_UA_LOWER)])
+        else:
+            out.append(ch)
+    return "".join(out)
+
+
+class _SessionRecord:
+    __slots__ = ("alias", "salt", "template_code", "replacements", "pending", "path")
+
+    def __init__(self, alias: str, salt: bytes, template_code: str):
+        self.alias = alias
+        self.salt = salt
+        self.template_code = template_code
+        self.replacements = {}   # оригінал -> сурогат
+        self.pending = None      # виклики LLM поточного ходу
+        self.path = None
+
+    def learn(self, fields):
+        if not isinstance(fields, dict):
+            return
+        for value in fields.values():
+            if not isinstance(value, str) or len(value.strip()) < 2 or value in self.replacements:
+                continue
+            replacement = surrogate(value, self.salt)
+            self.replacements[value] = replacement
+            # Валідатори нормалізують регістр (ПІБ, IBAN) — ці форми теж трапляються в історії
+            for variant, variant_replacement in ((value.title(), replacement.title()),
+                                                 (value.upper(), replacement.upper())):
+                self.replacements.setdefault(variant, variant_replacement)
+
+    def scrub(self, text: str) -> str:
+        for original in sorted(self.replacements, key=len, reverse=True):
+            if original in text:
+                text = text.replace(original, self.replacements[original])
+        text = _EMAIL.sub("user@example.com", text)
+        return _DIGIT_RUN.sub(lambda m: surrogate(m.group(0), self.salt), text)
+
+    def scrub_obj(self, obj):
+        if isinstance(obj, str):
+            return self.scrub(obj)
+        if isinstance(obj, dict):
+            return {k: self.scrub_obj(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [self.scrub_obj(v) for v in obj]
+        return obj
+
+
+class ConversationRecorder:
+    def __init__(self, directory: str, salt: bytes):
+        self.directory = directory
+        self.salt = salt
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        if directory and not salt:
+            print("WARNING:   CONVERSATION_RECORD_DIR задано без CONVERSATION_RECORD_SALT — розмови не записуються.")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory and self.salt)
+
+    def _session(self, session_id: str, template_code: str | None = None) -> _SessionRecord | None:
+        record = self._sessions.get(session_id)
+        if record is None and template_code is not None:
+            alias = hmac.new(self.salt, session_id.encode(), hashlib.sha256).hexdigest()[:16]
+            record = self._sessions[session_id] = _SessionRecord(alias, self.salt, template_code)
+            while len(self._sessions) > MAX_TRACKED_SESSIONS:
+                self._sessions.popitem(last=False)
+        if record is not None:
+            self._sessions.move_to_end(session_id)
+        return record
+
+    def begin_turn(self, session_id: str, template_code: str, answers: dict | None = None):
+        """
+        Відкриває хід. Хід, що впав з винятком, просто перезаписується наступним.
+        answers — збережені відповіді сесії: після рестарту або витіснення з пам'яті
+        таблиця замін будується з них, а не лише з того, що LLM витягне в цьому процесі.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            record = self._session(session_id, template_code)
+            record.learn(answers)
+            record.pending = []
+
+    def record_llm(self, session_id: str | None, endpoint: str, messages: list, response: str,
+                   usage, latency: float):
+        """Викликається з потоку LLM. Поза ходом (REST-ендпоінти окремих кроків) нічого не пише."""
+        if not self.enabled or not session_id:
+            return
+        with self._lock:
+            record = self._session(session_id)
+            if record is None or record.pending is None:
+                return
+            try:
+                parsed = json.loads(response)
+            except (TypeError, ValueError):
+                parsed = None
+            if isinstance(parsed, dict):
+                record.learn(parsed.get("fields"))
+                # Без \u-екранування, щоб заміни значень спрацювали і тут
+                response = json.dumps(parsed, ensure_ascii=False)
+            record.pending.append({
+                "endpoint": endpoint,
+                "request": messages,
+                "response": response,
+                "usage": {
+                    "prompt_tokens": getattr(usage, "prompt_tokens", None),
+                    "completion_tokens": getattr(usage, "completion_tokens", None),
+                } if usage is not None else None,
+                "latency": round(latency, 4),
+            })
+
+    def end_turn(self, session_id: str, user_message: str, chat_history: list, result: dict, elapsed: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            record = self._session(session_id)
+            if record is None or record.pending is None:
+                return
+            llm_calls, record.pending = record.pending, None
+            # Збережені (вже нормалізовані валідацією) відповіді сесії — теж персональні дані
+            record.learn(result.get("current_answers"))
+            event = {
+                "type": "turn",
+                "user_message": user_message,
+                "chat_history": [{"role": m.role, "content": m.content} for m in chat_history[-RECORDED_HISTORY:]],
+                "llm_calls": llm_calls,
+                "phase": result.get("phase"),
+                "updated_fields": result.get("updated_fields", []),
+                "validation_errors": result.get("validation_errors", []),
+                "elapsed": round(elapsed, 4),
+            }
+            self._write(record, event)
+
+    def record_generated(self, session_id: str, elapsed: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            record = self._session(session_id)
+            if record is not None:
+                self._write(record, {"type": "generate", "elapsed": round(elapsed, 4)})
+
+    def _write(self, record: _SessionRecord, event: dict):
+        """Під локом. Перший рядок файлу — заголовок сесії."""
+        try:
+            lines = []
+            if record.path is None:
+                day_dir = os.path.join(self.directory, datetime.now(timezone.utc).strftime("%Y-%m-%d"))
+                os.makedirs(day_dir, exist_ok=True)
+                record.path = os.path.join(day_dir, f"{record.alias}.jsonl")
+                lines.append({"type": "session", "session": record.alias, "template_code": record.template_code})
+            event = record.scrub_obj(event)
+            event["at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+            lines.append(event)
+            with open(record.path, "a", encoding="utf-8") as f:
+                for line in lines:
+                    f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"WARNING:   Не вдалося записати розмову {record.alias}: {e}")
+
+
+recorder = ConversationRecorder(CONVERSATION_RECORD_DIR, CONVERSATION_RECORD_SALT)
+
+begin_turn = recorder.begin_turn
+record_llm = recorder.record_llm
+end_turn = recorder.end_turn
+record_generated = recorder.record_generated
@@ -1,18 +1,55 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+import fast_json
+
 # --- ЗМІНА: Використовуємо SQLite (файл contracts.db створиться сам) ---
-SQLALCHEMY_DATABASE_URL = "sqlite:///./contracts.db"
+# DATABASE_URL — напр. окрема БД для офлайн-відтворення розмов (benchmarks/replay_conversations.py)
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./contracts.db")
+
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
 
 # connect_args={"check_same_thread": False} - це обов'язково для SQLite
+# JSON-колонки (answers, json_schema) (де)серіалізуються через orjson, якщо він є
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False, "timeout": 30} if IS_SQLITE else {},
+    json_serializer=fast_json.dumps, json_deserializer=fast_json.loads
 )
+
+# WAL: читачі в інших процесах (uvicorn --workers N) не блокуються записом
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragma(dbapi_connection, connection_record):
+    if not IS_SQLITE:
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+def ensure_schema():
+    """
+    Створює таблиці і дописує в уже існуючу базу нові колонки та індекси моделей.
+    Міграцій у проєкті немає, тому нові поля мають бути nullable або з default.
+    """
+    Base.metadata.create_all(bind=engine)
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -0,0 +1,88 @@
+"""
+Швидка JSON-серіалізація для відповідей API та JSON-колонок SQLAlchemy.
+
+Якщо встановлено orjson — використовується він, інакше стандартний json
+(поведінка та сама, лише повільніше). Великі відповіді додатково стискаються
+gzip (див. JSON_GZIP_MIN_SIZE і add_compression).
+"""
+
+import json
+import os
+from collections.abc import Mapping
+from datetime import date, datetime
+from enum import Enum
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES, GZipMiddleware
+
+import request_profiler
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Відповіді менші за цей розмір не стискаються; 0 — вимкнути стиснення
+JSON_GZIP_MIN_SIZE = int(os.getenv("JSON_GZIP_MIN_SIZE", "1024"))
+JSON_GZIP_LEVEL = int(os.getenv("JSON_GZIP_LEVEL", "6"))
+
+# .docx — це вже zip, а ще для нього потрібен Range по оригінальних байтах
+NOT_COMPRESSED_TYPES = DEFAULT_EXCLUDED_CONTENT_TYPES + (
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+)
+
+
+def _default(obj):
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(obj) -> bytes:
+        return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+    def dumps(obj) -> str:
+        return orjson.dumps(obj, default=_default, option=_OPTIONS).decode()
+
+    loads = orjson.loads
+else:
+    def dumps_bytes(obj) -> bytes:
+        return dumps(obj).encode()
+
+    def dumps(obj) -> str:
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":"))
+
+    loads = json.loads
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse на orjson. Якщо ендпоінт повертає її напряму, FastAPI пропускає
+    jsonable_encoder — а це основна частина часу для великих відповідей.
+    """
+
+    def render(self, content) -> bytes:
+        with request_profiler.phase("serialize"):
+            return dumps_bytes(content)
+
+
+def add_compression(app):
+    if JSON_GZIP_MIN_SIZE > 0:
+        app.add_middleware(
+            GZipMiddleware,
+            minimum_size=JSON_GZIP_MIN_SIZE,
+            compresslevel=JSON_GZIP_LEVEL,
+            exclude_content_types=NOT_COMPRESSED_TYPES,
+        )
@@ -3,8 +3,6 @@
 Замість жорстких промптів, AI отримує контекст і сам веде діалог.
 """
 
-from typing import Dict, List
-
 # Метадані для кожного поля
 FIELD_METADATA = {
     "city": {
@@ -89,46 +87,7 @@ FIELD_METADATA = {
     }
 }
 
-# Логічні групи для збору (щоб AI знав, що краще питати разом)
-FIELD_GROUPS_INFO: Dict[str, List[Dict]] = {
-    "nadannya_poslug": [
-        {
-            "name": "Базова інформація",
-            "fields": ["city", "enterprise", "date"],
-            "initial_prompt": "Спочатку кілька базових речей: у якому місті укладається договір, яка назва підприємства і дата укладення."
-        },
-        {
-            "name": "Імена",
-            "fields": ["full_name_customer", "full_name_performer"],
-            "initial_prompt": "Тепер мені потрібні повні імена: ПІБ замовника та ПІБ виконавця."
-        },
-        {
-            "name": "Телефони",
-            "fields": ["customer_phone_number", "performer_phone_number"],
-            "initial_prompt": "Номери телефонів замовника і виконавця."
-        },
-        {
-            "name": "Коди ЄДРПОУ",
-            "fields": ["customer_edrpou", "performer_edrpou"],
-            "initial_prompt": "Коди ЄДРПОУ замовника та виконавця."
-        },
-        {
-            "name": "Банківські реквізити",
-            "fields": ["customer_iban", "performer_iban"],
-            "initial_prompt": "IBAN замовника та IBAN виконавця."
-        },
-        {
-            "name": "Адреси",
-            "fields": ["customer_postal_address_and_zip_code", "performer_postal_address_and_zip_code"],
-            "initial_prompt": "Поштові адреси замовника та виконавця."
-        },
-        {
-            "name": "Умови договору",
-            "fields": ["date_act_signed", "money_transfer_deadline", "contract_validity_period"],
-            "initial_prompt": "Умови договору: до якого числа місяця підписується акт, скільки днів на перерахування грошей, та на який строк укладається договір."
-        }
-    ]
-}
+# Групи полів — у field_groups.FIELD_GROUPS, скомпільований реєстр — у field_registry
 
 def get_field_description(field_name: str) -> str:
     """Повертає опис поля для AI"""
@@ -144,11 +103,3 @@ def get_field_description(field_name: str) -> str:
         result += f" [Приклад: {example}]"
 
     return result
-
-def get_group_info(template_code: str) -> List[Dict]:
-    """Повертає інформацію про групи полів"""
-    return FIELD_GROUPS_INFO.get(template_code, [])
-
-def get_fields_context(field_names: List[str]) -> str:
-    """Створює контекст про поля для AI"""
-    return "\n".join([get_field_description(f) for f in field_names])
\ No newline at end of file
@@ -0,0 +1,264 @@
+"""
+Єдиний реєстр полів шаблонів.
+
+Джерела даних лишаються там, де їх редагують:
+- field_metadata.FIELD_METADATA — опис, призначення і приклад кожного поля;
+- field_groups.FIELD_GROUPS — порядок збору полів групами і тексти питань;
+- validation.TEMPLATE_REGISTRY — ручна pydantic-схема валідації шаблону; для решти
+  імпортованих шаблонів схема будується з назв плейсхолдерів (validation.get_schema_model).
+
+Тут вони один раз компілюються в незмінний CompiledTemplate на шаблон: кожне поле
+отримує свій біт, людську назву і готовий рядок для промпта, кожна група — маску,
+контекст полів і запасне питання. Запити лише читають готові рядки і словники.
+Розбіжності між джерелами (поле схеми, якого немає в групах, аліас замість ключа
+шаблону) виводяться як WARNING під час компіляції.
+"""
+
+import hashlib
+import os
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, Type
+
+from pydantic import BaseModel
+
+import field_groups
+import field_metadata
+import ooxml_scanner
+import request_profiler
+import validation
+
+# Шаблони без власних груп збираються за групами цього шаблону (як у /start_session)
+DEFAULT_GROUPS_CODE = "nadannya_poslug"
+
+# Поля, відомі з метаданих, — для назв полів поза групами шаблону (напр. з відповіді LLM)
+_HUMAN_NAMES: Mapping[str, str] = MappingProxyType({
+    key: meta.get("description", key) for key, meta in field_metadata.FIELD_METADATA.items()
+})
+_CONTEXT_LINES: Mapping[str, str] = MappingProxyType({
+    key: field_metadata.get_field_description(key) for key in field_metadata.FIELD_METADATA
+})
+
+
+def human_name(field: str) -> str:
+    return _HUMAN_NAMES.get(field, field)
+
+
+def context_line(field: str) -> str:
+    return _CONTEXT_LINES.get(field) or field_metadata.get_field_description(field)
+
+
+def fallback_question(human_names: Iterable[str]) -> str:
+    return f"\n\nБудь ласка, вкажіть: {', '.join(human_names)}?"
+
+
+@dataclass(frozen=True)
+class CompiledField:
+    name: str
+    bit: int
+    group_index: int
+    human_name: str
+    context_line: str  # "- key: опис (Призначення: ...) [Приклад: ...]"
+
+
+@dataclass(frozen=True)
+class CompiledGroup:
+    index: int
+    id: str
+    fields: tuple
+    mask: int
+    prompt: str
+    fields_context: str
+    fallback_question: str
+    info: Dict  # оригінальний словник з FIELD_GROUPS (prompt, extraction_hint...)
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    template_code: str
+    groups: tuple
+    fields: Mapping[str, CompiledField]
+    all_fields: tuple
+    all_mask: int
+    all_fields_context: str
+    bit_to_group: tuple   # номер біта -> індекс групи
+    schema: Type[BaseModel] | None
+    # Відбиток порядку полів: маска, збережена за іншим layout, означає інші поля
+    layout: str
+
+    def mask_for(self, fields: Iterable[str]) -> int:
+        mask = 0
+        for field in fields:
+            compiled = self.fields.get(field)
+            if compiled is not None:
+                mask |= 1 << compiled.bit
+        return mask
+
+    def next_group(self, filled_mask: int) -> CompiledGroup | None:
+        # Біти йдуть у порядку груп, тому "наступна група" = група найменшого незаповненого біта
+        missing = self.all_mask & ~filled_mask
+        if not missing:
+            return None
+        lowest_bit = (missing & -missing).bit_length() - 1
+        return self.groups[self.bit_to_group[lowest_bit]]
+
+    def missing_fields(self, group: CompiledGroup, filled_mask: int) -> List[str]:
+        return [f for f in group.fields if not filled_mask & (1 << self.fields[f].bit)]
+
+    def human_name(self, field: str) -> str:
+        compiled = self.fields.get(field)
+        return compiled.human_name if compiled else human_name(field)
+
+    def human_names(self, field_names: Iterable[str]) -> List[str]:
+        return [self.human_name(f) for f in field_names]
+
+    def fields_context(self, field_names: Iterable[str]) -> str:
+        lines = []
+        for field in field_names:
+            compiled = self.fields.get(field)
+            lines.append(compiled.context_line if compiled else context_line(field))
+        return "\n".join(lines)
+
+    def fallback_question(self, field_names: Iterable[str]) -> str:
+        return fallback_question(self.human_names(field_names))
+
+    def validate(self, answers: dict):
+        """(is_valid, errors) за схемою шаблону (ручною або авто-схемою з його полів)."""
+        with request_profiler.phase("validation"):
+            return validation.validate_with_schema(self.schema, answers)
+
+    def progress(self, filled_mask: int) -> Dict:
+        filled = (filled_mask & self.all_mask).bit_count()
+        total = len(self.all_fields)
+        next_group = self.next_group(filled_mask)
+        return {
+            "filled": filled,
+            "total": total,
+            "percent": round(filled * 100 / total) if total else 100,
+            "current_group": next_group.id if next_group else None,
+            "current_group_index": next_group.index if next_group else len(self.groups),
+            "groups_total": len(self.groups),
+            "complete": next_group is None,
+        }
+
+
+def _check_schema(template_code: str, schema: Type[BaseModel], fields: Mapping[str, CompiledField]):
+    for name, info in schema.model_fields.items():
+        if name not in fields:
+            print(f"WARNING:   Реєстр полів '{template_code}': поле схеми {name} не входить у жодну групу.")
+        if info.alias and info.alias != name:
+            print(f"WARNING:   Реєстр полів '{template_code}': поле {name} має аліас {info.alias}, "
+                  f"помилки валідації прийдуть під іншим ключем.")
+
+
+def mask_layout(all_fields: Iterable[str]) -> str:
+    """Біт поля = його позиція серед полів груп, тож зміна порядку або нове поле в field_groups змінюють layout."""
+    return hashlib.sha256("\n".join(all_fields).encode("utf-8")).hexdigest()[:16]
+
+
+def compile_template(template_code: str, groups: List[Dict], schema: Type[BaseModel] | None) -> CompiledTemplate:
+    fields = {}
+    bit_to_group = []
+    compiled_groups = []
+
+    for index, group in enumerate(groups):
+        mask = 0
+        for field in group["fields"]:
+            if field not in fields:
+                fields[field] = CompiledField(
+                    name=field,
+                    bit=len(bit_to_group),
+                    group_index=index,
+                    human_name=human_name(field),
+                    context_line=context_line(field),
+                )
+                bit_to_group.append(index)
+            mask |= 1 << fields[field].bit
+        compiled_groups.append(CompiledGroup(
+            index=index,
+            id=group["id"],
+            fields=tuple(group["fields"]),
+            mask=mask,
+            prompt=group.get("prompt") or group.get("initial_prompt", ""),
+            fields_context="\n".join(fields[f].context_line for f in group["fields"]),
+            fallback_question=fallback_question(fields[f].human_name for f in group["fields"]),
+            info=group,
+        ))
+
+    if schema is not None and schema is validation.TEMPLATE_REGISTRY.get(template_code):
+        _check_schema(template_code, schema, fields)
+
+    all_fields = tuple(fields)
+    return CompiledTemplate(
+        template_code=template_code,
+        groups=tuple(compiled_groups),
+        fields=MappingProxyType(fields),
+        all_fields=all_fields,
+        all_mask=(1 << len(all_fields)) - 1,
+        all_fields_context="\n".join(fields[f].context_line for f in all_fields),
+        bit_to_group=tuple(bit_to_group),
+        schema=schema,
+        layout=mask_layout(all_fields),
+    )
+
+
+_COMPILED: Dict[str, CompiledTemplate] = {}
+# Поля імпортованих шаблонів (код -> імена плейсхолдерів), з них будується авто-схема валідації
+_TEMPLATE_FIELDS: Dict[str, tuple] = {}
+# Код -> відбиток джерела полів (json_schema або .docx), з якого їх зареєстровано
+_TEMPLATE_SOURCES: Dict[str, str] = {}
+
+
+def template_source(json_schema: dict | None, docx_path: str | None = None) -> str:
+    """Змінюється, коли змінились ключі json_schema або (для порожньої схеми) сам .docx."""
+    if json_schema:
+        return validation.schema_hash(json_schema)
+    try:
+        return f"{docx_path}:{os.stat(docx_path).st_mtime_ns}" if docx_path else ""
+    except OSError:
+        return f"{docx_path}:missing"
+
+
+def template_field_names(json_schema: dict | None, docx_path: str | None = None) -> tuple:
+    names = list(json_schema or ())
+    if not names and docx_path and os.path.exists(docx_path):
+        # Без GROQ_API_KEY схема при імпорті порожня — беремо плейсхолдери прямо з .docx
+        names = ooxml_scanner.extract_keys(docx_path)
+    # Відповіді зберігаються з ключами в нижньому регістрі (див. apply_answers)
+    return tuple(sorted({name.lower() for name in names}))
+
+
+def register_template(template_code: str, json_schema: dict | None, docx_path: str | None = None):
+    """Запам'ятовує поля шаблону. Якщо вони змінились — шаблон перекомпілюється при наступному get_template."""
+    _TEMPLATE_SOURCES[template_code] = template_source(json_schema, docx_path)
+    names = template_field_names(json_schema, docx_path)
+    if _TEMPLATE_FIELDS.get(template_code) != names:
+        _TEMPLATE_FIELDS[template_code] = names
+        _COMPILED.pop(template_code, None)
+
+
+def ensure_registered(template):
+    """
+    Хеш ключів схеми на кожен хід; повна реєстрація — тільки для шаблону, який інший процес
+    імпортував або переімпортував з іншими полями.
+    """
+    if _TEMPLATE_SOURCES.get(template.code) != template_source(template.json_schema, template.docx_path):
+        register_template(template.code, template.json_schema, template.docx_path)
+
+
+def has_own_groups(template_code: str) -> bool:
+    return bool(field_groups.get_field_groups(template_code))
+
+
+def get_template(template_code: str) -> CompiledTemplate:
+    """
+    Скомпільований шаблон (компілюється один раз на процес).
+    Якщо своїх груп немає — групи DEFAULT_GROUPS_CODE, валідація — за власною схемою шаблону
+    (ручною або побудованою з полів, переданих у register_template).
+    """
+    compiled = _COMPILED.get(template_code)
+    if compiled is None:
+        groups = field_groups.get_field_groups(template_code) or field_groups.get_field_groups(DEFAULT_GROUPS_CODE)
+        schema = validation.get_schema_model(template_code, _TEMPLATE_FIELDS.get(template_code, ()))
+        compiled = _COMPILED.setdefault(template_code, compile_template(template_code, groups, schema))
+    return compiled
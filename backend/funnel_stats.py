@@ -0,0 +1,131 @@
+"""
+Воронка заповнення договорів: started -> group:<id> -> review -> generated.
+
+Лічильники оновлюються інкрементально в тій самій транзакції, що й зміна сесії
+(start_session, apply_answers, generate), тому /admin/stats читає лише маленьку
+таблицю funnel_daily_stats і не сканує contract_sessions чи JSON answers.
+
+Кожен крок рахується один раз на сесію: група — коли її маска вперше стала повною,
+review — коли вперше заповнені всі поля, generated — перехід зі статусу draft.
+
++1 — одним upsert-ом для SQLite, PostgreSQL і MySQL; для інших БД — UPDATE, а якщо
+рядка ще немає — INSERT у savepoint (конкурентний INSERT іншого процесу -> знову UPDATE).
+"""
+
+from datetime import date
+
+from sqlalchemy import update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+import models
+
+STEP_STARTED = "started"
+STEP_REVIEW = "review"
+STEP_GENERATED = "generated"
+GROUP_STEP_PREFIX = "group:"
+
+
+def group_step(group_id: str) -> str:
+    return GROUP_STEP_PREFIX + group_id
+
+
+def progress_steps(compiled, old_bits: int, new_bits: int) -> list[str]:
+    """Кроки, які сесія пройшла при переході масок old_bits -> new_bits."""
+    steps = [
+        group_step(group.id)
+        for group in compiled.groups
+        if new_bits & group.mask == group.mask and old_bits & group.mask != group.mask
+    ]
+    all_mask = compiled.all_mask
+    if new_bits & all_mask == all_mask and old_bits & all_mask != all_mask:
+        steps.append(STEP_REVIEW)
+    return steps
+
+
+def record(db, template_code: str, *steps: str, day: date | None = None):
+    """
+    Додає +1 до кожного кроку за день (UTC). Не комітить — лічильник потрапляє
+    в ту саму транзакцію, що й зміна сесії.
+    """
+    if not steps:
+        return
+    day = day or models.utcnow().date()
+    increment = _INCREMENTS.get(db.get_bind().dialect.name, _update_then_insert)
+    for step in steps:
+        increment(db, models.FunnelDailyStat.__table__, {"template_code": template_code, "day": day, "step": step})
+
+
+def _on_conflict_upsert(insert):
+    def increment(db, table, key: dict):
+        stmt = insert(table).values(**key, count=1)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=list(key),
+            set_={"count": table.c.count + 1}
+        ))
+    return increment
+
+
+def _mysql_upsert(db, table, key: dict):
+    stmt = mysql.insert(table).values(**key, count=1)
+    db.execute(stmt.on_duplicate_key_update(count=table.c.count + 1))
+
+
+def _update_then_insert(db, table, key: dict):
+    where = [table.c[name] == value for name, value in key.items()]
+    increment = update(table).where(*where).values(count=table.c.count + 1)
+    if db.execute(increment).rowcount:
+        return
+    try:
+        with db.begin_nested():
+            db.execute(table.insert().values(**key, count=1))
+    except IntegrityError:
+        # Рядок щойно вставив інший процес
+        db.execute(increment)
+
+
+_INCREMENTS = {
+    "sqlite": _on_conflict_upsert(sqlite.insert),
+    "postgresql": _on_conflict_upsert(postgresql.insert),
+    "mysql": _mysql_upsert,
+    "mariadb": _mysql_upsert,
+}
+
+
+def daily_stats(db, template_code: str | None = None, date_from: date | None = None,
+                date_to: date | None = None, groups_for=None) -> list[dict]:
+    """
+    Рядок на (шаблон, день), від нових днів до старих.
+    `groups_for(template_code)` повертає скомпільовані групи — щоб показати їх у порядку
+    анкети, в т.ч. з нулями.
+    """
+    S = models.FunnelDailyStat
+    query = db.query(S.template_code, S.day, S.step, S.count)
+    if template_code is not None:
+        query = query.filter(S.template_code == template_code)
+    if date_from is not None:
+        query = query.filter(S.day >= date_from)
+    if date_to is not None:
+        query = query.filter(S.day <= date_to)
+
+    rows = {}
+    for code, day, step, count in query:
+        rows.setdefault((code, day), {})[step] = count
+
+    result = []
+    for (code, day), counts in sorted(rows.items(), key=lambda item: (item[0][1], item[0][0]), reverse=True):
+        compiled = groups_for(code) if groups_for else None
+        group_ids = [g.id for g in compiled.groups] if compiled else sorted(
+            step[len(GROUP_STEP_PREFIX):] for step in counts if step.startswith(GROUP_STEP_PREFIX)
+        )
+        started = counts.get(STEP_STARTED, 0)
+        result.append({
+            "template_code": code,
+            "day": day.isoformat(),
+            "started": started,
+            "groups": {group_id: counts.get(group_step(group_id), 0) for group_id in group_ids},
+            "review": counts.get(STEP_REVIEW, 0),
+            "generated": counts.get(STEP_GENERATED, 0),
+            "conversion_percent": round(counts.get(STEP_GENERATED, 0) * 100 / started) if started else None,
+        })
+    return result
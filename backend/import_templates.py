@@ -0,0 +1,275 @@
+"""
+Масовий імпорт і перевірка бібліотеки шаблонів без перезапуску сервера.
+
+run_auto_import на старті сервера підходить для кількох нових файлів; сотні шаблонів
+за раз імпортуються цією командою:
+
+1. Сканування — .docx розбираються паралельно в пулі процесів (ooxml_scanner):
+   плейсхолдери з місцями, де вони стоять, і биті ключі.
+2. Питання до слотів — через Groq, кілька запитів одночасно, з пріоритетом BACKGROUND
+   у llm_scheduler. Однаковий ключ у різних шаблонах питаємо один раз.
+3. Запис — усі нові шаблони (крім тих, де є биті ключі) однією транзакцією, під тим
+   самим локом, що й старт сервера: або з'являються всі, або жоден. Шлях до .docx
+   зберігається абсолютним (сервер працює з іншої папки), після запису поля шаблонів
+   реєструються й компілюються в field_registry — так само, як на старті сервера.
+
+Назви — з manifest.json у папці шаблонів (див. templates_importer.load_manifest).
+Звіт — по кожному шаблону: плейсхолдери, поля без опису в field_metadata, поля, про які
+розмова не спитає (немає в групах, за якими шаблон збиратиметься), биті ключі, таймінги.
+Плейсхолдери у виносках і коментарях рендер не підставляє — вони не стають полями
+і показуються окремо (not_rendered).
+Для шаблонів, які вже є в БД, — розбіжність полів файлу з полями в БД (статус changed):
+такий шаблон не перезаписується, але валідується і збирається за старими полями.
+
+--verify нічого не пише і не ходить у LLM — лише сканує і звітує (напр. у CI для бібліотеки).
+Код виходу 1, якщо якийсь файл не розібрався, є биті ключі або запис не вдався.
+
+Запуск (з папки backend; інша БД — через DATABASE_URL):
+    python import_templates.py storage/templates --verify
+    python import_templates.py /path/to/library --workers 8 --llm-concurrency 8 --json report.json
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import field_groups
+import field_metadata
+import field_registry
+import ooxml_scanner
+import templates_importer
+
+# Ключ, з якого вийде поле відповіді (нижній регістр) і поле авто-схеми валідації
+VALID_KEY_RE = re.compile(r"^[A-Za-z][A-Za-z0-9_]*$")
+
+
+def scan_template(path: str) -> dict:
+    """Виконується в процесі пулу."""
+    started = time.perf_counter()
+    result = {"path": path, "code": os.path.splitext(os.path.basename(path))[0], "placeholders": {},
+              "not_rendered": [], "error": None}
+    try:
+        found = ooxml_scanner.scan_placeholders(path)
+        rendered = ooxml_scanner.rendered_keys(found)
+        result["placeholders"] = {key: len(places) for key, places in found.items() if key in rendered}
+        result["not_rendered"] = sorted(set(found) - rendered)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["scan_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def scan_all(paths: list, workers: int) -> list:
+    if workers <= 1 or len(paths) < 2:
+        return [scan_template(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+        return list(pool.map(scan_template, paths, chunksize=max(1, len(paths) // (workers * 4))))
+
+
+def check_fields(code: str, keys) -> dict:
+    # Шаблон без власних груп збирається за чужими групами (див. field_registry.get_template)
+    groups = field_groups.get_field_groups(code) or field_groups.get_field_groups(field_registry.DEFAULT_GROUPS_CODE)
+    collected = {field for group in groups for field in group["fields"]}
+    fields = {key.lower() for key in keys if VALID_KEY_RE.match(key)}
+    return {
+        "invalid_keys": sorted(key for key in keys if not VALID_KEY_RE.match(key)),
+        "unknown_fields": sorted(fields - set(field_metadata.FIELD_METADATA)),
+        "not_collected": sorted(fields - collected),
+    }
+
+
+def existing_fields(codes) -> dict:
+    """
+    {код: поля шаблону в БД} для вже імпортованих кодів. Шаблон із порожньою json_schema
+    бере поля з самого .docx, тож розбіжність можлива лише для схем, згенерованих LLM.
+    """
+    from sqlalchemy.exc import OperationalError
+
+    import database
+    import models
+
+    with database.SessionLocal() as db:
+        try:
+            rows = db.query(
+                models.ContractTemplate.code, models.ContractTemplate.json_schema, models.ContractTemplate.docx_path
+            ).filter(models.ContractTemplate.code.in_(codes)).all()
+        except OperationalError:
+            # Порожня БД без таблиць — --verify її не створює
+            return {}
+    return {code: field_registry.template_field_names(json_schema, docx_path) for code, json_schema, docx_path in rows}
+
+
+def fields_drift(file_keys, db_fields) -> dict:
+    fields = set(field_registry.template_field_names(file_keys))
+    return {
+        "added_fields": sorted(fields - set(db_fields)),
+        "removed_fields": sorted(set(db_fields) - fields),
+    }
+
+
+def write_templates(templates: list) -> str | None:
+    """Одна транзакція на всі шаблони. Повертає текст помилки або None."""
+    from sqlalchemy.exc import IntegrityError
+
+    import database
+    import models
+    import startup
+
+    with startup.file_lock(startup.STARTUP_LOCK_PATH):
+        database.ensure_schema()
+        with database.SessionLocal() as db:
+            db.add_all(models.ContractTemplate(**template) for template in templates)
+            try:
+                db.commit()
+            except IntegrityError as e:
+                db.rollback()
+                return f"конфлікт кодів (шаблони вже додано іншим процесом?): {e.orig}"
+    return None
+
+
+def register_templates(templates: list) -> dict:
+    """Після запису: реєструє й компілює поля, як load_field_registry на старті. {код: помилка}."""
+    errors = {}
+    for template in templates:
+        try:
+            field_registry.register_template(template["code"], template["json_schema"], template["docx_path"])
+            field_registry.get_template(template["code"])
+        except Exception as e:
+            errors[template["code"]] = f"реєстр полів: {type(e).__name__}: {e}"
+    return errors
+
+
+def print_report(report: dict):
+    for item in report["templates"]:
+        status = item["status"].upper()
+        print(f"[{status}] {item['code']} — {item['name']}"
+              + ("" if item["name_from_manifest"] else " (назви немає в маніфесті)"))
+        if item["error"]:
+            print(f"    помилка: {item['error']}")
+            continue
+        print(f"    плейсхолдерів: {len(item['placeholders'])} (входжень {sum(item['placeholders'].values())}), "
+              f"скан {item['scan_ms']:.0f} ms")
+        for label, key in (("биті ключі", "invalid_keys"),
+                           ("без опису в field_metadata", "unknown_fields"),
+                           ("розмова не спитає", "not_collected"),
+                           ("не підставляються (виноски, коментарі)", "not_rendered"),
+                           ("нові поля (у БД їх немає)", "added_fields"),
+                           ("прибрані поля (у БД ще є)", "removed_fields")):
+            if item.get(key):
+                print(f"    {label}: {', '.join(item[key])}")
+
+    summary = report["summary"]
+    print(f"\nШаблонів: {summary['templates']}, нових: {summary['new']}, вже в БД: {summary['existing']} "
+          f"(поля змінились: {summary['changed']}), з помилками: {summary['errors']}")
+    if report["manifest_without_file"]:
+        print(f"У маніфесті без файлу: {', '.join(report['manifest_without_file'])}")
+    timings = report["timings"]
+    print(f"Час: скан {timings['scan_s']:.2f} с, питання LLM {timings['llm_s']:.2f} с "
+          f"({summary['llm_keys']} ключів), запис {timings['db_s']:.2f} с, усього {timings['total_s']:.2f} с")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("folder", nargs="?", default=templates_importer.TEMPLATES_DIR)
+    parser.add_argument("--manifest", help=f"файл назв (за замовчуванням <folder>/{templates_importer.MANIFEST_NAME})")
+    parser.add_argument("--verify", action="store_true", help="лише сканувати і звітувати, без LLM і запису в БД")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="процесів для сканування")
+    parser.add_argument("--llm-concurrency", type=int, default=templates_importer.IMPORT_LLM_CONCURRENCY)
+    parser.add_argument("--json", help="записати звіт у файл")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    paths = sorted(os.path.join(args.folder, f) for f in os.listdir(args.folder) if f.endswith(".docx"))
+    manifest = templates_importer.load_manifest(args.folder, args.manifest)
+
+    scan_started = time.perf_counter()
+    scanned = scan_all(paths, args.workers)
+    scan_s = time.perf_counter() - scan_started
+
+    existing = {} if not scanned else existing_fields([item["code"] for item in scanned])
+    templates = []
+    for item in scanned:
+        item["name"] = templates_importer.template_display_name(item["code"], manifest)
+        item["name_from_manifest"] = item["code"] in manifest
+        item.update(check_fields(item["code"], item["placeholders"]))
+        if item["error"]:
+            item["status"] = "error"
+        elif item["invalid_keys"]:
+            # Такий ключ не стане полем відповіді — шаблон спершу треба виправити
+            item["status"] = "invalid"
+        elif item["code"] in existing:
+            item.update(fields_drift(item["placeholders"], existing[item["code"]]))
+            item["status"] = "changed" if item["added_fields"] or item["removed_fields"] else "exists"
+        else:
+            item["status"] = "new"
+        templates.append(item)
+    new = [item for item in templates if item["status"] == "new"]
+
+    # Питання до слотів — одним пулом потоків на всі нові шаблони
+    llm_s = 0.0
+    questions = {}
+    llm_keys = {key for item in new for key in item["placeholders"] if VALID_KEY_RE.match(key)}
+    if not args.verify and llm_keys:
+        client = templates_importer.get_groq_client()
+        if client is None:
+            print("⚠️ SKIPPING AI GENERATION: No GROQ_API_KEY found in .env")
+        else:
+            llm_started = time.perf_counter()
+            questions = templates_importer.generate_slot_questions(client, llm_keys, args.llm_concurrency)
+            llm_s = time.perf_counter() - llm_started
+
+    db_s = 0.0
+    write_error = None
+    if not args.verify and new:
+        db_started = time.perf_counter()
+        rows = [{
+            "name": item["name"],
+            "code": item["code"],
+            # Без ключа схема порожня — як і в run_auto_import (поля тоді беруться з .docx)
+            "json_schema": {key: questions[key] for key in item["placeholders"] if key in questions},
+            # Відносний шлях рахувався б від папки сервера, а не від місця запуску команди
+            "docx_path": os.path.abspath(item["path"]),
+        } for item in new]
+        write_error = write_templates(rows)
+        db_s = time.perf_counter() - db_started
+        if write_error:
+            for item in new:
+                item["status"] = "error"
+                item["error"] = write_error
+        else:
+            registry_errors = register_templates(rows)
+            for item in new:
+                item["status"] = "error" if item["code"] in registry_errors else "imported"
+                item["error"] = registry_errors.get(item["code"])
+
+    report = {
+        "folder": args.folder,
+        "verify": args.verify,
+        "templates": templates,
+        "manifest_without_file": sorted(set(manifest) - {item["code"] for item in templates}),
+        "summary": {
+            "templates": len(templates),
+            "new": len(new),
+            "existing": sum(1 for item in templates if item["status"] in ("exists", "changed")),
+            "changed": sum(1 for item in templates if item["status"] == "changed"),
+            "errors": sum(1 for item in templates if item["status"] in ("error", "invalid")),
+            "llm_keys": len(questions),
+        },
+        "timings": {"scan_s": scan_s, "llm_s": llm_s, "db_s": db_s, "total_s": time.perf_counter() - started},
+    }
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    failed = write_error or any(item["error"] or item["invalid_keys"] for item in templates)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
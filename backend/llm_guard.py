@@ -0,0 +1,271 @@
+"""
+Захист викликів LLM: бюджет затримки для кожного ендпоінта + запобіжник (circuit breaker).
+
+Якщо провайдер відповідає довше за бюджет — одразу віддаємо заготовлену відповідь,
+а виклик дозавершується у фоні. Якщо провайдер масово падає або гальмує — запобіжник
+розмикається і ми взагалі не ходимо в LLM ("режим форми"), періодично пробуючи
+один пробний запит, щоб відновитися.
+
+Перед викликом береться слот у llm_scheduler (пріоритет за ендпоінтом, ліміт на сесію);
+час у черзі входить у бюджет затримки. Запобіжник перевіряється раніше: у режимі форми
+запит не займає ні місця в черзі, ні токена ліміту сесії. stream_with_budget — те саме для потокових
+відповідей (WebSocket-канал сесії), бюджет там рахується до першого токена.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+
+import llm_scheduler
+import request_profiler
+
+# Бюджет затримки (секунди) для кожного ендпоінта
+LATENCY_BUDGETS = {
+    "review_mode": float(os.getenv("LLM_BUDGET_REVIEW_MODE", "8")),
+    "chat": float(os.getenv("LLM_BUDGET_CHAT", "12")),
+    "clarify": float(os.getenv("LLM_BUDGET_CLARIFY", "4")),
+    "conversational_collect": float(os.getenv("LLM_BUDGET_COLLECT", "8")),
+}
+DEFAULT_BUDGET = 8.0
+
+# Жорсткий таймаут HTTP-клієнта, щоб фонові виклики не висіли вічно
+LLM_HARD_TIMEOUT = float(os.getenv("LLM_HARD_TIMEOUT", "60"))
+
+
+class CircuitBreaker:
+    """
+    Класичний запобіжник з трьома станами:
+    - closed: все добре, пропускаємо запити;
+    - open: провайдер "хворий", запити не пропускаємо до кінця cooldown;
+    - half_open: пропускаємо рівно один пробний запит. Успіх -> closed, помилка -> open.
+
+    Стан рахуємо по ковзному вікну останніх викликів: частка помилок і p95 затримки.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, window: int = 50, min_samples: int = 10,
+                 error_rate_threshold: float = 0.5, p95_threshold: float = 10.0,
+                 cooldown: float = 30.0):
+        self.window = window
+        self.min_samples = min_samples
+        self.error_rate_threshold = error_rate_threshold
+        self.p95_threshold = p95_threshold
+        self.cooldown = cooldown
+
+        self._samples = deque(maxlen=window)  # (ok, latency)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> tuple[bool, bool]:
+        """Повертає (чи можна йти в LLM, чи це пробний запит)."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True, False
+
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    return False, False
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+
+            # HALF_OPEN: лише один пробний запит одночасно
+            if self._probe_in_flight:
+                return False, False
+            self._probe_in_flight = True
+            return True, True
+
+    def cancel_probe(self):
+        """Пробний запит так і не пішов у LLM (немає слота, ліміт сесії) — наступний запит спробує знову."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record(self, ok: bool, latency: float, probe: bool = False):
+        with self._lock:
+            if probe:
+                self._probe_in_flight = False
+                if ok:
+                    self._state = self.CLOSED
+                    self._samples.clear()
+                    print("INFO:      LLM запобіжник замкнено — провайдер відновився.")
+                else:
+                    self._trip()
+                return
+
+            self._samples.append((ok, latency))
+            if self._state == self.CLOSED and self._is_unhealthy():
+                self._trip()
+
+    def _trip(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        print(f"WARNING:   LLM запобіжник розімкнено на {self.cooldown:.0f}s — працюємо в режимі форми.")
+
+    def _is_unhealthy(self) -> bool:
+        if len(self._samples) < self.min_samples:
+            return False
+        return (self._error_rate() > self.error_rate_threshold
+                or self._p95() > self.p95_threshold)
+
+    def _error_rate(self) -> float:
+        if not self._samples:
+            return 0.0
+        return sum(1 for ok, _ in self._samples if not ok) / len(self._samples)
+
+    def _p95(self) -> float:
+        if not self._samples:
+            return 0.0
+        latencies = sorted(latency for _, latency in self._samples)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            state = self._state
+            if state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                state = self.HALF_OPEN
+            return {
+                "state": state,
+                "samples": len(self._samples),
+                "error_rate": round(self._error_rate(), 3),
+                "p95_latency": round(self._p95(), 3),
+            }
+
+
+breaker = CircuitBreaker(
+    window=int(os.getenv("LLM_BREAKER_WINDOW", "50")),
+    min_samples=int(os.getenv("LLM_BREAKER_MIN_SAMPLES", "10")),
+    error_rate_threshold=float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5")),
+    p95_threshold=float(os.getenv("LLM_BREAKER_P95", "10")),
+    cooldown=float(os.getenv("LLM_BREAKER_COOLDOWN", "30")),
+)
+
+
+def get_budget(endpoint: str) -> float:
+    return LATENCY_BUDGETS.get(endpoint, DEFAULT_BUDGET)
+
+
+def _tracked_call(endpoint: str, func, budget: float, probe: bool, priority: int):
+    """
+    Виконується в потоці. Завжди записує результат у запобіжник і звільняє слот планувальника,
+    навіть якщо клієнт вже отримав fallback.
+    """
+    started = time.monotonic()
+    try:
+        result = func()
+    except Exception as e:
+        print(f"LLM Error [{endpoint}]: {e}")
+        breaker.record(False, time.monotonic() - started, probe=probe)
+        return False, None
+    finally:
+        llm_scheduler.scheduler.release(priority)
+
+    latency = time.monotonic() - started
+    # Відповідь, що не вклалася в бюджет, для запобіжника — теж збій
+    breaker.record(latency <= budget, latency, probe=probe)
+    return True, result
+
+
+async def _acquire_slot(endpoint: str, priority: int, session_id: str | None, budget: float, probe: bool) -> bool:
+    try:
+        slot = await llm_scheduler.scheduler.acquire(priority, session_id, timeout=budget)
+    except BaseException:
+        if probe:
+            breaker.cancel_probe()
+        raise
+    if not slot:
+        if probe:
+            breaker.cancel_probe()
+        print(f"WARNING:   LLM '{endpoint}' не отримав слот за {budget}s — віддаємо fallback.")
+    return slot
+
+
+async def run_with_budget(endpoint: str, func, fallback, session_id: str | None = None):
+    """
+    Запускає синхронний виклик LLM `func` у потоці з бюджетом затримки.
+    Повертає результат `func()` або `fallback`, якщо запобіжник розімкнений,
+    слот у черзі не дістався вчасно, виклик впав або не вклався в бюджет.
+    Кидає llm_scheduler.SessionRateLimited, якщо сесія перевищила свій ліміт.
+    """
+    budget = get_budget(endpoint)
+    priority = llm_scheduler.ENDPOINT_PRIORITY.get(endpoint, llm_scheduler.CHAT)
+    deadline = time.monotonic() + budget
+    allowed, probe = breaker.allow_request()
+    if not allowed:
+        return fallback
+    with request_profiler.phase("llm_queue"):
+        if not await _acquire_slot(endpoint, priority, session_id, budget, probe):
+            return fallback
+
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(None, _tracked_call, endpoint, func, budget, probe, priority)
+
+    try:
+        with request_profiler.phase("llm"):
+            ok, result = await asyncio.wait_for(asyncio.shield(future), timeout=max(0.0, deadline - time.monotonic()))
+    except asyncio.TimeoutError:
+        print(f"WARNING:   LLM '{endpoint}' не вклався в {budget}s — віддаємо fallback.")
+        return fallback
+
+    return result if ok else fallback
+
+
+_STREAM_DONE = object()
+
+
+async def stream_with_budget(endpoint: str, stream_func, fallback_text: str, session_id: str | None = None):
+    """
+    Потоковий варіант run_with_budget — async-генератор шматків тексту.
+    `stream_func(emit)` виконується в потоці і викликає emit(delta) на кожен шматок відповіді.
+
+    Бюджет затримки рахується до першого шматка: не дочекалися — віддаємо fallback_text
+    одним шматком, а виклик дозавершується у фоні. Для запобіжника довга, але жива відповідь
+    збоєм не вважається (межа — LLM_HARD_TIMEOUT).
+    Кидає llm_scheduler.SessionRateLimited, якщо сесія перевищила свій ліміт.
+    """
+    budget = get_budget(endpoint)
+    priority = llm_scheduler.ENDPOINT_PRIORITY.get(endpoint, llm_scheduler.CHAT)
+    deadline = time.monotonic() + budget
+    allowed, probe = breaker.allow_request()
+    if not allowed or not await _acquire_slot(endpoint, priority, session_id, budget, probe):
+        yield fallback_text
+        return
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stopped = threading.Event()
+
+    def emit(delta: str):
+        # Після таймауту чи відключення клієнта шматки нікому не потрібні
+        if delta and not stopped.is_set():
+            loop.call_soon_threadsafe(queue.put_nowait, delta)
+
+    future = loop.run_in_executor(None, _tracked_call, endpoint, lambda: stream_func(emit),
+                                  LLM_HARD_TIMEOUT, probe, priority)
+    # Колбек ставиться в цикл після всіх emit цього виклику, тож маркер завжди останній
+    future.add_done_callback(lambda _: queue.put_nowait(_STREAM_DONE))
+
+    received = False
+    try:
+        while True:
+            timeout = None if received else max(0.0, deadline - time.monotonic())
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                print(f"WARNING:   LLM '{endpoint}' не дав першого токена за {budget}s — віддаємо fallback.")
+                yield fallback_text
+                return
+            if item is _STREAM_DONE:
+                ok, _ = future.result()
+                if not ok and not received:
+                    yield fallback_text
+                return
+            received = True
+            yield item
+    finally:
+        stopped.set()
@@ -0,0 +1,241 @@
+"""
+Планувальник викликів LLM: пріоритети, глобальний ліміт паралельності і ліміт на сесію.
+
+Усі виклики провайдерів (розмовні ендпоінти через llm_guard і Groq при імпорті шаблонів)
+спершу беруть слот тут:
+- пріоритети: review/витягування даних > уточнення > вільний чат > фоновий імпорт;
+  коли слот звільняється, його отримує найпріоритетніший з тих, хто чекає;
+- глобальний ліміт LLM_MAX_CONCURRENCY одночасних викликів, з яких LLM_RESERVED_INTERACTIVE
+  слотів чат та імпорт не займають ніколи — тому сплеск чату чи імпорту не додає
+  черги заповненню форми;
+- token bucket на сесію: LLM_SESSION_BURST запитів одразу, далі LLM_SESSION_RATE за секунду.
+
+Слот тримається до фактичного завершення виклику, навіть якщо клієнт уже отримав fallback.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_RESERVED_INTERACTIVE = int(os.getenv("LLM_RESERVED_INTERACTIVE", "2"))
+LLM_SESSION_RATE = float(os.getenv("LLM_SESSION_RATE", "0.5"))
+LLM_SESSION_BURST = float(os.getenv("LLM_SESSION_BURST", "10"))
+
+# Менше число — вищий пріоритет
+INTERACTIVE = 0   # review, витягування даних з повідомлення
+CLARIFY = 1
+CHAT = 2
+BACKGROUND = 3    # імпорт шаблонів
+PRIORITY_NAMES = ("interactive", "clarify", "chat", "background")
+
+ENDPOINT_PRIORITY = {
+    "review_mode": INTERACTIVE,
+    "conversational_collect": INTERACTIVE,
+    "clarify": CLARIFY,
+    "chat": CHAT,
+    "import": BACKGROUND,
+}
+
+# Скільки неактивних сесій тримати в пам'яті, перш ніж чистити повні bucket-и
+MAX_TRACKED_SESSIONS = 10000
+
+
+class SessionRateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Too many LLM requests for this session, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("priority", "granted", "cancelled", "notify", "enqueued_at")
+
+    def __init__(self, priority: int, notify):
+        self.priority = priority
+        self.granted = False
+        self.cancelled = False
+        self.notify = notify
+        self.enqueued_at = time.monotonic()
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency: int, reserved_interactive: int, session_rate: float, session_burst: float):
+        self.max_concurrency = max(1, max_concurrency)
+        self.reserved_interactive = min(max(0, reserved_interactive), self.max_concurrency - 1)
+        self.session_rate = session_rate
+        self.session_burst = session_burst
+
+        self._lock = threading.Lock()
+        self._queue = []                      # heap (priority, seq, waiter)
+        self._seq = itertools.count()
+        self._running = [0] * len(PRIORITY_NAMES)
+        self._queued = [0] * len(PRIORITY_NAMES)
+        self._admitted = [0] * len(PRIORITY_NAMES)
+        self._rate_limited = [0] * len(PRIORITY_NAMES)
+        self._timed_out = [0] * len(PRIORITY_NAMES)
+        self._waits = [deque(maxlen=200) for _ in PRIORITY_NAMES]
+        self._buckets = {}                    # session_id -> [tokens, updated_at]
+
+    # --- ліміт на сесію ---
+
+    def _take_token(self, session_id: str, priority: int):
+        now = time.monotonic()
+        bucket = self._buckets.get(session_id)
+        if bucket is None:
+            if len(self._buckets) >= MAX_TRACKED_SESSIONS:
+                self._prune_buckets(now)
+            bucket = self._buckets[session_id] = [self.session_burst, now]
+        tokens = min(self.session_burst, bucket[0] + (now - bucket[1]) * self.session_rate)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            self._rate_limited[priority] += 1
+            raise SessionRateLimited((1 - tokens) / self.session_rate if self.session_rate > 0 else 60.0)
+        bucket[0] = tokens - 1
+
+    def _prune_buckets(self, now: float):
+        full_after = self.session_burst / self.session_rate if self.session_rate > 0 else float("inf")
+        for session_id, (_, updated_at) in list(self._buckets.items()):
+            if now - updated_at >= full_after:
+                del self._buckets[session_id]
+
+    # --- слоти ---
+
+    def _can_run(self, priority: int) -> bool:
+        if sum(self._running) >= self.max_concurrency:
+            return False
+        if priority >= CHAT:
+            low_running = sum(self._running[CHAT:])
+            return low_running < self.max_concurrency - self.reserved_interactive
+        return True
+
+    def _grant(self, priority: int, waited: float):
+        self._running[priority] += 1
+        self._admitted[priority] += 1
+        self._waits[priority].append(waited)
+
+    def _enqueue(self, priority: int, session_id: str | None, notify):
+        """Під локом: або одразу дає слот (повертає None), або ставить у чергу (повертає _Waiter)."""
+        if session_id:
+            self._take_token(session_id, priority)
+        if not self._queue_has_higher_or_equal(priority) and self._can_run(priority):
+            self._grant(priority, 0.0)
+            return None
+        waiter = _Waiter(priority, notify)
+        heapq.heappush(self._queue, (priority, next(self._seq), waiter))
+        self._queued[priority] += 1
+        return waiter
+
+    def _queue_has_higher_or_equal(self, priority: int) -> bool:
+        # Не обганяємо тих, хто вже чекає з таким самим або вищим пріоритетом
+        while self._queue and self._queue[0][2].cancelled:
+            heapq.heappop(self._queue)
+        return bool(self._queue) and self._queue[0][0] <= priority
+
+    def _dispatch(self):
+        """Під локом: віддає вільні слоти найпріоритетнішим з черги."""
+        while self._queue:
+            priority, _, waiter = self._queue[0]
+            if waiter.cancelled:
+                heapq.heappop(self._queue)
+                continue
+            if not self._can_run(priority):
+                return
+            heapq.heappop(self._queue)
+            self._queued[priority] -= 1
+            waiter.granted = True
+            self._grant(priority, time.monotonic() - waiter.enqueued_at)
+            waiter.notify()
+
+    def _abandon(self, waiter: _Waiter):
+        """Під локом: очікування перервано (таймаут/скасування)."""
+        if waiter.granted:
+            # Слот встигли видати — повертаємо його
+            self._release_locked(waiter.priority)
+        else:
+            waiter.cancelled = True
+            self._queued[waiter.priority] -= 1
+            self._timed_out[waiter.priority] += 1
+
+    def _release_locked(self, priority: int):
+        self._running[priority] -= 1
+        self._dispatch()
+
+    def release(self, priority: int):
+        with self._lock:
+            self._release_locked(priority)
+
+    async def acquire(self, priority: int, session_id: str | None = None, timeout: float | None = None) -> bool:
+        """
+        Чекає на слот. Повертає False, якщо не дочекалися за timeout.
+        Кидає SessionRateLimited, якщо сесія вичерпала свій ліміт.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def notify():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(True))
+
+        with self._lock:
+            waiter = self._enqueue(priority, session_id, notify)
+        if waiter is None:
+            return True
+
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                if waiter.granted and isinstance(e, asyncio.TimeoutError):
+                    # Слот видали в останній момент — користуємося ним
+                    return True
+                self._abandon(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return False
+
+    @contextmanager
+    def slot(self, priority: int, session_id: str | None = None):
+        """Синхронний варіант для потоків (імпорт шаблонів). Чекає без обмеження часу."""
+        event = threading.Event()
+        with self._lock:
+            waiter = self._enqueue(priority, session_id, event.set)
+        if waiter is not None:
+            event.wait()
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    def stats(self) -> dict:
+        with self._lock:
+            classes = {}
+            for priority, name in enumerate(PRIORITY_NAMES):
+                waits = sorted(self._waits[priority])
+                classes[name] = {
+                    "running": self._running[priority],
+                    "queued": self._queued[priority],
+                    "admitted": self._admitted[priority],
+                    "rate_limited": self._rate_limited[priority],
+                    "timed_out_in_queue": self._timed_out[priority],
+                    "avg_wait_ms": round(sum(waits) * 1000 / len(waits), 1) if waits else 0.0,
+                    "p95_wait_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1) if waits else 0.0,
+                }
+            return {
+                "max_concurrency": self.max_concurrency,
+                "reserved_interactive": self.reserved_interactive,
+                "running": sum(self._running),
+                "queued": sum(self._queued),
+                "tracked_sessions": len(self._buckets),
+                "session_rate": self.session_rate,
+                "session_burst": self.session_burst,
+                "classes": classes,
+            }
+
+
+scheduler = LLMScheduler(LLM_MAX_CONCURRENCY, LLM_RESERVED_INTERACTIVE, LLM_SESSION_RATE, LLM_SESSION_BURST)
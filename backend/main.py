@@ -1,14 +1,15 @@
 import os
 import json
-import openai
-import tempfile
-from fastapi import FastAPI, Depends, HTTPException
+import asyncio
+import threading
+import time
+from fastapi import FastAPI, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
-from sqlalchemy.orm import Session
+from fastapi.responses import Response, FileResponse
+from sqlalchemy.orm import Session, joinedload
 from contextlib import asynccontextmanager
 from pydantic import BaseModel
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from dotenv import load_dotenv
 
 from database import Base, get_db
@@ -16,32 +17,47 @@ import database
 import models
 import services
 import templates_importer
-import validation
-
-# Імпортуємо обидва файли
-import field_metadata
-import field_groups
+import llm_guard
+import llm_scheduler
+import contract_store
+import template_cache
+import render_pool
+import startup
+import session_compaction
+import session_listing
+import funnel_stats
+import fast_json
+from fast_json import FastJSONResponse
+import field_registry
+import prerender
+import request_profiler
+import conversation_recorder
 
 load_dotenv()
 CODEMIE_API_KEY = os.getenv("CODEMIE_API_KEY")
 CODEMIE_PROXY_URL = "https://codemie.lab.epam.com/llms"
-Base.metadata.create_all(bind=database.engine)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print(f"INFO:      Запуск сканування шаблонів...")
-    db = database.SessionLocal()
+    # Схема, папки та імпорт шаблонів — під файловим локом, один процес за раз
     try:
-        db.get_bind().execution_options(isolation_level="SERIALIZABLE")
-        templates_importer.run_auto_import(db)
+        startup.prepare_storage_and_templates()
     except Exception as e:
         print(f"ERROR:     Помилка при імпорті шаблонів: {e}")
-    finally:
-        db.close()
+    startup.load_field_registry()
+    prerender.prerenderer.start(render_to_store)
+    compaction_task = asyncio.create_task(session_compaction.run_periodically())
+    # Стартує, коли сервер уже приймає запити
+    warmup_task = asyncio.create_task(asyncio.to_thread(startup.warm_up_imports))
     yield
+    warmup_task.cancel()
+    prerender.prerenderer.stop()
+    compaction_task.cancel()
+    render_pool.pool.shutdown()
     print("INFO:      Зупинка сервера.")
 
-app = FastAPI(title="Contract AI Builder", lifespan=lifespan)
+app = FastAPI(title="Contract AI Builder", lifespan=lifespan, default_response_class=FastJSONResponse)
+fast_json.add_compression(app)
 
 app.add_middleware(
     CORSMiddleware,
@@ -50,8 +66,9 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-os.makedirs("storage/templates", exist_ok=True)
+# Найзовнішній шар: таймінги фаз кожного запиту, журнал повільних запитів, профіль на вимогу
+app.add_middleware(request_profiler.ProfilingMiddleware)
+request_profiler.instrument_engine(database.engine)
 
 # === MODELS ===
 
@@ -82,13 +99,57 @@ class ReviewRequest(BaseModel):
 
 # === HELPERS ===
 
-def get_human_field_name(field_key: str) -> str:
-    meta = field_metadata.FIELD_METADATA.get(field_key, {})
-    return meta.get("description", field_key)
-
-def get_fallback_question(fields: list[str]) -> str:
-    names = [get_human_field_name(f) for f in fields]
-    return f"\n\nБудь ласка, вкажіть: {', '.join(names)}?"
+def get_human_field_name(field_key: str, compiled=None) -> str:
+    return compiled.human_name(field_key) if compiled else field_registry.human_name(field_key)
+
+def get_filled_fields(answers: dict) -> set:
+    return {k for k, v in (answers or {}).items() if v is not None and str(v).strip() != ""}
+
+def get_session_groups(template_code: str) -> field_registry.CompiledTemplate:
+    """Скомпільований шаблон з реєстру полів. Якщо своїх груп немає — групи 'nadannya_poslug'."""
+    return field_registry.get_template(template_code)
+
+def get_session_filled_bits(session, compiled) -> int:
+    if session.filled_mask is None or session.filled_mask_layout != compiled.layout:
+        # Старі сесії без маски або маска за іншим порядком полів (змінились field_groups) — рахуємо з відповідей
+        return compiled.mask_for(get_filled_fields(session.answers))
+    return session.filled_bits
+
+def set_session_filled_bits(session, compiled, filled_bits: int):
+    session.filled_bits = filled_bits
+    session.filled_mask_layout = compiled.layout
+
+def get_session_progress(session) -> dict:
+    compiled = get_session_groups(session.template.code)
+    return compiled.progress(get_session_filled_bits(session, compiled))
+
+def get_llm_client():
+    # openai імпортується при першому виклику LLM (або у прогріві після старту), а не при імпорті main
+    from openai import AzureOpenAI
+    return AzureOpenAI(
+        api_key=CODEMIE_API_KEY,
+        azure_endpoint=CODEMIE_PROXY_URL,
+        api_version="2024-02-01",
+        timeout=llm_guard.LLM_HARD_TIMEOUT
+    )
+
+LLM_MODEL = "gpt-5-mini-2025-08-07"
+
+def complete_chat(endpoint: str, session_id: str | None, messages: list[dict], temperature: float,
+                  json_mode: bool = False) -> str:
+    """Один виклик LLM (виконується в потоці llm_guard). Пишеться в conversation_recorder, якщо запис увімкнено."""
+    started = time.perf_counter()
+    extra = {"response_format": {"type": "json_object"}} if json_mode else {}
+    response = get_llm_client().chat.completions.create(
+        model=LLM_MODEL,
+        messages=messages,
+        temperature=temperature,
+        **extra
+    )
+    content = response.choices[0].message.content
+    conversation_recorder.record_llm(session_id, endpoint, messages, content,
+                                     getattr(response, "usage", None), time.perf_counter() - started)
+    return content
 
 # === ENDPOINTS ===
 
@@ -98,14 +159,17 @@ def get_formatted_summary(session_id: str, db: Session = Depends(get_db)):
     """Повертає гарно відформатований список відповідей"""
     session = db.query(models.ContractSession).filter(models.ContractSession.id == session_id).first()
     if not session: raise HTTPException(404, "Session not found")
-    
+    return {"summary": build_formatted_summary(session)}
+
+def build_formatted_summary(session) -> str:
     answers = session.answers or {}
     schema = session.template.json_schema
+    compiled = get_session_groups(session.template.code)
     
     summary_lines = ["📋 **Перевірте ваші дані:**\n"]
     
     for key, value in answers.items():
-        human_name = get_human_field_name(key)
+        human_name = compiled.human_name(key)
         # Якщо в метаданих немає, пробуємо знайти в схемі
         if human_name == key:
              field_info = schema.get(key, {})
@@ -114,7 +178,7 @@ def get_formatted_summary(session_id: str, db: Session = Depends(get_db)):
         summary_lines.append(f"• {human_name}: **{value}**")
         
     summary_lines.append("\nЧи бажаєте ви щось змінити? Якщо ні — напишіть 'Генеруй', 'Все вірно' або 'Ок'.")
-    return {"summary": "\n".join(summary_lines)}
+    return "\n".join(summary_lines)
 
 # --- 2. Режим перевірки (Review Mode) ---
 class ReviewIntentRequest(BaseModel):
@@ -131,10 +195,13 @@ async def review_mode_chat(req: ReviewIntentRequest, db: Session = Depends(get_d
     2. 'update' -> користувач хоче змінити поле.
     """
     if not CODEMIE_API_KEY: raise HTTPException(500, "API Key missing")
+    return await ask_review_intent(req.template_code, req.chat_history, req.user_message, req.session_id)
 
+async def ask_review_intent(template_code: str, chat_history: list[ChatMessage], user_message: str,
+                            session_id: str | None = None) -> dict:
+    prompt_started = time.perf_counter()
     # Отримуємо всі поля шаблону, щоб AI знав контекст
-    all_fields = field_groups.get_all_required_fields(req.template_code)
-    all_fields_desc = field_metadata.get_fields_context(all_fields)
+    all_fields_desc = get_session_groups(template_code).all_fields_context
 
     system_prompt = f"""
 Ти — аналізатор фінального етапу заповнення договору.
@@ -164,37 +231,82 @@ async def review_mode_chat(req: ReviewIntentRequest, db: Session = Depends(get_d
 """
     # Формуємо історію для контексту
     messages = [{"role": "system", "content": system_prompt}]
-    for m in req.chat_history[-6:]:
+    for m in chat_history[-6:]:
         role = "assistant" if m.role in ["bot", "assistant"] else "user"
         messages.append({"role": role, "content": m.content})
     
-    messages.append({"role": "user", "content": req.user_message})
+    messages.append({"role": "user", "content": user_message})
 
-    try:
-        client = openai.AzureOpenAI(
-            api_key=CODEMIE_API_KEY,
-            azure_endpoint=CODEMIE_PROXY_URL,
-            api_version="2024-02-01"
-        )
-        response = client.chat.completions.create(
-            model="gpt-5-mini-2025-08-07",
-            messages=messages,
-            temperature=0.0,
-            response_format={"type": "json_object"}
-        )
-        return json.loads(response.choices[0].message.content)
-    except Exception as e:
-        print(f"Review Error: {e}")
-        return {"action": "chat", "message": "Вибачте, сталася помилка. Спробуйте ще раз."}
+    request_profiler.add("prompt", time.perf_counter() - prompt_started)
 
-# --- Існуючі ендпоінти ---
+    def call_llm():
+        return json.loads(complete_chat("review_mode", session_id, messages, temperature=0.0, json_mode=True))
 
-@app.post("/assistant/chat")
-async def chat_with_codemie(request: ChatRequest, db: Session = Depends(get_db)):
-    if not CODEMIE_API_KEY:
-        raise HTTPException(status_code=500, detail="API Key не налаштовано.")
+    fallback = {"action": "chat", "message": "Вибачте, сталася помилка. Спробуйте ще раз."}
+    return await llm_guard.run_with_budget("review_mode", call_llm, fallback, session_id)
+
+# --- Стан LLM (для фронтенду: AI-режим чи режим форми) ---
+@app.get("/assistant/status")
+def assistant_status():
+    breaker = llm_guard.breaker.snapshot()
+    return {
+        "mode": "ai" if breaker["state"] != llm_guard.CircuitBreaker.OPEN else "form",
+        "breaker": breaker,
+        "budgets": llm_guard.LATENCY_BUDGETS,
+    }
+
+# --- Кеш розібраних шаблонів ---
+@app.get("/admin/template_cache")
+def template_cache_stats():
+    """Кеш у кожному процесі рендеру: зведення знімків воркерів render_pool."""
+    return template_cache.combined_stats(render_pool.pool.template_cache_stats())
+
+# --- Компакція сесій (вручну, поза розкладом) ---
+@app.post("/admin/compact_sessions")
+def compact_sessions_now():
+    result = session_compaction.compact_sessions()
+    if result is None:
+        raise HTTPException(status_code=409, detail="Compaction is already running in another process")
+    return result
+
+# --- Воронка заповнення ---
+@app.get("/admin/stats")
+def funnel_daily_stats(
+    template_code: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    db: Session = Depends(get_db)
+):
+    """Скільки сесій за день почато, дійшло до кожної групи, до перевірки і до генерації"""
+    return funnel_stats.daily_stats(db, template_code, date_from, date_to, groups_for=get_session_groups)
+
+# --- Планувальник LLM ---
+@app.exception_handler(llm_scheduler.SessionRateLimited)
+async def session_rate_limited_handler(request: Request, exc: llm_scheduler.SessionRateLimited):
+    retry_after = max(1, round(exc.retry_after))
+    return FastJSONResponse(
+        status_code=429,
+        content={"detail": "Забагато повідомлень поспіль. Зачекайте кілька секунд."},
+        headers={"Retry-After": str(retry_after)}
+    )
+
+@app.get("/admin/llm_scheduler")
+def llm_scheduler_stats():
+    return llm_scheduler.scheduler.stats()
+
+# --- Повільні запити ---
+@app.get("/admin/slow_requests")
+def slow_requests():
+    return request_profiler.stats()
+
+# --- Черга рендеру ---
+@app.get("/admin/render_pool")
+def render_pool_stats():
+    return {**render_pool.pool.stats(), "prerender": prerender.prerenderer.stats()}
+
+# --- Існуючі ендпоінти ---
 
-    system_prompt = r"""
+CHAT_SYSTEM_PROMPT = r"""
 ## Роль
 Ти — досвідчений український юрист-консультант.
 
@@ -205,32 +317,34 @@ async def chat_with_codemie(request: ChatRequest, db: Session = Depends(get_db))
    - На офтоп відповідай: "Вибачте, я можу відповідати лише на запитання, пов'язані з документами та юридичною тематикою."
 """.strip()
 
-    messages = [{"role": "system", "content": system_prompt}]
+CHAT_FALLBACK = "Вибачте, сервіс тимчасово недоступний."
+
+def build_chat_messages(template_name: str | None, chat_history: list[ChatMessage], user_message: str) -> list[dict]:
+    messages = [{"role": "system", "content": CHAT_SYSTEM_PROMPT}]
+    if template_name:
+        messages.append({"role": "system", "content": f"Ми працюємо з документом: '{template_name}'."})
+    for m in chat_history:
+        messages.append({"role": m.role, "content": m.content})
+    messages.append({"role": "user", "content": user_message})
+    return messages
 
+@app.post("/assistant/chat")
+async def chat_with_codemie(request: ChatRequest, db: Session = Depends(get_db)):
+    if not CODEMIE_API_KEY:
+        raise HTTPException(status_code=500, detail="API Key не налаштовано.")
+
+    template_name = None
     if request.template_code:
         template = db.query(models.ContractTemplate).filter_by(code=request.template_code).first()
         if template:
-            messages.append({"role": "system", "content": f"Ми працюємо з документом: '{template.name}'."})
-
-    for m in request.chat_history:
-        messages.append({"role": m.role, "content": m.content})
+            template_name = template.name
+    messages = build_chat_messages(template_name, request.chat_history, request.user_message)
 
-    messages.append({"role": "user", "content": request.user_message})
+    def call_llm():
+        return {"assistant_reply": complete_chat("chat", request.session_id, messages, temperature=0.3)}
 
-    try:
-        client = openai.AzureOpenAI(
-            api_key=CODEMIE_API_KEY,
-            azure_endpoint=CODEMIE_PROXY_URL,
-            api_version="2024-02-01"
-        )
-        response = client.chat.completions.create(
-            model="gpt-5-mini-2025-08-07",
-            messages=messages,
-            temperature=0.3
-        )
-        return {"assistant_reply": response.choices[0].message.content}
-    except Exception as e:
-        return {"assistant_reply": "Вибачте, сервіс тимчасово недоступний."}
+    fallback = {"assistant_reply": CHAT_FALLBACK}
+    return await llm_guard.run_with_budget("chat", call_llm, fallback, request.session_id)
 
 # Модель для уточнення
 class ClarifyRequest(BaseModel):
@@ -241,10 +355,14 @@ class ClarifyRequest(BaseModel):
 async def clarify_missing_fields(req: ClarifyRequest):
     if not req.missing_fields:
         return {"message": "Вкажіть дані."}
+    return await ask_clarification(req.missing_fields, req.filled_fields)
 
+async def ask_clarification(missing_fields: list[str], filled_fields: list[str], compiled=None,
+                            session_id: str | None = None) -> dict:
+    prompt_started = time.perf_counter()
     # Конвертуємо ключі в людські назви
-    missing_human = [get_human_field_name(f) for f in req.missing_fields]
-    filled_human = [get_human_field_name(f) for f in req.filled_fields]
+    missing_human = [get_human_field_name(f, compiled) for f in missing_fields]
+    filled_human = [get_human_field_name(f, compiled) for f in filled_fields]
     
     missing_str = ", ".join(missing_human)
     filled_str = ", ".join(filled_human) if filled_human else "нічого"
@@ -262,24 +380,18 @@ async def clarify_missing_fields(req: ClarifyRequest):
     3. Пиши українською, природною мовою. Не використовуй списки, пиши реченням.
     """
 
-    try:
-        client = openai.AzureOpenAI(
-            api_key=CODEMIE_API_KEY,
-            azure_endpoint=CODEMIE_PROXY_URL,
-            api_version="2024-02-01"
-        )
-        response = client.chat.completions.create(
-            model="gpt-5-mini-2025-08-07",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.7
-        )
-        return {"message": response.choices[0].message.content}
-    except Exception as e:
-        print(f"AI Clarify Error: {e}")
-        return {"message": f"Дані записано. Будь ласка, додайте ще: {missing_str}."}
+    request_profiler.add("prompt", time.perf_counter() - prompt_started)
+
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+    def call_llm():
+        return {"message": complete_chat("clarify", session_id, messages, temperature=0.7)}
+
+    fallback = {"message": f"Дані записано. Будь ласка, додайте ще: {missing_str}."}
+    return await llm_guard.run_with_budget("clarify", call_llm, fallback, session_id)
 
 
 @app.post("/assistant/conversational_collect")
@@ -288,9 +400,16 @@ async def conversational_collect(request: ConversationalCollectRequest, db: Sess
         raise HTTPException(status_code=500, detail="API Key missing")
     session = db.query(models.ContractSession).filter(models.ContractSession.id == request.session_id).first()
     if not session: raise HTTPException(status_code=404, detail="Session not found")
+    compiled = get_session_groups(session.template.code)
+    return await ask_collect(request.current_group_fields, request.chat_history, request.user_message, compiled, session.id)
 
-    fields_context = field_metadata.get_fields_context(request.current_group_fields)
-    fallback_question = get_fallback_question(request.current_group_fields)
+async def ask_collect(group_fields: list[str], chat_history: list[ChatMessage], user_message: str, compiled=None,
+                      session_id: str | None = None) -> dict:
+    prompt_started = time.perf_counter()
+    if compiled is None:
+        compiled = get_session_groups(field_registry.DEFAULT_GROUPS_CODE)
+    fields_context = compiled.fields_context(group_fields)
+    fallback_question = compiled.fallback_question(group_fields)
 
     system_prompt = f"""
 Ти — асистент ДІЯ. Твоя задача — зібрати поля:
@@ -312,96 +431,316 @@ async def conversational_collect(request: ConversationalCollectRequest, db: Sess
 """.strip()
 
     messages = [{"role": "system", "content": system_prompt}]
-    for m in request.chat_history[-10:]:
+    for m in chat_history[-10:]:
         role = "assistant" if m.role in ["bot", "assistant"] else "user"
         messages.append({"role": role, "content": m.content})
-    messages.append({"role": "user", "content": request.user_message})
+    messages.append({"role": "user", "content": user_message})
 
-    try:
-        client = openai.AzureOpenAI(
-            api_key=CODEMIE_API_KEY,
-            azure_endpoint=CODEMIE_PROXY_URL,
-            api_version="2024-02-01"
-        )
-        response = client.chat.completions.create(
-            model="gpt-5-mini-2025-08-07",
-            messages=messages,
-            temperature=0.1,
-            response_format={"type": "json_object"}
-        )
-        return json.loads(response.choices[0].message.content)
-    except Exception as e:
-        print(f"Extraction Error: {e}")
-        return {
-            "action": "chat", 
-            "message": f"Вибачте, сталася помилка. {fallback_question}"
-        }
+    request_profiler.add("prompt", time.perf_counter() - prompt_started)
+
+    def call_llm():
+        return json.loads(complete_chat("conversational_collect", session_id, messages, temperature=0.1, json_mode=True))
+
+    fallback = {
+        "action": "chat", 
+        "message": f"Вибачте, сталася помилка. {fallback_question}"
+    }
+    return await llm_guard.run_with_budget("conversational_collect", call_llm, fallback, session_id)
 
 @app.post("/session/{session_id}/answer")
 def submit_answer(session_id: str, answer_data: dict, skip_validation: bool = False, db: Session = Depends(get_db)):
     session = db.query(models.ContractSession).filter(models.ContractSession.id == session_id).first()
     if not session: raise HTTPException(status_code=404, detail="Session not found")
 
-    current_answers = dict(session.answers) if session.answers else {}
-    merged_answers = current_answers.copy()
+    clean_data, relevant_errors = apply_answers(db, session, answer_data, skip_validation)
+    if relevant_errors:
+        raise HTTPException(status_code=422, detail={
+            "validation_errors": relevant_errors,
+            "tip": "Будь ласка, перевірте дані та спробуйте ввести їх коректно ще раз."
+        })
+    if not clean_data:
+         return FastJSONResponse({"status": "skipped", "current_answers": session.answers})
+
+    return FastJSONResponse({
+        "status": "updated", 
+        "current_answers": session.answers,
+        "updated_fields": list(clean_data.keys()),
+        "progress": get_session_progress(session)
+    })
+
+# Два ходи однієї сесії (WebSocket і REST, подвійне надсилання) інакше перезаписали б
+# відповіді й маску один одного: читання-злиття-запис іде під локом сесії (в межах процесу)
+_ANSWER_LOCKS = tuple(threading.Lock() for _ in range(64))
 
+def apply_answers(db: Session, session: models.ContractSession, answer_data: dict, skip_validation: bool = False):
+    """
+    Чистить, валідує та зберігає нові відповіді сесії.
+    Повертає (clean_data, relevant_errors). Якщо є помилки — нічого не зберігається.
+    Синхронна (БД): з async-коду викликати через asyncio.to_thread.
+    """
     clean_data = {}
     for k, v in answer_data.items():
         if v is not None and str(v).strip() != "":
             clean_data[k.lower()] = v
-            
+
     if not clean_data:
-         return {"status": "skipped", "current_answers": session.answers}
+        return clean_data, []
+
+    with _ANSWER_LOCKS[hash(session.id) % len(_ANSWER_LOCKS)]:
+        # Сесію могли завантажити ще до виклику LLM — зливаємо з тим, що в БД зараз
+        db.refresh(session)
+        errors = merge_answers(db, session, clean_data, skip_validation)
+    return clean_data, errors
 
+def merge_answers(db: Session, session: models.ContractSession, clean_data: dict, skip_validation: bool):
+    """Під локом сесії (див. apply_answers). Повертає помилки валідації нових полів."""
+    merged_answers = dict(session.answers) if session.answers else {}
     merged_answers.update(clean_data)
+    field_registry.ensure_registered(session.template)
+    compiled = get_session_groups(session.template.code)
 
     if not skip_validation:
-        template_code = session.template.code
-        is_valid, errors = validation.validate_session_answers(template_code, merged_answers)
+        is_valid, errors = compiled.validate(merged_answers)
         
         if not is_valid:
             relevant_errors = [e for e in errors if e['field'] in clean_data]
             if relevant_errors:
-                raise HTTPException(status_code=422, detail={
-                    "validation_errors": relevant_errors,
-                    "tip": "Будь ласка, перевірте дані та спробуйте ввести їх коректно ще раз."
-                })
+                return relevant_errors
 
+    # До присвоєння answers: для старих сесій без маски вона рахується саме з них
+    old_bits = get_session_filled_bits(session, compiled)
     session.answers = merged_answers
+    set_session_filled_bits(session, compiled, compiled.mask_for(get_filled_fields(merged_answers)))
+    funnel_stats.record(db, session.template.code, *funnel_stats.progress_steps(compiled, old_bits, session.filled_bits))
     from sqlalchemy.orm.attributes import flag_modified
     flag_modified(session, "answers")
     db.commit()
-    
-    return {
-        "status": "updated", 
-        "current_answers": session.answers,
-        "updated_fields": list(clean_data.keys()) 
-    }
-
-@app.post("/session/{session_id}/generate")
-def generate_contract(session_id: str, db: Session = Depends(get_db)):
+    # commit прострочує об'єкти — перечитуємо тут, щоб далі хід не ходив у БД з циклу подій
+    db.refresh(session)
+    db.refresh(session.template)
+    if compiled.next_group(session.filled_bits) is None:
+        # Усе заповнено — рендеримо у фоні, поки користувач перевіряє дані
+        prerender.prerenderer.schedule(session.id, contract_store.answers_fingerprint(session.template, merged_answers))
+    return []
+
+@app.get("/session/{session_id}/progress")
+def get_progress(session_id: str, db: Session = Depends(get_db)):
+    """Скільки полів заповнено і яка група наступна (рахується по бітовій масці сесії)"""
     session = db.query(models.ContractSession).filter(models.ContractSession.id == session_id).first()
     if not session: raise HTTPException(status_code=404, detail="Session not found")
+    return get_session_progress(session)
+
+# --- Один хід розмови (замість collect -> answer -> clarify на клієнті) ---
+class TurnRequest(BaseModel):
+    user_message: str
+    chat_history: list[ChatMessage] = []
 
+@app.post("/session/{session_id}/turn")
+async def session_turn(session_id: str, req: TurnRequest, db: Session = Depends(get_db)):
+    """
+    Обробляє одне повідомлення користувача повністю на сервері:
+    витягування даних (LLM) -> валідація і збереження -> вибір наступної групи -> уточнення або наступне питання.
+    Повертає готові повідомлення для чату одним запитом.
+    """
+    if not CODEMIE_API_KEY:
+        raise HTTPException(status_code=500, detail="API Key missing")
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp_file:
-            tmp_path = tmp_file.name
+        session = await asyncio.to_thread(load_session, db, session_id)
+    except SessionGone:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return await run_turn(db, session, req.user_message, req.chat_history)
 
-        services.generate_contract_docx(
-            template_path=session.template.docx_path,
-            answers=session.answers,
-            output_path=tmp_path
-        )
-        with open(tmp_path, "rb") as f:
-            file_content = f.read()
-        os.remove(tmp_path)
+async def run_turn(db: Session, session: models.ContractSession, user_message: str,
+                   chat_history: list[ChatMessage]) -> dict:
+    """
+    Один хід розмови — спільний для REST /turn і WebSocket-каналу сесії.
+    Сесія — з load_session (шаблон уже завантажено); запити до БД — лише в apply_answers, у потоці.
+    """
+    conversation_recorder.begin_turn(session.id, session.template.code, session.answers)
+    started = time.perf_counter()
+    result = await play_turn(db, session, user_message, chat_history)
+    conversation_recorder.end_turn(session.id, user_message, chat_history, result, time.perf_counter() - started)
+    return result
+
+async def play_turn(db: Session, session: models.ContractSession, user_message: str,
+                    chat_history: list[ChatMessage]) -> dict:
+    template_code = session.template.code
+    compiled = get_session_groups(template_code)
+    group = compiled.next_group(get_session_filled_bits(session, compiled))
+
+    result = {"phase": "collect", "messages": [], "updated_fields": [], "validation_errors": []}
+
+    # === Режим перевірки: всі групи вже заповнені ===
+    if group is None:
+        result["phase"] = "review"
+        ai_data = await ask_review_intent(template_code, chat_history, user_message, session.id)
+        action = ai_data.get("action")
+        if ai_data.get("message"):
+            result["messages"].append({"type": "bot", "text": ai_data["message"]})
+
+        if action == "generate":
+            result["phase"] = "generate"
+        elif action == "update" and ai_data.get("fields"):
+            clean_data, errors = await asyncio.to_thread(apply_answers, db, session, ai_data["fields"])
+            if errors:
+                result["validation_errors"] = errors
+                result["messages"].append({"type": "error", "text": "Помилка при оновленні даних."})
+            else:
+                result["updated_fields"] = list(clean_data.keys())
+                result["messages"].append({"type": "bot", "text": build_formatted_summary(session)})
+
+        result["current_answers"] = session.answers
+        result["progress"] = get_session_progress(session)
+        return result
+
+    # === Збір даних по поточній групі ===
+    result["current_group"] = group.id
+    ai_data = await ask_collect(list(group.fields), chat_history, user_message, compiled, session.id)
+
+    if ai_data.get("action") != "extract":
+        result["messages"].append({"type": "bot", "text": ai_data.get("message", "")})
+        result["current_answers"] = session.answers
+        result["progress"] = get_session_progress(session)
+        return result
+
+    if ai_data.get("message"):
+        result["messages"].append({"type": "bot", "text": ai_data["message"]})
+
+    clean_data, errors = await asyncio.to_thread(apply_answers, db, session, ai_data.get("fields") or {})
+    result["current_answers"] = session.answers
+    result["progress"] = get_session_progress(session)
+
+    if errors:
+        error_text = "\n".join(f"🔴 {e['field']}: {e['message']}" for e in errors)
+        result["validation_errors"] = errors
+        result["messages"].append({"type": "error", "text": f"Помилка перевірки:\n{error_text}"})
+        result["messages"].append({"type": "bot", "text": "Спробуйте, будь ласка, ввести ці дані ще раз коректно."})
+        return result
+
+    if not clean_data:
+        # LLM нічого не витягнув (або лише порожні значення) — нічого не записано, питаємо ще раз
+        if not ai_data.get("message"):
+            missing_fields = compiled.missing_fields(group, get_session_filled_bits(session, compiled))
+            result["messages"].append({"type": "bot", "text": compiled.fallback_question(missing_fields).strip()})
+        return result
+
+    result["updated_fields"] = list(clean_data.keys())
+    result["messages"].append({"type": "system", "text": "Дані записано ✓"})
+
+    filled_bits = session.filled_bits
+    missing_fields = compiled.missing_fields(group, filled_bits)
+    if missing_fields:
+        try:
+            clarify_data = await ask_clarification(missing_fields, result["updated_fields"], compiled, session.id)
+            clarify_text = clarify_data["message"]
+        except llm_scheduler.SessionRateLimited:
+            # Дані вже збережено — не відповідаємо 429, а просто питаємо решту без LLM
+            clarify_text = compiled.fallback_question(missing_fields).strip()
+        result["messages"].append({"type": "bot", "text": clarify_text})
+        return result
+
+    next_group = compiled.next_group(filled_bits)
+    if next_group:
+        result["current_group"] = next_group.id
+        result["messages"].append({"type": "bot", "text": next_group.prompt})
+    else:
+        result["phase"] = "review"
+        result.pop("current_group")
+        result["messages"].append({"type": "bot", "text": build_formatted_summary(session)})
+    return result
+
+DOCX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+async def render_contract(db: Session, session: models.ContractSession) -> models.GeneratedContract:
+    """
+    Повертає збережений документ для поточних відповідей сесії.
+    Рендерить лише якщо для цього відбитка відповідей документа ще немає на диску.
+    """
+    fingerprint = await asyncio.to_thread(lambda: contract_store.answers_fingerprint(session.template, session.answers))
+    # Якщо цей документ уже рендериться у фоні (prerender) — чекаємо його, а не рендеримо вдруге
+    await prerender.prerenderer.wait(session.id, fingerprint)
+    return await render_stored(db, session, fingerprint)
+
+async def render_stored(db: Session, session: models.ContractSession, fingerprint: str) -> models.GeneratedContract:
+    """
+    Документ для відбитка `fingerprint`: з диска або новий рендер у пулі (без очікування prerender).
+    Запити до БД і хешування файлу — в потоці: цикл подій тим часом обслуговує /turn, /chat і WebSocket.
+    """
+    def find_stored():
+        contract = prerender.find_stored(db, session.id, fingerprint)
+        ready = contract is not None and os.path.exists(contract.file_path)
+        return contract, ready, session.template.docx_path, dict(session.answers or {})
+
+    contract, ready, template_path, answers = await asyncio.to_thread(find_stored)
+    if ready:
+        return contract
+
+    content_hash, path, size = await render_to_store(template_path, answers)
+    if contract is None:
+        contract = models.GeneratedContract(session_id=session.id, answers_hash=fingerprint)
+        db.add(contract)
+    contract.file_path = path
+    contract.content_hash = content_hash
+    contract.size = size
+    return contract
+
+async def render_to_store(template_path: str, answers: dict) -> tuple[str, str, int]:
+    """Рендер у пулі й збереження у сховище. Без БД — з'єднання не тримається весь рендер."""
+    tmp_path = await asyncio.to_thread(contract_store.new_temp_path)
+    try:
+        # Рендер — в окремому пулі процесів, щоб не займати потоки розмовних ендпоінтів
+        await render_pool.pool.render(template_path, answers, tmp_path)
+        return await asyncio.to_thread(contract_store.store_file, tmp_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+async def complete_session(db: Session, session: models.ContractSession) -> models.GeneratedContract:
+    """Рендер (або готовий документ) + позначка сесії як завершеної."""
+    started = time.perf_counter()
+    contract = await render_contract(db, session)
+    conversation_recorder.record_generated(session.id, time.perf_counter() - started)
+
+    def mark_completed():
+        if session.status == models.SessionStatus.draft:
+            funnel_stats.record(db, session.template.code, funnel_stats.STEP_GENERATED)
         session.status = models.SessionStatus.completed
+        contract.generated_at = models.utcnow()
         db.commit()
-        
-        return Response(
-            content=file_content,
-            media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            headers={"Content-Disposition": f"attachment; filename={session.template.code}.docx"}
+        # commit прострочує об'єкти — перечитуємо тут те, що далі читає відповідь, а не в циклі подій
+        db.refresh(contract)
+        db.refresh(session.template)
+
+    await asyncio.to_thread(mark_completed)
+    return contract
+
+def contract_file_response(request: Request, contract: models.GeneratedContract, filename: str):
+    """Віддає файл з диска з ETag (sha256 вмісту) і підтримкою Range."""
+    etag = f'"{contract.content_hash}"'
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers={"ETag": etag})
+    return FileResponse(
+        contract.file_path,
+        media_type=DOCX_MEDIA_TYPE,
+        filename=filename,
+        headers={"ETag": etag, "Cache-Control": "private, no-cache"}
+    )
+
+@app.post("/session/{session_id}/generate")
+async def generate_contract(session_id: str, request: Request, db: Session = Depends(get_db)):
+    session = await asyncio.to_thread(
+        lambda: db.query(models.ContractSession).filter(models.ContractSession.id == session_id).first()
+    )
+    if not session: raise HTTPException(status_code=404, detail="Session not found")
+
+    try:
+        contract = await complete_session(db, session)
+        return contract_file_response(request, contract, f"{session.template.code}.docx")
+    except render_pool.RenderQueueFull as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Забагато документів генерується одночасно. Спробуйте за кілька секунд.",
+            headers={"Retry-After": str(e.retry_after)}
         )
     except Exception as e:
         import traceback
@@ -409,9 +748,225 @@ def generate_contract(session_id: str, db: Session = Depends(get_db)):
         print(f"GENERATE ERROR: {e}") 
         raise HTTPException(500, str(e))
 
+def latest_generated(db: Session, session_id: str) -> models.GeneratedContract | None:
+    """
+    Документ, який востаннє віддав /generate. Рядки prerender лежать у тій самій таблиці,
+    а повторний /generate для старих відповідей не змінює created_at, тож дивимось на generated_at.
+    """
+    query = db.query(models.GeneratedContract).filter(models.GeneratedContract.session_id == session_id)
+    contract = query.filter(models.GeneratedContract.generated_at.isnot(None)).order_by(
+        models.GeneratedContract.generated_at.desc()
+    ).first()
+    if contract is None:
+        # Документи, згенеровані до появи generated_at. У чернетки таких немає — лише фонові рендери
+        session = db.get(models.ContractSession, session_id)
+        if session is None or session.status != models.SessionStatus.draft:
+            contract = query.order_by(models.GeneratedContract.created_at.desc()).first()
+    return contract
+
+
+@app.get("/session/{session_id}/document")
+def download_contract(session_id: str, request: Request, db: Session = Depends(get_db)):
+    """Останній згенерований документ сесії — прямо з диска, без рендеру"""
+    contract = latest_generated(db, session_id)
+    if not contract or not os.path.exists(contract.file_path):
+        raise HTTPException(status_code=404, detail="Document not generated yet")
+    if contract.session:
+        code = contract.session.template.code
+    else:
+        # Сесія вже перенесена в архів компакцією
+        archived = db.get(models.ArchivedSession, contract.session_id)
+        code = archived.template_code if archived and archived.template_code else "contract"
+    return contract_file_response(request, contract, f"{code}.docx")
+
+# --- WebSocket-канал сесії ---
+# Історія розмови тримається на сервері, тож клієнт шле лише текст нового повідомлення
+WS_HISTORY_LIMIT = 20
+
+class SessionGone(Exception):
+    pass
+
+def load_session(db: Session, session_id: str) -> models.ContractSession:
+    """Сесія разом із шаблоном: далі хід читає session.template без запитів з циклу подій."""
+    session = db.query(models.ContractSession).options(joinedload(models.ContractSession.template)).filter(
+        models.ContractSession.id == session_id
+    ).first()
+    if not session:
+        raise SessionGone(session_id)
+    return session
+
+@app.websocket("/session/{session_id}/ws")
+async def session_channel(websocket: WebSocket, session_id: str):
+    """
+    Один хід розмови, вільний чат і генерація через одне з'єднання (REST-ендпоінти лишаються).
+
+    Клієнт -> сервер:
+      {"type": "message", "text": ...}  — хід розмови (як POST /session/{id}/turn)
+      {"type": "chat", "text": ...}     — питання юристу, відповідь приходить токенами
+      {"type": "generate"}              — згенерувати документ
+      {"type": "ping"}
+    Сервер -> клієнт:
+      state (при підключенні), message, validation_errors, progress, phase (кінець ходу),
+      token / chat_done, document_ready, error, pong.
+    """
+    await websocket.accept()
+
+    async def send(payload: dict):
+        await websocket.send_text(fast_json.dumps(payload))
+
+    history: list[ChatMessage] = []
+
+    def remember(role: str, text: str):
+        history.append(ChatMessage(role=role, content=text))
+        del history[:-WS_HISTORY_LIMIT]
+
+    async def push_turn(db: Session, session: models.ContractSession, text: str):
+        if not CODEMIE_API_KEY:
+            await send({"type": "error", "code": "llm_unavailable", "detail": "API Key missing"})
+            return
+        result = await run_turn(db, session, text, history)
+        remember("user", text)
+        if result["validation_errors"]:
+            await send({"type": "validation_errors", "errors": result["validation_errors"]})
+        for message in result["messages"]:
+            await send({"type": "message", "message": message})
+            if message["type"] == "bot":
+                remember("assistant", message["text"])
+        await send({
+            "type": "progress",
+            "progress": result["progress"],
+            "current_answers": result["current_answers"],
+            "updated_fields": result["updated_fields"],
+            "current_group": result.get("current_group"),
+        })
+        await send({"type": "phase", "phase": result["phase"]})
+        if result["phase"] == "generate":
+            await push_document(db, session)
+
+    async def push_chat(db: Session, session: models.ContractSession, text: str):
+        messages = build_chat_messages(session.template.name, history, text)
+        # Далі лише LLM — з'єднання з БД на час генерації не тримаємо
+        db.close()
+
+        def stream_llm(emit):
+            stream = get_llm_client().chat.completions.create(
+                model=LLM_MODEL,
+                messages=messages,
+                temperature=0.3,
+                stream=True
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    emit(chunk.choices[0].delta.content)
+
+        reply = []
+        async for delta in llm_guard.stream_with_budget("chat", stream_llm, CHAT_FALLBACK, session_id):
+            reply.append(delta)
+            await send({"type": "token", "text": delta})
+        reply = "".join(reply)
+        remember("user", text)
+        remember("assistant", reply)
+        await send({"type": "chat_done", "message": {"type": "bot", "text": reply}})
+
+    async def push_document(db: Session, session: models.ContractSession, text: str = ""):
+        await complete_session(db, session)
+        await send({"type": "document_ready", "session_id": session.id, "url": f"/session/{session.id}/document"})
+
+    handlers = {"message": push_turn, "chat": push_chat, "generate": push_document}
+
+    try:
+        with database.SessionLocal() as db:
+            session = await asyncio.to_thread(load_session, db, session_id)
+            compiled = get_session_groups(session.template.code)
+            await send({
+                "type": "state",
+                "phase": "collect" if compiled.next_group(get_session_filled_bits(session, compiled)) else "review",
+                "status": session.status.value,
+                "progress": get_session_progress(session),
+                "current_answers": session.answers,
+            })
+
+        while True:
+            try:
+                data = fast_json.loads(await websocket.receive_text())
+                kind = data.get("type")
+                text = str(data.get("text") or "").strip()
+            except (ValueError, AttributeError):
+                await send({"type": "error", "code": "bad_message"})
+                continue
+
+            if kind == "ping":
+                await send({"type": "pong"})
+                continue
+            handler = handlers.get(kind)
+            if handler is None or (kind != "generate" and not text):
+                await send({"type": "error", "code": "bad_message"})
+                continue
+
+            # Окреме з'єднання з БД на кожне повідомлення: між повідомленнями пул не займаємо
+            with database.SessionLocal() as db:
+                try:
+                    await handler(db, await asyncio.to_thread(load_session, db, session_id), text)
+                except llm_scheduler.SessionRateLimited as e:
+                    await send({"type": "error", "code": "rate_limited", "retry_after": max(1, round(e.retry_after))})
+                except render_pool.RenderQueueFull as e:
+                    await send({"type": "error", "code": "render_busy", "retry_after": e.retry_after})
+                except (SessionGone, WebSocketDisconnect):
+                    raise
+                except Exception as e:
+                    import traceback
+                    traceback.print_exc()
+                    print(f"WS ERROR: {e}")
+                    await send({"type": "error", "code": "internal", "detail": str(e)})
+    except SessionGone:
+        await websocket.close(code=4404)
+    except WebSocketDisconnect:
+        pass
+
+def mask_progress_percent(template_code: str, filled_mask: str | None, layout: str | None) -> int | None:
+    compiled = get_session_groups(template_code)
+    if filled_mask is None or layout != compiled.layout:
+        # Маска застаріла — answers список не читає, тож відсоток невідомий до наступного запису
+        return None
+    return compiled.progress(int(filled_mask or "0", 16))["percent"]
+
+@app.get("/sessions")
+def list_sessions(
+    user_id: int | None = None,
+    template_code: str | None = None,
+    status: models.SessionStatus | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    cursor: str | None = None,
+    limit: int = 20,
+    include_archived: bool = True,
+    db: Session = Depends(get_db)
+):
+    """
+    Сесії (в т.ч. архівні) з фільтрами, від нових до старих.
+    date_from/date_to фільтрують по updated_at. Наступна сторінка — ?cursor=<next_cursor>.
+    """
+    try:
+        return session_listing.list_sessions(
+            db,
+            user_id=user_id,
+            template_code=template_code,
+            status=status,
+            date_from=date_from,
+            date_to=date_to,
+            cursor=cursor,
+            limit=limit,
+            include_archived=include_archived,
+            progress_for=mask_progress_percent
+        )
+    except session_listing.InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @app.get("/templates")
 def get_templates(db: Session = Depends(get_db)):
-    return db.query(models.ContractTemplate).all()
+    T = models.ContractTemplate
+    rows = db.query(T.id, T.name, T.code, T.json_schema, T.docx_path, T.created_at).all()
+    return FastJSONResponse([row._asdict() for row in rows])
 
 @app.post("/start_session")
 def start_session(template_code: str, db: Session = Depends(get_db)):
@@ -419,32 +974,35 @@ def start_session(template_code: str, db: Session = Depends(get_db)):
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
 
-    new_session = models.ContractSession(template_id=template.id, created_at=datetime.now(timezone.utc))
+    field_registry.ensure_registered(template)
+    compiled = get_session_groups(template_code)
+    new_session = models.ContractSession(template_id=template.id, created_at=datetime.now(timezone.utc),
+                                         filled_mask_layout=compiled.layout)
     db.add(new_session)
+    funnel_stats.record(db, template_code, funnel_stats.STEP_STARTED)
     db.commit()
     db.refresh(new_session)
 
     print(f"DEBUG: Starting session for template_code='{template_code}'")
 
-    groups = field_groups.get_group_info(template_code)
-    if not groups:
-        print(f"DEBUG: Групи для '{template_code}' не знайдені. Fallback до 'nadannya_poslug'...")
-        groups = field_groups.get_group_info("nadannya_poslug")
+    if not field_registry.has_own_groups(template_code):
+        print(f"DEBUG: Групи для '{template_code}' не знайдені. Fallback до '{field_registry.DEFAULT_GROUPS_CODE}'...")
+    groups = [group.info for group in compiled.groups]
 
     greeting_intro = f"Вітаю! Я ваш персональний помічник ДІЯ. 🇺🇦\nЯ допоможу вам скласти документ: {template.name}."
 
     first_question = ""
-    if groups and len(groups) > 0:
-        first_group = groups[0]
-        first_question = first_group.get("prompt") or first_group.get("initial_prompt", "Давайте почнемо заповнення.")
+    if compiled.groups:
+        first_question = compiled.groups[0].prompt or "Давайте почнемо заповнення."
     else:
         first_question = "Давайте почнемо. Введіть, будь ласка, місто та дату укладання договору."
 
     full_start_message = f"{greeting_intro}\n\n{first_question}"
 
-    return {
+    return FastJSONResponse({
         "session_id": str(new_session.id),
         "schema": template.json_schema,
         "field_groups": groups,
+        "progress": get_session_progress(new_session),
         "start_message": full_start_message
-    }
\ No newline at end of file
+    })
\ No newline at end of file
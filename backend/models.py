@@ -1,11 +1,15 @@
 import uuid
-from sqlalchemy import Column, Integer, String, JSON, ForeignKey, DateTime, Enum
+from sqlalchemy import Column, Integer, String, JSON, ForeignKey, DateTime, Date, Enum, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 import enum
 
 from database import Base
 
+def utcnow() -> datetime:
+    # Викликається для кожного рядка (а не один раз при імпорті модуля)
+    return datetime.now(timezone.utc)
+
 class SessionStatus(str, enum.Enum):
     draft = "draft"
     completed = "completed"
@@ -19,26 +23,83 @@ class ContractTemplate(Base):
     code = Column(String, unique=True, index=True)
     json_schema = Column(JSON, nullable=False)
     docx_path = Column(String, nullable=False)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utcnow)
 
 class ContractSession(Base):
     __tablename__ = "contract_sessions"
+    # Під keyset-пагінацію GET /sessions: фільтр + сортування (updated_at, id)
+    __table_args__ = (
+        Index("ix_contract_sessions_user_updated", "user_id", "updated_at", "id"),
+        Index("ix_contract_sessions_template_updated", "template_id", "updated_at", "id"),
+        Index("ix_contract_sessions_updated_id", "updated_at", "id"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     template_id = Column(Integer, ForeignKey("contract_templates.id"))
     user_id = Column(Integer, nullable=True)
     answers = Column(JSON, default={})
-    status = Column(Enum(SessionStatus), default=SessionStatus.draft)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
-    updated_at = Column(DateTime, default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc))
+    # Бітова маска заповнених полів (hex), див. field_registry.CompiledTemplate
+    filled_mask = Column(String, default="0")
+    # CompiledTemplate.layout, за яким порахована маска; інший (або NULL) — маска рахується з answers
+    filled_mask_layout = Column(String, nullable=True)
+    status = Column(Enum(SessionStatus), default=SessionStatus.draft, index=True)
+    created_at = Column(DateTime, default=utcnow)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow, index=True)
 
     template = relationship("ContractTemplate")
 
+    @property
+    def filled_bits(self) -> int:
+        return int(self.filled_mask or "0", 16)
+
+    @filled_bits.setter
+    def filled_bits(self, value: int):
+        self.filled_mask = format(value, "x")
+
 class GeneratedContract(Base):
     __tablename__ = "generated_contracts"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    session_id = Column(String, ForeignKey("contract_sessions.id"))
+    session_id = Column(String, ForeignKey("contract_sessions.id"), index=True)
     file_path = Column(String, nullable=False)
+    # sha256 вмісту файлу (див. contract_store) і відбиток відповідей, з яких він зроблений
+    content_hash = Column(String, index=True)
+    answers_hash = Column(String, index=True)
+    size = Column(Integer)
     signed_file_path = Column(String, nullable=True)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
\ No newline at end of file
+    created_at = Column(DateTime, default=utcnow)
+    # Коли документ востаннє віддав /generate; NULL — фоновий рендер (prerender), який ще ніхто не забрав
+    generated_at = Column(DateTime, nullable=True)
+
+    session = relationship("ContractSession")
+
+class ArchivedSession(Base):
+    """Компактний запис завершеної сесії, перенесений з contract_sessions джобою session_compaction."""
+    __tablename__ = "archived_sessions"
+    __table_args__ = (
+        Index("ix_archived_sessions_user_updated", "user_id", "updated_at", "id"),
+        Index("ix_archived_sessions_updated_id", "updated_at", "id"),
+    )
+
+    id = Column(String, primary_key=True)
+    template_code = Column(String, index=True)
+    user_id = Column(Integer, nullable=True, index=True)
+    status = Column(String)
+    answers = Column(JSON)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime, default=utcnow)
+
+class FunnelDailyStat(Base):
+    """Лічильник кроку воронки (started, group:<id>, review, generated) за шаблоном і днем, див. funnel_stats."""
+    __tablename__ = "funnel_daily_stats"
+    __table_args__ = (
+        UniqueConstraint("template_code", "day", "step", name="uq_funnel_daily_stats_key"),
+        Index("ix_funnel_daily_stats_day", "day", "template_code"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    template_code = Column(String, nullable=False)
+    day = Column(Date, nullable=False)
+    step = Column(String, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
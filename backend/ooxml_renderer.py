@@ -0,0 +1,157 @@
+"""
+Рендер договору на рівні zip-пакета OOXML.
+
+python-docx розбирає весь пакет і при збереженні заново серіалізує та стискає кожну частину,
+включно з картинками і стилями, які ніколи не змінюються. Тут переписуються лише
+word/document.xml і колонтитули (і лише ті, де є плейсхолдери), а всі інші члени архіву
+копіюються "як є" — стиснені байти без розпакування.
+
+Заміна в параграфах робиться тим самим services.fill_block_container над oxml-елементами
+python-docx, тому частини виходять ідентичними до шляху через Document(...).
+Сам шаблон (байти + розібрані частини) береться з template_cache.
+"""
+
+import struct
+import zipfile
+import zlib
+
+import services
+import template_cache
+
+# Формати записів zip (APPNOTE.TXT), ті самі, що й у стандартному zipfile
+LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+CENTRAL_HEADER = struct.Struct("<4s4B4HL2L5H2L")
+END_RECORD = struct.Struct("<4s4H2LH")
+DATA_DESCRIPTOR_SIG = b"PK\x07\x08"
+COPY_CHUNK = 1024 * 1024
+ZIP32_LIMIT = 0xFFFFFFFF
+
+
+class UnsupportedPackageError(Exception):
+    """Пакет, який zip-рендер не вміє переписати (ZIP64, шифрування). Використовуйте python-docx."""
+
+
+def render_docx(template_path: str, answers: dict, output_path: str):
+    template = template_cache.cache.get(template_path)
+    for info in template.infolist:
+        _check_supported(info)
+
+    src_fp = template.open_raw()
+    with open(output_path, "wb") as out_fp:
+        writer = _RawZipWriter(out_fp)
+        for info in template.infolist:
+            if info.filename in template.masters:
+                writer.write_deflated(info, render_part(template.new_part(info.filename), answers))
+            else:
+                writer.copy_raw(src_fp, info)
+        writer.close()
+    return output_path
+
+
+def render_part(element, answers: dict) -> bytes:
+    # Ліниво, як і в template_cache: на старті сервера python-docx не потрібен
+    from docx.blkcntnr import BlockItemContainer
+    from docx.opc.oxml import serialize_part_xml
+
+    # У document.xml параграфи і таблиці лежать у w:body, у колонтитулі — прямо в w:hdr/w:ftr
+    body = getattr(element, "body", None)
+    services.fill_block_container(BlockItemContainer(body if body is not None else element, None), answers)
+    return serialize_part_xml(element)
+
+
+def _check_supported(info: zipfile.ZipInfo):
+    if info.flag_bits & 0x01:
+        raise UnsupportedPackageError(f"зашифрований член {info.filename}")
+    if max(info.file_size, info.compress_size, info.header_offset) >= ZIP32_LIMIT:
+        raise UnsupportedPackageError(f"ZIP64 член {info.filename}")
+
+
+def _dos_datetime(date_time) -> tuple[int, int]:
+    year, month, day, hour, minute, second = date_time
+    dos_date = (max(year, 1980) - 1980) << 9 | month << 5 | day
+    dos_time = hour << 11 | minute << 5 | second // 2
+    return dos_time, dos_date
+
+
+def _encode_name(info: zipfile.ZipInfo) -> tuple[bytes, int]:
+    try:
+        return info.filename.encode("ascii"), info.flag_bits & ~0x800
+    except UnicodeEncodeError:
+        return info.filename.encode("utf-8"), info.flag_bits | 0x800
+
+
+class _RawZipWriter:
+    """Мінімальний запис zip: сирі копії чужих записів + нові deflate-записи + центральний каталог."""
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.entries = []  # (ZipInfo з актуальними полями, flag_bits, offset)
+
+    def copy_raw(self, src_fp, info: zipfile.ZipInfo):
+        offset = self.fp.tell()
+        src_fp.seek(info.header_offset)
+        header = src_fp.read(LOCAL_HEADER.size)
+        name_len, extra_len = struct.unpack("<2H", header[26:30])
+        length = name_len + extra_len + info.compress_size
+
+        self.fp.write(header)
+        _copy_bytes(src_fp, self.fp, length)
+
+        if info.flag_bits & 0x08:
+            # Дескриптор даних після стиснених байтів (з сигнатурою або без)
+            signature = src_fp.read(4)
+            self.fp.write(signature)
+            _copy_bytes(src_fp, self.fp, 12 if signature == DATA_DESCRIPTOR_SIG else 8)
+
+        self.entries.append((info, info.flag_bits, offset))
+
+    def write_deflated(self, info: zipfile.ZipInfo, data: bytes):
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        compressed = compressor.compress(data) + compressor.flush()
+
+        new_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+        new_info.compress_type = zipfile.ZIP_DEFLATED
+        new_info.create_system = info.create_system
+        new_info.external_attr = info.external_attr
+        new_info.CRC = zlib.crc32(data)
+        new_info.file_size = len(data)
+        new_info.compress_size = len(compressed)
+
+        name, flags = _encode_name(new_info)
+        dos_time, dos_date = _dos_datetime(new_info.date_time)
+        offset = self.fp.tell()
+        self.fp.write(LOCAL_HEADER.pack(
+            b"PK\x03\x04", 20, 0, flags, zipfile.ZIP_DEFLATED, dos_time, dos_date,
+            new_info.CRC, new_info.compress_size, new_info.file_size, len(name), 0,
+        ))
+        self.fp.write(name)
+        self.fp.write(compressed)
+        self.entries.append((new_info, flags, offset))
+
+    def close(self):
+        directory_offset = self.fp.tell()
+        for info, flags, offset in self.entries:
+            name = info.filename.encode("utf-8" if flags & 0x800 else "cp437")
+            dos_time, dos_date = _dos_datetime(info.date_time)
+            self.fp.write(CENTRAL_HEADER.pack(
+                b"PK\x01\x02", info.create_version, info.create_system, info.extract_version, 0,
+                flags, info.compress_type, dos_time, dos_date,
+                info.CRC, info.compress_size, info.file_size,
+                len(name), len(info.extra), len(info.comment), 0,
+                info.internal_attr, info.external_attr, offset,
+            ))
+            self.fp.write(name)
+            self.fp.write(info.extra)
+            self.fp.write(info.comment)
+        directory_size = self.fp.tell() - directory_offset
+        count = len(self.entries)
+        self.fp.write(END_RECORD.pack(b"PK\x05\x06", 0, 0, count, count, directory_size, directory_offset, 0))
+
+
+def _copy_bytes(src_fp, dst_fp, length: int):
+    while length > 0:
+        chunk = src_fp.read(min(COPY_CHUNK, length))
+        if not chunk:
+            raise UnsupportedPackageError("обрізаний архів")
+        dst_fp.write(chunk)
+        length -= len(chunk)
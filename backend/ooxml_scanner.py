@@ -0,0 +1,94 @@
+"""
+Потоковий сканер плейсхолдерів {{KEY}} прямо з OOXML (.docx).
+
+На відміну від python-docx, не будує об'єктну модель документа: читає частини word/*.xml
+прямо з zip інкрементальним XML-парсером, склеює текст runs у межах параграфа
+і одразу шукає ключі. Бачить також колонтитули, виноски та текстові поля (w:txbxContent).
+
+Поля шаблону (extract_keys) — лише ключі з частин, які заповнює рендер (тіло і колонтитули,
+RENDERED_PART_RE). Плейсхолдери у виносках і коментарях лишаються в документі як є —
+import_templates показує їх у звіті окремо.
+"""
+
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import Dict, List
+
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+W_P = W_NS + "p"
+W_T = W_NS + "t"
+W_TAB = W_NS + "tab"
+W_BR = W_NS + "br"
+W_CR = W_NS + "cr"
+
+PLACEHOLDER_RE = re.compile(r"\{\{(.*?)\}\}")
+
+# Частини з текстом документа. styles/settings/numbering/theme плейсхолдерів не містять.
+CONTENT_PART_RE = re.compile(r"^word/(document|header\d*|footer\d*|footnotes|endnotes|comments)\.xml$")
+# Частини, які заповнюють обидва рушії рендеру (services, ooxml_renderer)
+RENDERED_PART_RE = re.compile(r"^word/(document|header\d*|footer\d*)\.xml$")
+
+
+def iter_content_parts(zf: zipfile.ZipFile) -> List[str]:
+    return [name for name in zf.namelist() if CONTENT_PART_RE.match(name)]
+
+
+def iter_paragraph_texts(stream):
+    """
+    Генерує (індекс параграфа, текст) для XML-потоку однієї частини.
+    Вкладені параграфи (текстові поля всередині параграфа) рахуються окремо,
+    так само як їх бачить Word.
+    """
+    stack = []
+    index = 0
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            if tag == W_P:
+                stack.append([])
+            continue
+
+        if not stack:
+            continue
+        if tag == W_T:
+            stack[-1].append(elem.text or "")
+        elif tag == W_TAB:
+            stack[-1].append("\t")
+        elif tag in (W_BR, W_CR):
+            stack[-1].append("\n")
+        elif tag == W_P:
+            text = "".join(stack.pop())
+            yield index, text
+            index += 1
+            if not stack:
+                # Звільняємо пам'ять: оброблений параграф більше не потрібен
+                elem.clear()
+
+
+def scan_placeholders(docx_path: str) -> Dict[str, List[Dict]]:
+    """
+    Повертає {ключ: [{"part": "word/document.xml", "paragraph": N}, ...]}
+    для всіх {{ключів}} у документі, за один прохід по кожній частині.
+    """
+    found: Dict[str, List[Dict]] = {}
+    with zipfile.ZipFile(docx_path) as zf:
+        for part in iter_content_parts(zf):
+            with zf.open(part) as stream:
+                for index, text in iter_paragraph_texts(stream):
+                    if "{{" not in text:
+                        continue
+                    for match in PLACEHOLDER_RE.finditer(text):
+                        key = match.group(1).strip()
+                        found.setdefault(key, []).append({"part": part, "paragraph": index})
+    return found
+
+
+def rendered_keys(found: Dict[str, List[Dict]]) -> set:
+    """Ключі з результату scan_placeholders, які хоч раз стоять у частині, що заповнює рендер."""
+    return {key for key, places in found.items() if any(RENDERED_PART_RE.match(place["part"]) for place in places)}
+
+
+def extract_keys(docx_path: str) -> set:
+    """Тільки множина ключів, які рендер підставить (те, що потрібно імпорту)."""
+    return rendered_keys(scan_placeholders(docx_path))
@@ -0,0 +1,222 @@
+"""
+Спекулятивний рендер договору, поки користувач перевіряє дані.
+
+Щойно сесія заповнена (або в режимі перевірки змінилися відповіді), документ
+рендериться у фоні й зберігається як звичайний GeneratedContract з відбитком відповідей.
+Тоді "Генеруй" віддає готовий файл із диска, а рендер зникає з критичного шляху.
+
+- Старт відкладається на PRERENDER_DELAY, щоб кілька правок поспіль дали один рендер;
+  нова правка до старту скасовує попередню задачу.
+- Рендер, що вже йде в пулі, не переривається (процес все одно доробить файл) —
+  якщо відповіді за цей час змінилися, його результат просто видаляється.
+  Так само видаляється готовий фоновий документ, який замінила нова правка.
+- Фоновий рендер не стає в чергу пулу: якщо вільного воркера немає, він пропускається,
+  і документ рендериться як раніше — при генерації.
+- /generate для тих самих відповідей дочікується вже запущеного рендеру замість другого.
+"""
+
+import asyncio
+import contextvars
+import os
+from collections import OrderedDict
+
+import contract_store
+import database
+import models
+import render_pool
+
+PRERENDER_ENABLED = os.getenv("PRERENDER_ENABLED", "1") == "1"
+PRERENDER_DELAY = float(os.getenv("PRERENDER_DELAY", "1.0"))
+
+# Скільки готових, але ще не забраних /generate відбитків пам'ятати (лише для статистики)
+MAX_READY = 10000
+
+
+class _Job:
+    __slots__ = ("fingerprint", "task", "rendering")
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.task = None
+        self.rendering = False
+
+
+class Prerenderer:
+    def __init__(self, enabled: bool, delay: float):
+        self.enabled = enabled
+        self.delay = delay
+        self._loop = None
+        self._render = None
+        self._jobs = {}   # session_id -> _Job (останній запланований)
+        self._ready = OrderedDict()   # session_id -> відбиток готового фонового рендеру
+        self._started = 0
+        self._completed = 0
+        self._superseded = 0
+        self._skipped_busy = 0
+        self._failed = 0
+        self._hits = 0
+
+    def start(self, render_func):
+        """
+        Викликається з lifespan. render_func(template_path, answers) -> (content_hash, path, size) —
+        той самий рендер у сховище, що й у /generate (main.render_to_store).
+        """
+        self._loop = asyncio.get_running_loop()
+        self._render = render_func
+
+    def stop(self):
+        for job in self._jobs.values():
+            job.task.cancel()
+        self._jobs.clear()
+        self._loop = None
+
+    def schedule(self, session_id: str, fingerprint: str):
+        """Потокобезпечно: можна викликати і з async-ендпоінтів, і з потоків threadpool."""
+        if not self.enabled or self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._schedule, session_id, fingerprint)
+
+    def _schedule(self, session_id: str, fingerprint: str):
+        if self._loop is None:
+            return
+        current = self._jobs.get(session_id)
+        if current is not None:
+            if current.fingerprint == fingerprint:
+                return
+            self._superseded += 1
+            if not current.rendering:
+                current.task.cancel()
+
+        job = _Job(fingerprint)
+        # Власний контекст: фоновий рендер не рахується у фази запиту, що його запланував
+        job.task = self._loop.create_task(self._run(session_id, job), context=contextvars.Context())
+        job.task.add_done_callback(lambda _: self._forget(session_id, job))
+        self._jobs[session_id] = job
+
+    def _forget(self, session_id: str, job: _Job):
+        if self._jobs.get(session_id) is job:
+            del self._jobs[session_id]
+
+    async def _run(self, session_id: str, job: _Job):
+        await asyncio.sleep(self.delay)
+        if render_pool.pool.busy:
+            self._skipped_busy += 1
+            return
+
+        # Попередній фоновий документ, який так і не забрали, замінюємо новим
+        previous = self._ready.pop(session_id, None)
+        # З'єднання з БД — лише на читання до рендеру і на запис після, не на весь рендер
+        loaded = await asyncio.to_thread(_load, session_id, job.fingerprint, previous)
+        if loaded is None:
+            return
+        if loaded is READY:
+            # Напр. правку в перевірці повернули назад — такий документ уже є
+            self._mark_ready(session_id, job.fingerprint)
+            return
+        template_path, answers = loaded
+
+        job.rendering = True
+        self._started += 1
+        try:
+            rendered = await self._render(template_path, answers)
+            saved = await asyncio.to_thread(_save, session_id, job.fingerprint, rendered)
+        except render_pool.RenderQueueFull:
+            self._skipped_busy += 1
+            return
+        except Exception as e:
+            self._failed += 1
+            print(f"WARNING:   Фоновий рендер сесії {session_id} не вдався: {e}")
+            return
+        self._completed += 1
+        if saved:
+            self._mark_ready(session_id, job.fingerprint)
+
+    def _mark_ready(self, session_id: str, fingerprint: str):
+        self._ready[session_id] = fingerprint
+        self._ready.move_to_end(session_id)
+        while len(self._ready) > MAX_READY:
+            self._ready.popitem(last=False)
+
+    async def wait(self, session_id: str, fingerprint: str):
+        """
+        Для /generate: якщо рендер цих самих відповідей уже йде — дочекатися його.
+        Якщо він ще тільки чекає затримки — скасувати, /generate відрендерить сам.
+        """
+        job = self._jobs.get(session_id)
+        if job is not None and job.fingerprint == fingerprint:
+            if not job.rendering:
+                job.task.cancel()
+                return
+            # asyncio.wait не кидає помилок задачі, але пропускає скасування самого /generate
+            await asyncio.wait({job.task})
+        if self._ready.get(session_id) == fingerprint:
+            del self._ready[session_id]
+            self._hits += 1
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "delay_seconds": self.delay,
+            "pending": len(self._jobs),
+            "started": self._started,
+            "completed": self._completed,
+            "superseded": self._superseded,
+            "skipped_busy": self._skipped_busy,
+            "failed": self._failed,
+            "served_from_prerender": self._hits,
+        }
+
+
+READY = object()
+
+
+def _load(session_id: str, fingerprint: str, previous: str | None):
+    """(шаблон, відповіді) для рендеру; READY — документ уже є; None — відповіді вже інші."""
+    with database.SessionLocal() as db:
+        session = db.get(models.ContractSession, session_id)
+        if session is None or contract_store.answers_fingerprint(session.template, session.answers) != fingerprint:
+            return None
+        if previous is not None and previous != fingerprint:
+            outdated = find_stored(db, session_id, previous)
+            if outdated is not None:
+                discard(db, outdated)
+        stored = find_stored(db, session_id, fingerprint)
+        if stored is not None and os.path.exists(stored.file_path):
+            return READY
+        return session.template.docx_path, dict(session.answers or {})
+
+
+def _save(session_id: str, fingerprint: str, rendered: tuple) -> bool:
+    """Записує відрендерений документ. Якщо поки рендерили відповіді змінилися — файл нікому не потрібен."""
+    content_hash, path, size = rendered
+    with database.SessionLocal() as db:
+        session = db.get(models.ContractSession, session_id)
+        if session is None or contract_store.answers_fingerprint(session.template, session.answers) != fingerprint:
+            contract_store.remove_unreferenced(db, [(content_hash, path)])
+            return False
+        contract = find_stored(db, session_id, fingerprint)
+        if contract is None:
+            contract = models.GeneratedContract(session_id=session_id, answers_hash=fingerprint)
+            db.add(contract)
+        contract.file_path = path
+        contract.content_hash = content_hash
+        contract.size = size
+        db.commit()
+        return True
+
+
+def find_stored(db, session_id: str, fingerprint: str) -> models.GeneratedContract | None:
+    return db.query(models.GeneratedContract).filter(
+        models.GeneratedContract.session_id == session_id,
+        models.GeneratedContract.answers_hash == fingerprint
+    ).first()
+
+
+def discard(db, contract: models.GeneratedContract):
+    """Видаляє запис; файл — лише якщо на цей вміст не посилається жоден інший запис."""
+    db.delete(contract)
+    db.commit()
+    contract_store.remove_unreferenced(db, [(contract.content_hash, contract.file_path)])
+
+
+prerenderer = Prerenderer(PRERENDER_ENABLED, PRERENDER_DELAY)
@@ -0,0 +1,168 @@
+"""
+Окремий пул процесів для рендеру договорів.
+
+Рендер — це CPU-робота з GIL, тому в спільному threadpool Starlette він гальмує
+всі синхронні ендпоінти. Тут він іде в окремі процеси (за замовчуванням по одному на ядро),
+а кількість задач у черзі обмежена: коли черга повна, клієнт отримує 503 з Retry-After,
+замість того щоб сервер накопичував роботу.
+
+Місце в черзі звільняється, коли процес справді дорендерив: якщо клієнт відключився
+посеред рендеру, корутину скасовано, але воркер ще зайнятий — і рахується зайнятим.
+
+Кеш шаблонів (template_cache) живе в кожному воркері; воркер повертає знімок своїх
+лічильників разом із результатом, і пул тримає останній знімок кожного процесу.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import request_profiler
+import services
+import template_cache
+
+# 0 — рендерити в потоці поточного процесу (зручно для розробки)
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(os.cpu_count() or 1)))
+RENDER_QUEUE_SIZE = int(os.getenv("RENDER_QUEUE_SIZE", "16"))
+RENDER_MP_CONTEXT = os.getenv("RENDER_MP_CONTEXT", "spawn")
+
+
+class RenderQueueFull(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Render queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _render_job(submitted_at: float, template_path: str, answers: dict, output_path: str):
+    """
+    Виконується в процесі пулу. Повертає (час очікування в черзі, час рендеру,
+    pid воркера, знімок його кешу шаблонів).
+    """
+    started = time.time()
+    services.generate_contract_docx(template_path, answers, output_path)
+    return started - submitted_at, time.time() - started, os.getpid(), template_cache.cache.stats()
+
+
+class RenderPool:
+    def __init__(self, workers: int, queue_size: int, mp_context: str):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.mp_context = mp_context
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0     # прийняті, але ще не завершені задачі
+        self._completed = 0
+        self._rejected = 0
+        self._waits = deque(maxlen=100)
+        self._durations = deque(maxlen=100)
+        self._cache_stats = OrderedDict()   # pid воркера -> останній знімок його кешу шаблонів
+
+    @property
+    def capacity(self) -> int:
+        return max(self.workers, 1) + self.queue_size
+
+    @property
+    def busy(self) -> bool:
+        """Усі воркери зайняті — нова задача стала б у чергу."""
+        with self._lock:
+            return self._pending >= max(self.workers, 1)
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.workers > 0:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.mp_context),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="render")
+        return self._executor
+
+    def _admit(self):
+        with self._lock:
+            if self._pending >= self.capacity:
+                self._rejected += 1
+                raise RenderQueueFull(self._retry_after())
+            self._pending += 1
+
+    def _retry_after(self) -> int:
+        avg = sum(self._durations) / len(self._durations) if self._durations else 1.0
+        return max(1, round(avg * self._pending / max(self.workers, 1)))
+
+    async def render(self, template_path: str, answers: dict, output_path: str):
+        """Рендерить у пулі. Кидає RenderQueueFull, якщо черга заповнена."""
+        self._admit()
+        try:
+            job = self._get_executor().submit(_render_job, time.time(), template_path, answers, output_path)
+        except BaseException:
+            self._release()
+            raise
+        job.add_done_callback(self._finished)
+
+        try:
+            with request_profiler.phase("render"):
+                await asyncio.wrap_future(job)
+        except asyncio.CancelledError:
+            # Задача, що вже рендериться, не скасовується — її файл нікому не потрібен
+            job.add_done_callback(lambda _: _remove_quietly(output_path))
+            raise
+        return output_path
+
+    def _finished(self, job):
+        """Колбек з потоку пулу: задача завершилась (або була скасована ще в черзі)."""
+        self._release()
+        if job.cancelled() or job.exception() is not None:
+            return
+        wait, duration, pid, cache_stats = job.result()
+        with self._lock:
+            self._completed += 1
+            self._waits.append(wait)
+            self._durations.append(duration)
+            self._cache_stats[pid] = cache_stats
+            self._cache_stats.move_to_end(pid)
+            # Воркер, якого замінив новий процес, знімків більше не надсилає
+            while len(self._cache_stats) > max(self.workers, 1):
+                self._cache_stats.popitem(last=False)
+
+    def template_cache_stats(self) -> dict:
+        """{pid: stats()} кешу шаблонів кожного воркера — на момент його останнього рендеру."""
+        with self._lock:
+            return dict(self._cache_stats)
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            running = min(self._pending, max(self.workers, 1))
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "running": running,
+                "queue_depth": self._pending - running,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_wait_seconds": round(sum(self._waits) / len(self._waits), 3) if self._waits else 0.0,
+                "max_wait_seconds": round(max(self._waits), 3) if self._waits else 0.0,
+                "avg_render_seconds": round(sum(self._durations) / len(self._durations), 3) if self._durations else 0.0,
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+pool = RenderPool(RENDER_WORKERS, RENDER_QUEUE_SIZE, RENDER_MP_CONTEXT)
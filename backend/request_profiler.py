@@ -0,0 +1,265 @@
+"""
+Таймінги фаз запиту, журнал повільних запитів і профіль окремого запиту на вимогу.
+
+Кожен HTTP-запит отримує (через contextvar) лічильник фаз:
+- db / db_lazy_load — час SQL (лінива підвантажка зв'язків на кшталт session.template окремо);
+- validation — pydantic-валідація відповідей;
+- prompt — збирання промпта;
+- llm_queue / llm — очікування слота планувальника і сам виклик LLM;
+- render — рендер документа в пулі (python-docx);
+- serialize — серіалізація JSON-відповіді;
+- other — решта часу запиту.
+
+Запити, довші за PROFILE_SLOW_MS, пишуться в лог з розкладом по фазах і зберігаються
+в кільцевому буфері (/admin/slow_requests).
+
+Повний профіль одного запиту: заголовок `X-Profile: <PROFILE_TOKEN>` (без токена вимкнено)
+або випадкова вибірка PROFILE_SAMPLE_RATE. Профіль — pyinstrument (статистичний, HTML),
+якщо він встановлений (requirements-dev.txt), інакше cProfile (текст). Файли — у PROFILE_DIR.
+cProfile детермінований і трасує весь цикл подій, тобто сповільнює і сусідні запити, тому
+без pyinstrument вибірка вимкнена — лишається тільки профіль за заголовком.
+Обидва профілюють потік циклу подій, тобто async-ендпоінти; у синхронних ендпоінтах
+(threadpool) лишаються таймінги фаз. Одночасно профілюється не більше одного запиту.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+try:
+    import pyinstrument
+except ImportError:  # pragma: no cover - необов'язкова залежність
+    pyinstrument = None
+
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "1000"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "storage/profiles")
+SLOW_LOG_SIZE = int(os.getenv("PROFILE_SLOW_LOG_SIZE", "100"))
+
+PROFILE_HEADER = b"x-profile"
+
+if PROFILE_SAMPLE_RATE > 0 and pyinstrument is None:
+    print("WARNING:   PROFILE_SAMPLE_RATE ігнорується: pyinstrument не встановлений, "
+          "а cProfile сповільнює весь цикл подій. Профіль — лише за заголовком X-Profile")
+
+
+class RequestTimings:
+    __slots__ = ("phases",)
+
+    def __init__(self):
+        self.phases = {}   # фаза -> [секунди, кількість]
+
+    def add(self, name: str, seconds: float):
+        entry = self.phases.get(name)
+        if entry is None:
+            self.phases[name] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def breakdown(self, total: float) -> dict:
+        result = {name: {"ms": round(seconds * 1000, 1), "count": count}
+                  for name, (seconds, count) in self.phases.items()}
+        # SQL може потрапити і в db, і в охопну фазу (напр. prompt) — тому не менше нуля
+        other = total - sum(seconds for seconds, _ in self.phases.values())
+        result["other"] = {"ms": round(max(0.0, other) * 1000, 1), "count": 1}
+        return result
+
+
+_current: ContextVar[RequestTimings | None] = ContextVar("request_timings", default=None)
+_lazy_load: ContextVar[bool] = ContextVar("request_lazy_load", default=False)
+
+
+def add(name: str, seconds: float):
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def phase(name: str):
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+
+def instrument_engine(engine):
+    """Час SQL-запитів у фазі db; запити лінивих зв'язків — у db_lazy_load."""
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["profile_started"].pop()
+        add("db_lazy_load" if _lazy_load.get() else "db", elapsed)
+
+    @event.listens_for(Session, "do_orm_execute")
+    def _do_orm_execute(state):
+        if not state.is_relationship_load or _current.get() is None:
+            return None
+        token = _lazy_load.set(True)
+        try:
+            return state.invoke_statement()
+        finally:
+            _lazy_load.reset(token)
+
+
+class _Profile:
+    """Профіль одного запиту. start() повертає False, якщо інший запит уже профілюється."""
+
+    _busy = threading.Lock()
+
+    def __init__(self):
+        self._profiler = None
+
+    def start(self) -> bool:
+        if not self._busy.acquire(blocking=False):
+            return False
+        try:
+            if pyinstrument is not None:
+                self._profiler = pyinstrument.Profiler(async_mode="enabled")
+                self._profiler.start()
+            else:
+                import cProfile
+                self._profiler = cProfile.Profile()
+                self._profiler.enable()
+        except Exception as e:
+            # Напр. у процесі вже працює інший профайлер — запит не повинен від цього падати
+            print(f"WARNING:   Не вдалося запустити профайлер: {e}")
+            self._busy.release()
+            return False
+        return True
+
+    def stop(self, label: str) -> str:
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            name = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{label}"
+            if pyinstrument is not None:
+                self._profiler.stop()
+                path = os.path.join(PROFILE_DIR, f"{name}.html")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(self._profiler.output_html())
+            else:
+                import pstats
+                self._profiler.disable()
+                path = os.path.join(PROFILE_DIR, f"{name}.txt")
+                with open(path, "w", encoding="utf-8") as f:
+                    pstats.Stats(self._profiler, stream=f).sort_stats("cumulative").print_stats(60)
+            return path
+        finally:
+            self._busy.release()
+
+
+def _wants_profile(scope) -> bool:
+    if PROFILE_TOKEN:
+        for key, value in scope.get("headers", ()):
+            if key == PROFILE_HEADER:
+                return value.decode("latin-1") == PROFILE_TOKEN
+    sample_rate = _sample_rate()
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+def _sample_rate() -> float:
+    # Вибірка лише статистичним профайлером; cProfile — тільки для явного запиту з токеном
+    return PROFILE_SAMPLE_RATE if pyinstrument is not None else 0.0
+
+
+def _route_path(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or scope.get("path", "")
+
+
+_slow_requests = deque(maxlen=SLOW_LOG_SIZE)
+_requests_seen = 0
+
+
+class ProfilingMiddleware:
+    """ASGI-middleware: таймінги фаз для кожного HTTP-запиту, профіль — на вимогу."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        profile = _Profile() if _wants_profile(scope) else None
+        if profile is not None and not profile.start():
+            profile = None
+        status = 0
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            total = time.perf_counter() - started
+            _current.reset(token)
+            route = _route_path(scope)
+            profile_path = None
+            if profile is not None:
+                label = route.strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+                profile_path = profile.stop(f"{scope['method']}-{label}")
+            _observe(scope["method"], route, status, total, timings, profile_path)
+
+
+def _observe(method: str, route: str, status: int, total: float, timings: RequestTimings,
+             profile_path: str | None):
+    global _requests_seen
+    _requests_seen += 1
+    total_ms = total * 1000
+    if total_ms < PROFILE_SLOW_MS and profile_path is None:
+        return
+
+    phases = timings.breakdown(total)
+    entry = {
+        "at": datetime.now().isoformat(timespec="seconds"),
+        "method": method,
+        "route": route,
+        "status": status,
+        "total_ms": round(total_ms, 1),
+        "phases": phases,
+        "profile": profile_path,
+    }
+    _slow_requests.append(entry)
+
+    parts = ", ".join(f"{name} {p['ms']:.0f} ms" + (f" ({p['count']})" if p["count"] > 1 else "")
+                      for name, p in sorted(phases.items(), key=lambda item: -item[1]["ms"]))
+    kind = "Повільний запит" if total_ms >= PROFILE_SLOW_MS else "Профіль запиту"
+    print(f"WARNING:   {kind} {method} {route} -> {status} за {total_ms:.0f} ms: {parts}"
+          + (f" [профіль: {profile_path}]" if profile_path else ""))
+
+
+def stats() -> dict:
+    return {
+        "slow_threshold_ms": PROFILE_SLOW_MS,
+        "sample_rate": _sample_rate(),
+        "header_profiling": bool(PROFILE_TOKEN),
+        "profiler": "pyinstrument" if pyinstrument is not None else "cProfile",
+        "requests_seen": _requests_seen,
+        "slow_requests": list(reversed(_slow_requests)),
+    }
@@ -1,25 +1,51 @@
-from docx import Document
+from lxml import etree
 import os
 
-def generate_contract_docx(template_path: str, answers: dict, output_path: str):
+import ooxml_renderer
+import ooxml_scanner
+import template_cache
+
+# "python-docx" — повний розбір пакета, "zip" — рендер на рівні zip (ooxml_renderer).
+# zip вмикати, коли tests/test_render_engines.py пройшов на робочій бібліотеці шаблонів
+RENDER_ENGINE = os.getenv("RENDER_ENGINE", "python-docx")
+
+def generate_contract_docx(template_path: str, answers: dict, output_path: str, engine: str | None = None):
     if not os.path.exists(template_path):
         raise FileNotFoundError(f"Template not found: {template_path}")
 
-    doc = Document(template_path)
+    if (engine or RENDER_ENGINE) == "zip":
+        try:
+            return ooxml_renderer.render_docx(template_path, answers, output_path)
+        except ooxml_renderer.UnsupportedPackageError as e:
+            print(f"WARNING:   Zip-рендер не підтримує {template_path} ({e}), рендеримо через python-docx.")
+
+    from docx import Document
+    from docx.blkcntnr import BlockItemContainer
+    doc = Document(template_cache.cache.get(template_path).open_raw())
+    fill_block_container(doc, answers)
+    # Колонтитули — ті самі частини, що заповнює zip-рендер (через section.header python-docx
+    # створив би колонтитул там, де його немає)
+    for part in doc.part.package.iter_parts():
+        if part is not doc.part and ooxml_scanner.RENDERED_PART_RE.match(part.partname.lstrip("/")):
+            fill_block_container(BlockItemContainer(part.element, None), answers)
+    doc.save(output_path)
+    return output_path
 
+def fill_block_container(container, answers):
+    """Підставляє відповіді в параграфи та таблиці документа (або docx.document._Body)."""
     # 1. Параграфи
-    for para in doc.paragraphs:
+    for para in container.paragraphs:
         replace_text_preserving_style(para, answers)
 
     # 2. Таблиці
-    for table in doc.tables:
+    for table in container.tables:
         for row in table.rows:
             for cell in row.cells:
                 for para in cell.paragraphs:
                     replace_text_preserving_style(para, answers)
 
-    doc.save(output_path)
-    return output_path
+# Весь текст параграфа одним викликом lxml — надмножина paragraph.text
+_raw_paragraph_text = etree.XPath("string(.)")
 
 def replace_text_preserving_style(paragraph, answers):
     """
@@ -29,6 +55,10 @@ def replace_text_preserving_style(paragraph, answers):
     3. Видаляє старий вміст параграфа.
     4. Записує новий текст, копіюючи стиль (шрифт, розмір, жирність) з оригінального початку.
     """
+    # Найдешевша перевірка (XPath рахується в C): без "{{" плейсхолдерів у параграфі немає
+    if "{{" not in _raw_paragraph_text(paragraph._p):
+        return
+
     text = paragraph.text
     # Швидка перевірка, чи варто взагалі чіпати цей параграф
     has_changes = False
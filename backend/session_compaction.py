@@ -0,0 +1,119 @@
+"""
+Фонова джоба, що тримає contract_sessions маленькою.
+
+- Чернетки, які не оновлювались довше за SESSION_DRAFT_TTL_HOURS, видаляються.
+  Разом з ними — їхні згенеровані документи; файл зі сховища видаляється, якщо на його
+  вміст більше ніхто не посилається.
+- Завершені/підписані сесії, старші за SESSION_ARCHIVE_AFTER_HOURS, переносяться
+  в компактну таблицю archived_sessions (без маски і службових полів).
+- Файли сховища без жодного запису (і забуті тимчасові) прибираються contract_store.collect_garbage.
+
+Обробка йде пачками по COMPACTION_BATCH рядків, щоб не тримати довгих транзакцій.
+Серед кількох воркерів у кожному циклі працює лише той, хто захопив лок.
+"""
+
+import asyncio
+import os
+from datetime import timedelta
+
+import contract_store
+import database
+import models
+import startup
+
+SESSION_DRAFT_TTL_HOURS = float(os.getenv("SESSION_DRAFT_TTL_HOURS", "72"))
+SESSION_ARCHIVE_AFTER_HOURS = float(os.getenv("SESSION_ARCHIVE_AFTER_HOURS", "24"))
+COMPACTION_INTERVAL_SECONDS = float(os.getenv("COMPACTION_INTERVAL_SECONDS", "3600"))
+COMPACTION_BATCH = int(os.getenv("COMPACTION_BATCH", "500"))
+COMPACTION_LOCK_PATH = os.getenv("COMPACTION_LOCK_PATH", "storage/.compaction.lock")
+
+ARCHIVED_STATUSES = (models.SessionStatus.completed, models.SessionStatus.signed)
+
+
+def expire_stale_drafts(db, now) -> int:
+    cutoff = now - timedelta(hours=SESSION_DRAFT_TTL_HOURS)
+    removed = 0
+    while True:
+        ids = [row.id for row in db.query(models.ContractSession.id).filter(
+            models.ContractSession.status == models.SessionStatus.draft,
+            models.ContractSession.updated_at < cutoff
+        ).limit(COMPACTION_BATCH)]
+        if not ids:
+            return removed
+
+        files = db.query(models.GeneratedContract.content_hash, models.GeneratedContract.file_path).filter(
+            models.GeneratedContract.session_id.in_(ids)
+        ).all()
+        db.query(models.GeneratedContract).filter(
+            models.GeneratedContract.session_id.in_(ids)
+        ).delete(synchronize_session=False)
+        db.query(models.ContractSession).filter(
+            models.ContractSession.id.in_(ids)
+        ).delete(synchronize_session=False)
+        db.commit()
+        # Напр. фоновий рендер чернетки, яку так і не згенерували
+        contract_store.remove_unreferenced(db, files)
+        removed += len(ids)
+
+
+def archive_finished_sessions(db, now) -> int:
+    cutoff = now - timedelta(hours=SESSION_ARCHIVE_AFTER_HOURS)
+    archived = 0
+    while True:
+        sessions = db.query(models.ContractSession).filter(
+            models.ContractSession.status.in_(ARCHIVED_STATUSES),
+            models.ContractSession.updated_at < cutoff
+        ).limit(COMPACTION_BATCH).all()
+        if not sessions:
+            return archived
+
+        for session in sessions:
+            db.merge(models.ArchivedSession(
+                id=session.id,
+                template_code=session.template.code if session.template else None,
+                user_id=session.user_id,
+                status=session.status.value,
+                answers=session.answers,
+                created_at=session.created_at,
+                updated_at=session.updated_at,
+                archived_at=now,
+            ))
+        # Згенеровані документи залишаються в generated_contracts і доступні за session_id
+        db.query(models.ContractSession).filter(
+            models.ContractSession.id.in_([s.id for s in sessions])
+        ).delete(synchronize_session=False)
+        db.commit()
+        archived += len(sessions)
+
+
+def compact_sessions() -> dict | None:
+    """Один прохід компакції. Повертає None, якщо зараз компакцію робить інший процес."""
+    with startup.file_lock(COMPACTION_LOCK_PATH, blocking=False) as acquired:
+        if not acquired:
+            return None
+
+        now = models.utcnow()
+        db = database.SessionLocal()
+        try:
+            result = {
+                "expired_drafts": expire_stale_drafts(db, now),
+                "archived_sessions": archive_finished_sessions(db, now),
+                "removed_files": contract_store.collect_garbage(db),
+            }
+        finally:
+            db.close()
+
+    if any(result.values()):
+        print(f"INFO:      Компакція сесій: видалено чернеток {result['expired_drafts']}, "
+              f"архівовано {result['archived_sessions']}, файлів зі сховища {result['removed_files']}.")
+    return result
+
+
+async def run_periodically():
+    """Нескінченний цикл для lifespan: компакція раз на COMPACTION_INTERVAL_SECONDS."""
+    while True:
+        try:
+            await asyncio.to_thread(compact_sessions)
+        except Exception as e:
+            print(f"ERROR:     Помилка компакції сесій: {e}")
+        await asyncio.sleep(COMPACTION_INTERVAL_SECONDS)
@@ -0,0 +1,137 @@
+"""
+Список сесій користувача з keyset-пагінацією по (updated_at, id).
+
+Замість OFFSET (який сканує всі попередні сторінки) кожна сторінка продовжується
+від курсора — останньої пари (updated_at, id). Обидві таблиці (активні сесії
+та архів) мають складені індекси під ці фільтри, тому сторінка читає лише
+потрібні рядки. Поле answers не читається взагалі.
+"""
+
+import base64
+import heapq
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+import models
+
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(updated_at: datetime, session_id: str) -> str:
+    raw = f"{updated_at.isoformat()}|{session_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        updated_at, session_id = raw.split("|", 1)
+        return datetime.fromisoformat(updated_at), session_id
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def _apply_window(query, model, cursor, date_from, date_to, limit):
+    if date_from:
+        query = query.filter(model.updated_at >= date_from)
+    if date_to:
+        query = query.filter(model.updated_at < date_to)
+    if cursor:
+        query = query.filter(tuple_(model.updated_at, model.id) < tuple_(*cursor))
+    return query.order_by(model.updated_at.desc(), model.id.desc()).limit(limit)
+
+
+def _active_sessions(db, user_id, template, status, cursor, date_from, date_to, limit, progress_for):
+    S, T = models.ContractSession, models.ContractTemplate
+    query = db.query(
+        S.id, S.user_id, S.status, S.created_at, S.updated_at, S.filled_mask, S.filled_mask_layout, T.code, T.name
+    ).join(T, S.template_id == T.id)
+    if user_id is not None:
+        query = query.filter(S.user_id == user_id)
+    if template is not None:
+        query = query.filter(S.template_id == template.id)
+    if status is not None:
+        query = query.filter(S.status == status)
+
+    for row in _apply_window(query, S, cursor, date_from, date_to, limit):
+        yield {
+            "id": row.id,
+            "user_id": row.user_id,
+            "template_code": row.code,
+            "template_name": row.name,
+            "status": row.status.value if row.status else None,
+            "created_at": row.created_at,
+            "updated_at": row.updated_at,
+            "progress_percent": progress_for(row.code, row.filled_mask, row.filled_mask_layout),
+            "archived": False,
+        }
+
+
+def _archived_sessions(db, user_id, template_code, status, cursor, date_from, date_to, limit, template_names):
+    A = models.ArchivedSession
+    query = db.query(A.id, A.user_id, A.status, A.created_at, A.updated_at, A.template_code)
+    if user_id is not None:
+        query = query.filter(A.user_id == user_id)
+    if template_code is not None:
+        query = query.filter(A.template_code == template_code)
+    if status is not None:
+        query = query.filter(A.status == status.value)
+
+    for row in _apply_window(query, A, cursor, date_from, date_to, limit):
+        yield {
+            "id": row.id,
+            "user_id": row.user_id,
+            "template_code": row.template_code,
+            "template_name": template_names.get(row.template_code),
+            "status": row.status,
+            "created_at": row.created_at,
+            "updated_at": row.updated_at,
+            "progress_percent": 100,
+            "archived": True,
+        }
+
+
+def list_sessions(db, *, user_id=None, template_code=None, status=None, date_from=None, date_to=None,
+                  cursor=None, limit=20, include_archived=True, progress_for=None) -> dict:
+    """
+    Повертає {"items": [...], "next_cursor": str | None}, від новіших до старіших.
+    `progress_for(template_code, filled_mask, layout)` рахує відсоток заповнення (O(1) по масці).
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    position = decode_cursor(cursor) if cursor else None
+    progress_for = progress_for or (lambda code, mask, layout: None)
+
+    template = None
+    if template_code is not None:
+        template = db.query(models.ContractTemplate).filter_by(code=template_code).first()
+
+    # Кожна таблиця віддає не більше limit + 1 рядків, далі — злиття двох відсортованих потоків
+    streams = []
+    if template_code is None or template is not None:
+        streams.append(list(_active_sessions(
+            db, user_id, template, status, position, date_from, date_to, limit + 1, progress_for
+        )))
+    if include_archived and status not in (models.SessionStatus.draft,):
+        names = dict(db.query(models.ContractTemplate.code, models.ContractTemplate.name))
+        streams.append(list(_archived_sessions(
+            db, user_id, template_code, status, position, date_from, date_to, limit + 1, names
+        )))
+
+    merged = heapq.merge(*streams, key=lambda item: (item["updated_at"], item["id"]), reverse=True)
+    items = []
+    for item in merged:
+        items.append(item)
+        if len(items) > limit:
+            break
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = encode_cursor(last["updated_at"], last["id"])
+    return {"items": items, "next_cursor": next_cursor}
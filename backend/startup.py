@@ -0,0 +1,123 @@
+"""
+Старт сервера, безпечний для кількох процесів (uvicorn --workers N, gunicorn).
+
+Створення схеми і сканування шаблонів виконує лише один процес за раз — під файловим
+локом. Хто захопив лок першим, той і імпортує; решта чекають на лок, бачать,
+що всі шаблони вже в БД, і пропускають імпорт.
+"""
+
+import importlib
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import database
+import field_registry
+import models
+import templates_importer
+
+TEMPLATES_DIR = "storage/templates"
+STARTUP_LOCK_PATH = os.getenv("STARTUP_LOCK_PATH", "storage/.startup.lock")
+# 0 — не прогрівати: важкі SDK завантажаться при першому запиті, якому вони потрібні
+WARMUP_IMPORTS = os.getenv("WARMUP_IMPORTS", "1") == "1"
+# Модулі, які не імпортуються на старті (див. get_llm_client, templates_importer, template_cache)
+HEAVY_MODULES = ("openai", "docx", "docx.oxml", "docx.document", "docx.opc.oxml")
+
+
+@contextmanager
+def file_lock(path: str, blocking: bool = True):
+    """
+    Ексклюзивний міжпроцесний лок на файлі. Повертає True, якщо лок захоплено.
+    blocking=False — не чекати: якщо лок у іншого процесу, одразу повертає False.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a+") as f:
+        if fcntl:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    if not blocking:
+                        yield False
+                        return
+                    # LK_LOCK здається після ~10 секунд — чекаємо далі
+        try:
+            yield True
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def missing_template_codes(db, folder: str = TEMPLATES_DIR) -> set:
+    """Коди .docx файлів з папки, яких ще немає в БД."""
+    codes = {os.path.splitext(f)[0] for f in os.listdir(folder) if f.endswith(".docx")}
+    if not codes:
+        return set()
+    existing = db.query(models.ContractTemplate.code).filter(models.ContractTemplate.code.in_(codes)).all()
+    return codes - {code for (code,) in existing}
+
+
+def prepare_storage_and_templates():
+    """Схема БД + папки + імпорт шаблонів. Безпечно викликати з кожного воркера."""
+    with file_lock(STARTUP_LOCK_PATH):
+        database.ensure_schema()
+        os.makedirs(TEMPLATES_DIR, exist_ok=True)
+
+        db = database.SessionLocal()
+        try:
+            if not missing_template_codes(db):
+                print(f"INFO:      Всі шаблони вже в БД (pid {os.getpid()} пропускає імпорт).")
+                return
+            print(f"INFO:      Запуск сканування шаблонів (pid {os.getpid()})...")
+            templates_importer.run_auto_import(db)
+        finally:
+            db.close()
+
+
+def load_field_registry():
+    """Реєструє поля всіх шаблонів з БД і компілює їх (схеми валідації будуються тут, а не в запитах)."""
+    db = database.SessionLocal()
+    try:
+        templates = db.query(models.ContractTemplate).all()
+        for template in templates:
+            try:
+                field_registry.register_template(template.code, template.json_schema, template.docx_path)
+                field_registry.get_template(template.code)
+            except Exception as e:
+                print(f"ERROR:     Реєстр полів: шаблон '{template.code}' не скомпільовано: {e}")
+    finally:
+        db.close()
+    print(f"INFO:      Реєстр полів: скомпільовано шаблонів — {len(templates)}.")
+
+
+def warm_up_imports():
+    """
+    Імпортує важкі SDK вже після того, як воркер почав приймати запити.
+    Так /templates відповідає одразу, а перший LLM-запит чи рендер не платить за імпорт.
+    """
+    if not WARMUP_IMPORTS:
+        return
+    started = time.perf_counter()
+    for name in HEAVY_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"WARNING:   Прогрів: не вдалося імпортувати {name}: {e}")
+    print(f"INFO:      Прогрів імпортів завершено за {time.perf_counter() - started:.2f} с (pid {os.getpid()}).")
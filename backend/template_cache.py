@@ -0,0 +1,166 @@
+"""
+LRU-кеш розібраних шаблонів .docx.
+
+Для кожного шаблону в пам'яті лежать сирі байти файлу, список членів zip і "майстри"
+частин з плейсхолдерами (word/document.xml і колонтитули), уже розібрані в oxml-елементи
+python-docx. Кожен рендер отримує глибокі копії майстрів (копіювання дерева в lxml — це C,
+без повторного парсингу) і читає решту пакета з пам'яті, а не з диска.
+
+Запис інвалідовується, коли змінюються mtime або розмір файлу.
+
+Кеш — у кожному процесі, що рендерить (воркери render_pool), і кожен займає до
+TEMPLATE_CACHE_MAX_MB. Воркери повертають знімок stats() разом із результатом рендеру,
+combined_stats зводить їх для /admin/template_cache.
+"""
+
+import copy
+import hashlib
+import io
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import ooxml_scanner
+
+TEMPLATE_CACHE_MAX_MB = float(os.getenv("TEMPLATE_CACHE_MAX_MB", "64"))
+TEMPLATE_CACHE_MAX_ENTRIES = int(os.getenv("TEMPLATE_CACHE_MAX_ENTRIES", "32"))
+
+# Грубий множник: скільки пам'яті займає розібране дерево lxml відносно сирого XML
+PARSED_XML_OVERHEAD = 4
+
+
+@dataclass
+class CachedTemplate:
+    path: str
+    mtime_ns: int
+    size: int
+    content_hash: str
+    raw: bytes
+    infolist: list
+    xml_size: int
+    masters: dict  # частина -> CT_Document / CT_HdrFtr; лише частини, де є плейсхолдери
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self.raw) + self.xml_size * PARSED_XML_OVERHEAD
+
+    def open_raw(self) -> io.BytesIO:
+        return io.BytesIO(self.raw)
+
+    def new_part(self, name: str):
+        """Свіжа копія розібраної частини для одного рендеру."""
+        return copy.deepcopy(self.masters[name])
+
+
+def load_template(path: str, stat: os.stat_result) -> CachedTemplate:
+    # python-docx вантажиться лише при першому рендері, а не при старті сервера
+    from docx.oxml import parse_xml
+
+    with open(path, "rb") as f:
+        raw = f.read()
+
+    masters = {}
+    xml_size = 0
+    with zipfile.ZipFile(io.BytesIO(raw)) as zf:
+        infolist = zf.infolist()
+        for info in infolist:
+            if ooxml_scanner.RENDERED_PART_RE.match(info.filename):
+                xml = zf.read(info)
+                if b"{{" in xml:
+                    masters[info.filename] = parse_xml(xml)
+                    xml_size += len(xml)
+
+    return CachedTemplate(
+        path=path,
+        mtime_ns=stat.st_mtime_ns,
+        size=stat.st_size,
+        content_hash=hashlib.sha256(raw).hexdigest(),
+        raw=raw,
+        infolist=infolist,
+        xml_size=xml_size,
+        masters=masters,
+    )
+
+
+class TemplateCache:
+    def __init__(self, max_bytes: int, max_entries: int):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, CachedTemplate] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: str) -> CachedTemplate:
+        key = os.path.abspath(path)
+        stat = os.stat(key)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = load_template(key, stat)
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._evict()
+        return entry
+
+    def _evict(self):
+        # Останній (щойно доданий) запис не витісняємо, навіть якщо він сам більший за ліміт
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self._memory_bytes() > self.max_bytes
+        ):
+            self._entries.popitem(last=False)
+
+    def _memory_bytes(self) -> int:
+        return sum(e.memory_bytes for e in self._entries.values())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+                "memory_bytes": self._memory_bytes(),
+                "max_bytes": self.max_bytes,
+                "templates": [
+                    {"path": e.path, "content_hash": e.content_hash, "memory_bytes": e.memory_bytes}
+                    for e in self._entries.values()
+                ],
+            }
+
+
+def combined_stats(snapshots: dict) -> dict:
+    """Зведення знімків stats() кількох процесів ({pid: stats}) + кожен процес окремо."""
+    hits = sum(s["hits"] for s in snapshots.values())
+    misses = sum(s["misses"] for s in snapshots.values())
+    return {
+        "processes": len(snapshots),
+        "entries": sum(s["entries"] for s in snapshots.values()),
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+        "memory_bytes": sum(s["memory_bytes"] for s in snapshots.values()),
+        "max_bytes_per_process": int(TEMPLATE_CACHE_MAX_MB * 1024 * 1024),
+        "by_process": {str(pid): s for pid, s in snapshots.items()},
+    }
+
+
+cache = TemplateCache(
+    max_bytes=int(TEMPLATE_CACHE_MAX_MB * 1024 * 1024),
+    max_entries=TEMPLATE_CACHE_MAX_ENTRIES,
+)
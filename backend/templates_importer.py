@@ -1,15 +1,23 @@
 import os
 import re
 import json
-from groq import Groq
-from docx import Document
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from sqlalchemy.exc import IntegrityError
+import llm_scheduler
 import models
+import ooxml_scanner
 
 # Завантажуємо налаштування
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 MODEL_NAME = "llama-3.1-8b-instant"
+# Скільки питань до слотів генерувати одночасно (зверху ще обмежує llm_scheduler)
+IMPORT_LLM_CONCURRENCY = int(os.getenv("IMPORT_LLM_CONCURRENCY", "4"))
+
+TEMPLATES_DIR = "storage/templates"
+# Назви шаблонів для користувача: {"код_шаблону": "Назва"}, лежить поруч із .docx
+MANIFEST_NAME = "manifest.json"
 
 def extract_placeholders(text):
     """Знаходить {{KEY}} у тексті"""
@@ -53,12 +61,14 @@ PHRASE: "{processed_key}"
 JSON:
 """
     try:
-        response = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.1,
-            response_format={"type": "json_object"}
-        )
+        # Найнижчий пріоритет: імпорт не забирає слоти в розмовних ендпоінтів
+        with llm_scheduler.scheduler.slot(llm_scheduler.BACKGROUND):
+            response = client.chat.completions.create(
+                model=MODEL_NAME,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.1,
+                response_format={"type": "json_object"}
+            )
         raw = response.choices[0].message.content.strip()
         data = json.loads(raw)
 
@@ -71,50 +81,66 @@ JSON:
 
     return data
 
+def get_groq_client():
+    """None, якщо ключа немає — тоді схема шаблону лишається порожньою."""
+    if not GROQ_API_KEY:
+        return None
+    from groq import Groq  # важкий SDK — лише коли справді є що імпортувати
+    return Groq(api_key=GROQ_API_KEY)
+
+def generate_slot_questions(client, keys, concurrency: int = IMPORT_LLM_CONCURRENCY):
+    """Питання для кожного ключа, кілька запитів до LLM одночасно. Повертає {ключ: {"question": ...}}"""
+    keys = sorted(keys)
+    if not keys:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(keys)))) as executor:
+        infos = executor.map(lambda key: ask_llm_about_slot(client, key), keys)
+        # Зберігаємо під ОРИГІНАЛЬНИМ ключем (напр. "DIRECTOR_FULL_NAME")
+        return dict(zip(keys, infos))
+
 def generate_json_schema_for_docx(docx_path):
     """Генерує повну JSON схему для файлу"""
-    if not GROQ_API_KEY:
+    client = get_groq_client()
+    if client is None:
         print("⚠️ SKIPPING AI GENERATION: No GROQ_API_KEY found in .env")
         return {}
 
-    client = Groq(api_key=GROQ_API_KEY)
-    doc = Document(docx_path)
-    all_keys = set()
-
-    for para in doc.paragraphs:
-        all_keys.update(extract_placeholders(para.text))
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for para in cell.paragraphs:
-                    all_keys.update(extract_placeholders(para.text))
+    # Потоково з zip: без python-docx, разом з колонтитулами, виносками і текстовими полями
+    all_keys = ooxml_scanner.extract_keys(docx_path)
 
     print(f"🤖 AI аналізує {os.path.basename(docx_path)}... Знайдено {len(all_keys)} полів.")
 
-    slots = {}
-    for key in all_keys:
-        # 'key' тут - це ОРИГІНАЛЬНИЙ ключ (напр. "DIRECTOR_FULL_NAME")
-        info = ask_llm_about_slot(client, key)
+    return generate_slot_questions(client, all_keys)
 
-        # 4. Зберігаємо результат під ОРИГІНАЛЬНИМ ключем
-        slots[key] = info
+def load_manifest(folder: str = TEMPLATES_DIR, path: str | None = None) -> dict:
+    """Назви шаблонів з manifest.json папки (або з path). Немає файлу або він битий — порожній словник."""
+    path = path or os.path.join(folder, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"WARNING:   Не вдалося прочитати {path}: {e}")
+        return {}
+    if not isinstance(manifest, dict):
+        print(f"WARNING:   {path}: очікується об'єкт {{\"код\": \"назва\"}}")
+        return {}
+    return {str(code): str(name) for code, name in manifest.items()}
 
-    return slots
+def template_display_name(code: str, manifest: dict) -> str:
+    # Якщо коду немає в маніфесті — просто робимо красиву назву з файлу
+    return manifest.get(code) or code.replace("_", " ").title()
 
 def run_auto_import(db):
     """Головна функція: шукає файли і додає в БД"""
-    folder = "storage/templates"
+    folder = TEMPLATES_DIR
     if not os.path.exists(folder):
         os.makedirs(folder)
 
-    # === 1. СЛОВНИК НАЗВ ===
-    # Тут ви прописуєте, як називати кожен файл для користувача
-    TEMPLATE_NAMES = {
-        "nadannya_poslug": "Договір надання послуг (ФОП)",
-        "nda": "Угода про нерозголошення (NDA)",
-        "rent_apartment": "Договір оренди квартири",
-        # Додавайте нові файли сюди
-    }
+    # === 1. НАЗВИ ===
+    # Як називати кожен файл для користувача — у storage/templates/manifest.json
+    template_names = load_manifest(folder)
 
     # Перебираємо всі .docx файли в папці
     for filename in os.listdir(folder):
@@ -137,9 +163,7 @@ def run_auto_import(db):
         json_schema = generate_json_schema_for_docx(full_path)
 
         # === 2. ВИЗНАЧАЄМО НАЗВУ ===
-        # Якщо код є в нашому словнику - беремо українську назву.
-        # Якщо немає - просто робимо красиву назву з файлу.
-        nice_name = TEMPLATE_NAMES.get(code, code.replace("_", " ").title())
+        nice_name = template_display_name(code, template_names)
 
         # 3. Записуємо в Базу Даних
         new_template = models.ContractTemplate(
@@ -149,5 +173,11 @@ def run_auto_import(db):
             docx_path=full_path
         )
         db.add(new_template)
-        db.commit()
+        try:
+            db.commit()
+        except IntegrityError:
+            # Інший процес встиг додати цей шаблон раніше
+            db.rollback()
+            print(f"INFO:      Шаблон '{code}' вже додано іншим процесом.")
+            continue
         print(f"✅ Успішно додано: {nice_name}")
\ No newline at end of file
@@ -0,0 +1,61 @@
+"""
+Спільне оточення тестів: окрема тимчасова БД і сховище, без запису розмов, прогріву і prerender.
+Змінні мають бути виставлені до імпорту модулів backend — вони читають їх при імпорті.
+
+Запуск (з кореня репозиторію або з папки backend):
+    pip install -r backend/requirements-dev.txt
+    python -m pytest -q backend/tests
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DIR = tempfile.mkdtemp(prefix="contract-tests-")
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}"
+os.environ["GENERATED_DIR"] = os.path.join(TEST_DIR, "generated")
+os.environ["STARTUP_LOCK_PATH"] = os.path.join(TEST_DIR, ".startup.lock")
+os.environ["COMPACTION_LOCK_PATH"] = os.path.join(TEST_DIR, ".compaction.lock")
+os.environ["CONVERSATION_RECORD_DIR"] = ""
+os.environ["WARMUP_IMPORTS"] = "0"
+os.environ["PRERENDER_ENABLED"] = "0"
+os.environ["GROQ_API_KEY"] = ""
+os.environ["CODEMIE_API_KEY"] = "test"
+os.environ["LLM_SESSION_BURST"] = "1000000"
+# Рендер у потоці: ті самі черга і лічильники пулу, але без запуску процесів
+os.environ["RENDER_WORKERS"] = "0"
+
+# Модулі backend імпортуються плоско і шукають storage/templates відносно робочої папки
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def db(client):
+    import database
+
+    with database.SessionLocal() as session:
+        yield session
+
+
+@pytest.fixture
+def new_session(client):
+    def create(template_code: str = "nadannya_poslug") -> str:
+        response = client.post("/start_session", params={"template_code": template_code})
+        assert response.status_code == 200
+        return response.json()["session_id"]
+    return create
@@ -0,0 +1,16 @@
+"""Холодний старт у CI: ті самі перевірки, що й benchmarks/cold_start.py, з м'яким порогом часу."""
+
+import os
+
+from benchmarks import cold_start
+
+# Поріг з запасом на повільні CI-машини; точні заміри — python -m benchmarks.cold_start
+COLD_START_MAX_SECONDS = float(os.getenv("COLD_START_MAX_SECONDS", "15"))
+
+
+def test_import_main_does_not_load_heavy_sdks():
+    assert cold_start.heavy_modules_on_import() == []
+
+
+def test_server_answers_first_request_within_budget():
+    assert cold_start.time_to_first_request(cold_start.SERVE, timeout=COLD_START_MAX_SECONDS) < COLD_START_MAX_SECONDS
@@ -0,0 +1,50 @@
+import os
+from types import SimpleNamespace
+
+import conversation_recorder
+
+ANSWERS = {
+    "full_name_customer": "Шевченко Тарас Григорович",
+    "customer_iban": "UA213223130000026007233566001",
+    "customer_postal_address_and_zip_code": "м. Київ, вул. Хрещатик 1, 01001",
+}
+
+
+def message(role: str, content: str):
+    return SimpleNamespace(role=role, content=content)
+
+
+def recorded_text(directory) -> str:
+    files = [os.path.join(root, name) for root, _, names in os.walk(directory) for name in names]
+    assert len(files) == 1
+    with open(files[0], encoding="utf-8") as f:
+        return f.read()
+
+
+def test_values_from_stored_answers_are_scrubbed_on_a_fresh_recorder(tmp_path):
+    # Свіжий процес: таблиця замін порожня, значення відомі лише зі збережених відповідей
+    recorder = conversation_recorder.ConversationRecorder(str(tmp_path), b"test-salt")
+    history = [message("user", f"Замовник {ANSWERS['full_name_customer']}, IBAN {ANSWERS['customer_iban']}")]
+
+    for user_message in (f"Адреса: {ANSWERS['customer_postal_address_and_zip_code']}",
+                         f"Ще раз: {ANSWERS['full_name_customer'].upper()}"):
+        recorder.begin_turn("session-1", "nadannya_poslug", ANSWERS)
+        recorder.end_turn("session-1", user_message, history, {"phase": "collect"}, 0.1)
+        history.append(message("user", user_message))
+
+    text = recorded_text(tmp_path)
+    assert text.count('"type": "turn"') == 2
+    for value in ANSWERS.values():
+        assert value not in text
+        assert value.upper() not in text
+    assert "session-1" not in text
+
+
+def test_nothing_is_recorded_without_salt(tmp_path):
+    recorder = conversation_recorder.ConversationRecorder(str(tmp_path), b"")
+
+    recorder.begin_turn("session-2", "nadannya_poslug", ANSWERS)
+    recorder.end_turn("session-2", "привіт", [], {}, 0.1)
+
+    assert not recorder.enabled
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,82 @@
+import funnel_stats
+import main
+import models
+
+
+def funnel_counts(db) -> dict:
+    return {row.step: row.count for row in db.query(models.FunnelDailyStat).filter_by(template_code="nadannya_poslug")}
+
+
+def test_group_step_recorded_for_legacy_session_without_mask(client, db, new_session):
+    session_id = new_session()
+    session = db.get(models.ContractSession, session_id)
+    session.answers = {"city": "Київ"}
+    session.filled_mask = None   # сесія, створена до появи маски
+    db.commit()
+    first_group = main.get_session_groups("nadannya_poslug").groups[0]
+    before = funnel_counts(db).get(funnel_stats.group_step(first_group.id), 0)
+
+    response = client.post(f"/session/{session_id}/answer", params={"skip_validation": True},
+                           json={"enterprise": "ТОВ Ромашка", "date": "01.01.2025"})
+
+    assert response.status_code == 200
+    db.expire_all()
+    assert funnel_counts(db)[funnel_stats.group_step(first_group.id)] == before + 1
+
+
+def test_each_step_counted_once_per_session(client, db, new_session):
+    session_id = new_session()
+    first_group = main.get_session_groups("nadannya_poslug").groups[0]
+    step = funnel_stats.group_step(first_group.id)
+    before = funnel_counts(db).get(step, 0)
+
+    for answers in ({"city": "Київ", "enterprise": "ТОВ Ромашка", "date": "01.01.2025"}, {"city": "Львів"}):
+        client.post(f"/session/{session_id}/answer", params={"skip_validation": True}, json=answers)
+
+    db.expire_all()
+    assert funnel_counts(db)[step] == before + 1
+
+
+def test_progress_steps():
+    compiled = main.get_session_groups("nadannya_poslug")
+    first, second = compiled.groups[0], compiled.groups[1]
+
+    assert funnel_stats.progress_steps(compiled, 0, first.mask) == [funnel_stats.group_step(first.id)]
+    assert funnel_stats.progress_steps(compiled, first.mask, first.mask) == []
+    assert funnel_stats.progress_steps(compiled, first.mask, compiled.all_mask)[-1] == funnel_stats.STEP_REVIEW
+    assert funnel_stats.group_step(second.id) in funnel_stats.progress_steps(compiled, first.mask, compiled.all_mask)
+
+
+class RecordingSession:
+    """Замість БД іншого діалекту: збирає SQL, скомпільований під цей діалект."""
+
+    def __init__(self, dialect):
+        self.dialect = dialect
+        self.statements = []
+
+    def get_bind(self):
+        return self
+
+    def execute(self, statement):
+        self.statements.append(str(statement.compile(dialect=self.dialect)))
+
+
+def test_record_uses_the_upsert_of_the_configured_database():
+    from sqlalchemy.dialects import mysql, postgresql
+
+    for dialect, upsert in ((postgresql.dialect(), "ON CONFLICT"), (mysql.dialect(), "ON DUPLICATE KEY UPDATE")):
+        db = RecordingSession(dialect)
+        funnel_stats.record(db, "nadannya_poslug", funnel_stats.STEP_STARTED)
+        assert len(db.statements) == 1 and upsert in db.statements[0]
+
+
+def test_portable_increment_inserts_then_updates(db):
+    table = models.FunnelDailyStat.__table__
+    key = {"template_code": "portable_test", "day": models.utcnow().date(), "step": funnel_stats.STEP_STARTED}
+
+    for _ in range(3):
+        funnel_stats._update_then_insert(db, table, key)
+    db.commit()
+
+    counts = db.query(models.FunnelDailyStat.count).filter_by(template_code="portable_test").all()
+    assert counts == [(3,)]
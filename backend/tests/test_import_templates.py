@@ -0,0 +1,83 @@
+import json
+import os
+import shutil
+import sys
+
+import docx
+import pytest
+
+import database
+import field_registry
+import import_templates
+import models
+
+
+def make_docx(path, *placeholders: str):
+    document = docx.Document()
+    for key in placeholders:
+        document.add_paragraph(f"Поле: {{{{{key}}}}}")
+    document.save(str(path))
+
+
+def run_import(monkeypatch, folder, *args) -> int:
+    monkeypatch.setattr(sys, "argv", ["import_templates.py", str(folder), "--workers", "1", *args])
+    with pytest.raises(SystemExit) as exit_info:
+        import_templates.main()
+    return exit_info.value.code
+
+
+def test_verify_passes_on_shipped_templates(monkeypatch, client):
+    assert run_import(monkeypatch, "storage/templates", "--verify") == 0
+
+
+def test_verify_fails_on_broken_docx(monkeypatch, tmp_path, client):
+    shutil.copy("storage/templates/nadannya_poslug.docx", tmp_path)
+    (tmp_path / "broken.docx").write_bytes(b"not a zip archive")
+
+    assert run_import(monkeypatch, tmp_path, "--verify") == 1
+
+
+def test_verify_fails_on_invalid_key(monkeypatch, tmp_path, client):
+    make_docx(tmp_path / "bad_key_template.docx", "customer_edrpou", "ціна договору")
+
+    assert run_import(monkeypatch, tmp_path, "--verify") == 1
+
+
+def test_import_stores_absolute_path_registers_fields_and_reports_drift(monkeypatch, tmp_path, client):
+    folder = tmp_path / "library"
+    folder.mkdir()
+    monkeypatch.chdir(tmp_path)
+    make_docx(folder / "cli_import_test.docx", "buyer_edrpou", "city")
+
+    assert run_import(monkeypatch, "library") == 0
+
+    with database.SessionLocal() as db:
+        template = db.query(models.ContractTemplate).filter_by(code="cli_import_test").one()
+        assert template.docx_path == str(folder / "cli_import_test.docx")
+        # Як після імпорту з GROQ_API_KEY: поля в БД — ключі json_schema, а не поточний .docx
+        template.json_schema = {"buyer_edrpou": "ЄДРПОУ покупця?", "city": "Місто?"}
+        db.commit()
+    assert not field_registry.get_template("cli_import_test").validate({"buyer_edrpou": "1"})[0]
+
+    make_docx(folder / "cli_import_test.docx", "buyer_edrpou", "buyer_iban")
+    assert run_import(monkeypatch, "library", "--verify", "--json", "report.json") == 0
+
+    with open(tmp_path / "report.json", encoding="utf-8") as f:
+        item, = json.load(f)["templates"]
+    assert item["status"] == "changed"
+    assert (item["added_fields"], item["removed_fields"]) == (["buyer_iban"], ["city"])
+
+
+def test_report_flags_placeholders_the_renderer_does_not_fill(monkeypatch, tmp_path, client):
+    document = docx.Document()
+    document.add_paragraph("Поле: {{buyer_edrpou}}")
+    document.sections[0].header.paragraphs[0].text = "{{contract_number}}"
+    document.add_comment(document.paragraphs[0].runs, text="{{reviewer_note}}")
+    document.save(str(tmp_path / "comment_template.docx"))
+
+    assert run_import(monkeypatch, tmp_path, "--verify", "--json", str(tmp_path / "report.json")) == 0
+
+    with open(tmp_path / "report.json", encoding="utf-8") as f:
+        item, = json.load(f)["templates"]
+    assert set(item["placeholders"]) == {"buyer_edrpou", "contract_number"}
+    assert item["not_rendered"] == ["reviewer_note"]
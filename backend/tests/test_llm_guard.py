@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+import pytest
+
+import llm_guard
+import llm_scheduler
+
+
+def make_breaker(**kwargs) -> llm_guard.CircuitBreaker:
+    options = {"window": 10, "min_samples": 4, "error_rate_threshold": 0.5, "p95_threshold": 1.0, "cooldown": 60.0}
+    return llm_guard.CircuitBreaker(**{**options, **kwargs})
+
+
+def expire_cooldown(breaker: llm_guard.CircuitBreaker):
+    breaker._opened_at = time.monotonic() - breaker.cooldown - 1
+
+
+@pytest.fixture
+def guard(monkeypatch):
+    """Свіжі запобіжник і планувальник для кожного тесту."""
+    breaker = make_breaker()
+    scheduler = llm_scheduler.LLMScheduler(4, 1, session_rate=0.0, session_burst=5)
+    monkeypatch.setattr(llm_guard, "breaker", breaker)
+    monkeypatch.setattr(llm_scheduler, "scheduler", scheduler)
+    return breaker, scheduler
+
+
+def test_breaker_opens_on_error_rate():
+    breaker = make_breaker()
+    for ok in (True, False, False):
+        breaker.record(ok, 0.1)
+    assert breaker.snapshot()["state"] == breaker.CLOSED   # замало вибірок
+
+    breaker.record(False, 0.1)
+
+    assert breaker.snapshot()["state"] == breaker.OPEN
+    assert breaker.allow_request() == (False, False)
+
+
+def test_breaker_opens_on_p95_latency():
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record(True, 0.1)
+    breaker.record(True, 5.0)
+
+    assert breaker.snapshot()["state"] == breaker.OPEN
+
+
+def test_half_open_lets_through_a_single_probe():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(False, 0.1)
+    expire_cooldown(breaker)
+
+    assert breaker.allow_request() == (True, True)
+    assert breaker.allow_request() == (False, False)
+
+    breaker.record(False, 0.1, probe=True)
+    assert breaker.snapshot()["state"] == breaker.OPEN
+
+    expire_cooldown(breaker)
+    assert breaker.allow_request() == (True, True)
+    breaker.record(True, 0.1, probe=True)
+    assert breaker.snapshot() == {"state": breaker.CLOSED, "samples": 0, "error_rate": 0.0, "p95_latency": 0.0}
+
+
+def test_fallback_when_budget_exceeded(guard, monkeypatch):
+    breaker, scheduler = guard
+    monkeypatch.setitem(llm_guard.LATENCY_BUDGETS, "clarify", 0.05)
+
+    def slow_call():
+        time.sleep(0.3)
+        return "пізно"
+
+    async def run():
+        result = await llm_guard.run_with_budget("clarify", slow_call, "fallback", "session-budget")
+        # Виклик дозавершується у фоні й лише тоді звільняє слот і пише в запобіжник
+        while scheduler.stats()["running"]:
+            await asyncio.sleep(0.01)
+        return result
+
+    assert asyncio.run(run()) == "fallback"
+    assert breaker.snapshot()["samples"] == 1
+    assert breaker._error_rate() == 1.0
+
+
+def test_open_breaker_does_not_spend_session_tokens(guard):
+    breaker, scheduler = guard
+    for _ in range(4):
+        breaker.record(False, 0.1)
+    calls = []
+
+    async def run():
+        return [await llm_guard.run_with_budget("clarify", lambda: calls.append(1), "form", "session-open")
+                for _ in range(10)]
+
+    assert asyncio.run(run()) == ["form"] * 10
+    assert not calls
+    assert scheduler.stats()["tracked_sessions"] == 0
+    assert scheduler.stats()["classes"]["clarify"]["admitted"] == 0
+
+
+def test_probe_is_returned_when_session_is_rate_limited(guard):
+    breaker, scheduler = guard
+    for _ in range(4):
+        breaker.record(False, 0.1)
+    expire_cooldown(breaker)
+    for _ in range(5):
+        scheduler._take_token("session-limited", llm_scheduler.CLARIFY)
+
+    async def run():
+        with pytest.raises(llm_scheduler.SessionRateLimited):
+            await llm_guard.run_with_budget("clarify", lambda: "ok", "form", "session-limited")
+        return await llm_guard.run_with_budget("clarify", lambda: "ok", "form", "other-session")
+
+    # Пробний запит не "зависає": наступна сесія йде в LLM і замикає запобіжник
+    assert asyncio.run(run()) == "ok"
+    assert breaker.snapshot()["state"] == breaker.CLOSED
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+
+import pytest
+
+import llm_scheduler
+from llm_scheduler import BACKGROUND, CHAT, INTERACTIVE
+
+
+def make_scheduler(max_concurrency: int = 1, reserved: int = 0, rate: float = 0.0, burst: float = 100):
+    return llm_scheduler.LLMScheduler(max_concurrency, reserved, session_rate=rate, session_burst=burst)
+
+
+def test_interactive_overtakes_queued_background_work():
+    scheduler = make_scheduler(max_concurrency=1)
+    order = []
+
+    async def worker(name: str, priority: int):
+        assert await scheduler.acquire(priority, timeout=5)
+        order.append(name)
+        scheduler.release(priority)
+
+    async def scenario():
+        assert await scheduler.acquire(BACKGROUND)
+        background = [asyncio.create_task(worker(f"background-{i}", BACKGROUND)) for i in range(2)]
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(worker("interactive", INTERACTIVE))
+        await asyncio.sleep(0)
+        assert scheduler.stats()["queued"] == 3
+        scheduler.release(BACKGROUND)
+        await asyncio.gather(*background, interactive)
+
+    asyncio.run(scenario())
+
+    assert order == ["interactive", "background-0", "background-1"]
+
+
+def test_chat_is_refused_the_reserved_slot():
+    scheduler = make_scheduler(max_concurrency=2, reserved=1)
+
+    async def scenario():
+        assert await scheduler.acquire(CHAT)
+        # Вільний слот лишився, але він зарезервований для заповнення форми
+        assert not await scheduler.acquire(CHAT, timeout=0.05)
+        assert not await scheduler.acquire(BACKGROUND, timeout=0.05)
+        assert await scheduler.acquire(INTERACTIVE, timeout=0.05)
+
+    asyncio.run(scenario())
+
+    stats = scheduler.stats()
+    assert stats["running"] == 2
+    assert stats["classes"]["chat"]["timed_out_in_queue"] == 1
+    assert stats["classes"]["background"]["timed_out_in_queue"] == 1
+
+
+def test_session_rate_limit_reports_retry_after():
+    scheduler = make_scheduler(max_concurrency=10, rate=0.5, burst=2)
+
+    async def scenario():
+        for _ in range(2):
+            assert await scheduler.acquire(CHAT, "session-1")
+        with pytest.raises(llm_scheduler.SessionRateLimited) as limited:
+            await scheduler.acquire(CHAT, "session-1")
+        # Інша сесія має власний bucket
+        assert await scheduler.acquire(CHAT, "session-2")
+        return limited.value
+
+    limited = asyncio.run(scenario())
+
+    # Один токен при 0.5 токена/с — близько двох секунд
+    assert 1.9 <= limited.retry_after <= 2.0
+    assert scheduler.stats()["classes"]["chat"]["rate_limited"] == 1
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    scheduler = make_scheduler(max_concurrency=1)
+
+    async def scenario():
+        assert await scheduler.acquire(INTERACTIVE)
+        queued = asyncio.create_task(scheduler.acquire(INTERACTIVE))
+        await asyncio.sleep(0)
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        assert scheduler.stats()["queued"] == 0
+
+        # Слот видано саме в момент скасування — його треба повернути
+        granted_then_cancelled = asyncio.create_task(scheduler.acquire(INTERACTIVE))
+        await asyncio.sleep(0)
+        scheduler.release(INTERACTIVE)
+        granted_then_cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await granted_then_cancelled
+
+        assert scheduler.stats()["running"] == 0
+        assert await scheduler.acquire(INTERACTIVE, timeout=0.05)
+
+    asyncio.run(scenario())
+
+
+def test_sync_slot_waits_for_a_free_slot_and_releases_it():
+    scheduler = make_scheduler(max_concurrency=1)
+    entered = threading.Event()
+
+    def import_job():
+        with scheduler.slot(BACKGROUND):
+            entered.set()
+            raise RuntimeError("LLM впав")
+
+    async def scenario():
+        assert await scheduler.acquire(INTERACTIVE)
+        thread = threading.Thread(target=lambda: pytest.raises(RuntimeError, import_job))
+        thread.start()
+        assert not await asyncio.to_thread(entered.wait, 0.1)
+        scheduler.release(INTERACTIVE)
+        await asyncio.to_thread(thread.join, 5)
+
+    asyncio.run(scenario())
+
+    assert entered.is_set()
+    assert scheduler.stats()["running"] == 0
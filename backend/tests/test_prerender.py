@@ -0,0 +1,92 @@
+import asyncio
+import os
+
+import contract_store
+import database
+import main
+import models
+import prerender
+
+
+def set_answers(session_id: str, answers: dict) -> str:
+    with database.SessionLocal() as db:
+        session = db.get(models.ContractSession, session_id)
+        session.answers = answers
+        db.commit()
+        return contract_store.answers_fingerprint(session.template, answers)
+
+
+def prerender_once(session_id: str, fingerprint: str, render_func):
+    prerenderer = prerender.Prerenderer(enabled=True, delay=0)
+
+    async def run():
+        prerenderer.start(render_func)
+        try:
+            await prerenderer._run(session_id, prerender._Job(fingerprint))
+        finally:
+            prerenderer.stop()
+
+    asyncio.run(run())
+    return prerenderer.stats()
+
+
+def test_render_runs_without_holding_a_connection(new_session):
+    session_id = new_session()
+    fingerprint = set_answers(session_id, {"city": "Київ"})
+    checked_out = []
+
+    async def render(template_path, answers):
+        checked_out.append(database.engine.pool.checkedout())
+        return await main.render_to_store(template_path, answers)
+
+    stats = prerender_once(session_id, fingerprint, render)
+
+    assert checked_out == [0]
+    assert stats["completed"] == 1
+    with database.SessionLocal() as db:
+        contract = prerender.find_stored(db, session_id, fingerprint)
+        assert contract is not None and os.path.exists(contract.file_path)
+
+
+def test_result_for_outdated_answers_is_not_saved(new_session):
+    session_id = new_session()
+    fingerprint = set_answers(session_id, {"city": "Львів", "enterprise": "ТОВ Перший варіант"})
+    rendered_paths = []
+
+    async def render(template_path, answers):
+        result = await main.render_to_store(template_path, answers)
+        rendered_paths.append(result[1])
+        # Користувач виправив відповідь, поки документ рендерився
+        set_answers(session_id, {"city": "Львів", "enterprise": "ТОВ Другий варіант"})
+        return result
+
+    prerender_once(session_id, fingerprint, render)
+
+    with database.SessionLocal() as db:
+        assert prerender.find_stored(db, session_id, fingerprint) is None
+    assert not os.path.exists(rendered_paths[0])
+
+
+def test_document_serves_what_generate_returned_after_revert(client, new_session):
+    session_id = new_session()
+    original = {"city": "Київ", "enterprise": "ТОВ Оригінал"}
+    set_answers(session_id, original)
+    client.post(f"/session/{session_id}/generate")
+
+    # Правка → фоновий рендер нової версії → повернення до старих відповідей
+    edited = set_answers(session_id, {"city": "Київ", "enterprise": "ТОВ Правка"})
+    prerender_once(session_id, edited, main.render_to_store)
+    set_answers(session_id, original)
+    generated = client.post(f"/session/{session_id}/generate")
+
+    document = client.get(f"/session/{session_id}/document")
+    assert document.headers["etag"] == generated.headers["etag"]
+    assert document.content == generated.content
+
+
+def test_document_is_not_served_from_prerender_alone(client, new_session):
+    session_id = new_session()
+    fingerprint = set_answers(session_id, {"city": "Київ"})
+    prerender_once(session_id, fingerprint, main.render_to_store)
+
+    assert client.get(f"/session/{session_id}/document").status_code == 404
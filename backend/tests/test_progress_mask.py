@@ -0,0 +1,40 @@
+import main
+import models
+
+
+def test_mask_from_other_field_layout_is_recomputed_from_answers(client, db, new_session):
+    session_id = new_session()
+    session = db.get(models.ContractSession, session_id)
+    compiled = main.get_session_groups(session.template.code)
+    session.answers = {"city": "Київ", "enterprise": "ТОВ Ромашка", "date": "01.01.2025"}
+    # Маска, збережена до зміни порядку полів у field_groups: ті самі біти означали інші поля
+    session.filled_bits = compiled.all_mask
+    session.filled_mask_layout = "old-layout"
+    db.commit()
+
+    progress = client.get(f"/session/{session_id}/progress").json()
+
+    assert progress["filled"] == 3
+    assert progress["current_group"] == compiled.groups[1].id
+
+
+def test_new_and_updated_sessions_store_current_layout(client, db, new_session, monkeypatch):
+    session_id = new_session()
+    compiled = main.get_session_groups("nadannya_poslug")
+    assert db.get(models.ContractSession, session_id).filled_mask_layout == compiled.layout
+
+    response = client.post(f"/session/{session_id}/answer", json={"city": "Львів"}, params={"skip_validation": True})
+    assert response.status_code == 200
+    db.expire_all()
+    session = db.get(models.ContractSession, session_id)
+    assert session.filled_mask_layout == compiled.layout
+    assert session.filled_bits == compiled.mask_for(["city"])
+
+
+def test_listing_hides_progress_of_stale_mask():
+    compiled = main.get_session_groups("nadannya_poslug")
+    mask = format(compiled.mask_for(["city"]), "x")
+
+    assert main.mask_progress_percent("nadannya_poslug", mask, compiled.layout) is not None
+    assert main.mask_progress_percent("nadannya_poslug", mask, "old-layout") is None
+    assert main.mask_progress_percent("nadannya_poslug", mask, None) is None
@@ -0,0 +1,106 @@
+"""
+Корпус для zip-рендера (ooxml_renderer): кожен шаблон із storage/templates (або з папки
+RENDER_CORPUS_DIR — напр. робочої бібліотеки перед RENDER_ENGINE=zip) рендериться обома
+рушіями, і результат має збігатися з python-docx за текстом і покриттям плейсхолдерів.
+"""
+
+import glob
+import os
+import zipfile
+
+import pytest
+
+import ooxml_scanner
+import services
+
+TEMPLATES = sorted(glob.glob(os.path.join(os.getenv("RENDER_CORPUS_DIR", "storage/templates"), "*.docx")))
+
+
+def document_texts(path: str) -> dict:
+    """{частина: [текст параграфа, ...]} для всіх частин з текстом (тіло, колонтитули, виноски)."""
+    with zipfile.ZipFile(path) as zf:
+        assert zf.testzip() is None
+        texts = {}
+        for part in ooxml_scanner.iter_content_parts(zf):
+            with zf.open(part) as stream:
+                texts[part] = [text for _, text in ooxml_scanner.iter_paragraph_texts(stream)]
+        return texts
+
+
+def render_both(template: str, answers: dict, tmp_path) -> tuple[str, str]:
+    zip_out = services.generate_contract_docx(template, answers, str(tmp_path / "zip.docx"), engine="zip")
+    docx_out = services.generate_contract_docx(template, answers, str(tmp_path / "docx.docx"), engine="python-docx")
+    return zip_out, docx_out
+
+
+def test_corpus_is_not_empty():
+    assert TEMPLATES
+
+
+@pytest.mark.parametrize("template", TEMPLATES)
+def test_zip_engine_matches_python_docx_with_all_answers(template, tmp_path):
+    keys = sorted(ooxml_scanner.extract_keys(template))
+    answers = {key: f"Значення {index} для {key}" for index, key in enumerate(keys)}
+
+    zip_out, docx_out = render_both(template, answers, tmp_path)
+
+    zip_texts = document_texts(zip_out)
+    assert zip_texts == document_texts(docx_out)
+    # Обидва рушії заповнюють тіло і колонтитули; виноски й коментарі лишаються як є
+    rendered = {part: "\n".join(texts) for part, texts in zip_texts.items()
+                if ooxml_scanner.RENDERED_PART_RE.match(part)}
+    for key, places in ooxml_scanner.scan_placeholders(template).items():
+        for place in places:
+            if place["part"] in rendered:
+                assert answers[key] in rendered[place["part"]]
+    assert not ooxml_scanner.extract_keys(zip_out)
+
+
+@pytest.mark.parametrize("template", TEMPLATES)
+def test_zip_engine_leaves_unanswered_placeholders_like_python_docx(template, tmp_path):
+    keys = sorted(ooxml_scanner.extract_keys(template))
+    answers = {key: "X" for key in keys[::2]}
+
+    zip_out, docx_out = render_both(template, answers, tmp_path)
+
+    assert document_texts(zip_out) == document_texts(docx_out)
+    assert ooxml_scanner.extract_keys(zip_out) == ooxml_scanner.extract_keys(docx_out)
+    assert set(keys[1::2]) <= ooxml_scanner.extract_keys(zip_out)
+
+
+@pytest.mark.parametrize("template", TEMPLATES)
+def test_zip_engine_copies_other_parts_unchanged(template, tmp_path):
+    zip_out, _ = render_both(template, {}, tmp_path)
+
+    with zipfile.ZipFile(template) as source, zipfile.ZipFile(zip_out) as rendered:
+        assert source.namelist() == rendered.namelist()
+        for name in source.namelist():
+            if name != "word/document.xml":
+                assert source.read(name) == rendered.read(name), name
+
+
+def test_header_and_footer_placeholders_are_fields_and_get_rendered(tmp_path):
+    import docx
+
+    document = docx.Document()
+    document.add_paragraph("Договір {{contract_number}}")
+    section = document.sections[0]
+    section.header.paragraphs[0].text = "Замовник: {{customer_short_name}}"
+    section.footer.paragraphs[0].text = "Сторінка для {{contract_number}}"
+    document.add_comment(document.paragraphs[0].runs, text="Перевірити {{reviewer_note}}")
+    template = str(tmp_path / "with_header.docx")
+    document.save(template)
+
+    assert ooxml_scanner.extract_keys(template) == {"contract_number", "customer_short_name"}
+    assert "reviewer_note" in ooxml_scanner.scan_placeholders(template)
+
+    answers = {"contract_number": "№ 17", "customer_short_name": "ТОВ Ромашка"}
+    zip_out, docx_out = render_both(template, answers, tmp_path)
+
+    texts = document_texts(zip_out)
+    assert texts == document_texts(docx_out)
+    headers = "\n".join(text for part, lines in texts.items() if "header" in part or "footer" in part
+                        for text in lines)
+    assert "Замовник: ТОВ Ромашка" in headers and "Сторінка для № 17" in headers
+    assert ooxml_scanner.extract_keys(zip_out) == set()
+    assert set(ooxml_scanner.scan_placeholders(zip_out)) == {"reviewer_note"}
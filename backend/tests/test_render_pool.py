@@ -0,0 +1,90 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+import render_pool
+import template_cache
+
+
+def wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_cancelled_render_holds_its_slot_until_the_job_finishes(tmp_path, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_job(submitted_at, template_path, answers, output_path):
+        started.set()
+        release.wait(5)
+        with open(output_path, "wb") as f:
+            f.write(b"docx")
+        return 0.0, 0.0, os.getpid(), {}
+
+    monkeypatch.setattr(render_pool, "_render_job", slow_job)
+    pool = render_pool.RenderPool(workers=0, queue_size=0, mp_context="spawn")
+    output = tmp_path / "out.docx"
+
+    async def scenario():
+        task = asyncio.create_task(pool.render("template.docx", {}, str(output)))
+        await asyncio.to_thread(started.wait, 5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # Клієнт пішов, але воркер ще рендерить — місця в черзі немає
+        assert pool.busy
+        with pytest.raises(render_pool.RenderQueueFull):
+            await pool.render("template.docx", {}, str(tmp_path / "other.docx"))
+
+    asyncio.run(scenario())
+    release.set()
+    wait_until(lambda: not pool.busy)
+    wait_until(lambda: not output.exists())
+    assert pool.stats()["queue_depth"] == 0
+    pool.shutdown()
+
+
+def test_generate_renders_once_and_serves_stored_document(client, new_session):
+    session_id = new_session()
+    client.post(f"/session/{session_id}/answer", json={"city": "Київ"}, params={"skip_validation": True})
+
+    first = client.post(f"/session/{session_id}/generate")
+    assert first.status_code == 200
+    assert first.content[:2] == b"PK"
+    second = client.post(f"/session/{session_id}/generate")
+    assert second.headers["etag"] == first.headers["etag"]
+    assert client.get(f"/session/{session_id}/document").content == first.content
+
+
+def test_template_cache_stats_come_from_render_workers(tmp_path):
+    # Справжній процес: кеш шаблонів живе у воркері, а не в процесі сервера
+    pool = render_pool.RenderPool(workers=1, queue_size=2, mp_context="spawn")
+
+    async def scenario():
+        for name in ("first.docx", "second.docx"):
+            await pool.render("storage/templates/nadannya_poslug.docx", {"city": "Київ"}, str(tmp_path / name))
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+
+    worker_stats = pool.template_cache_stats()
+    assert len(worker_stats) == 1 and os.getpid() not in worker_stats
+    combined = template_cache.combined_stats(worker_stats)
+    assert (combined["hits"], combined["misses"], combined["entries"]) == (1, 1, 1)
+    assert combined["memory_bytes"] > 0
+
+
+def test_template_cache_endpoint_reports_render_processes(client, new_session):
+    client.post(f"/session/{new_session()}/generate")
+
+    stats = client.get("/admin/template_cache").json()
+
+    assert stats["processes"] == 1
+    assert stats["hits"] + stats["misses"] >= 1
@@ -0,0 +1,20 @@
+import request_profiler
+
+
+def scope(*headers):
+    return {"type": "http", "headers": list(headers)}
+
+
+def test_sampling_needs_pyinstrument(monkeypatch):
+    monkeypatch.setattr(request_profiler, "PROFILE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(request_profiler, "PROFILE_TOKEN", "secret")
+    monkeypatch.setattr(request_profiler, "pyinstrument", None)
+
+    # Без pyinstrument лишився б cProfile на весь цикл подій — вибірку вимкнено
+    assert not request_profiler._wants_profile(scope())
+    assert request_profiler.stats()["sample_rate"] == 0.0
+    # Явний запит з токеном профілюється і через cProfile
+    assert request_profiler._wants_profile(scope((b"x-profile", b"secret")))
+
+    monkeypatch.setattr(request_profiler, "pyinstrument", object())
+    assert request_profiler._wants_profile(scope())
@@ -0,0 +1,63 @@
+import os
+import time
+from datetime import timedelta
+
+import contract_store
+import models
+import session_compaction
+
+
+def stored_file(content: bytes) -> tuple[str, str]:
+    tmp_path = contract_store.new_temp_path()
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    content_hash, path, _ = contract_store.store_file(tmp_path)
+    return content_hash, path
+
+
+def add_contract(db, session_id: str, content_hash: str, path: str):
+    db.add(models.GeneratedContract(session_id=session_id, file_path=path, content_hash=content_hash, answers_hash="x"))
+
+
+def make_old(db, session_id: str, hours: float):
+    db.query(models.ContractSession).filter(models.ContractSession.id == session_id).update(
+        {"updated_at": models.utcnow() - timedelta(hours=hours)}, synchronize_session=False
+    )
+
+
+def test_expired_drafts_remove_only_unshared_files(db, new_session):
+    draft, other = new_session(), new_session()
+    only_draft = stored_file(b"prerendered draft")
+    shared = stored_file(b"same contract text")
+    add_contract(db, draft, *only_draft)
+    add_contract(db, draft, *shared)
+    add_contract(db, other, *shared)
+    make_old(db, draft, session_compaction.SESSION_DRAFT_TTL_HOURS + 1)
+    db.commit()
+
+    assert session_compaction.expire_stale_drafts(db, models.utcnow()) >= 1
+
+    assert db.get(models.ContractSession, draft) is None
+    assert not os.path.exists(only_draft[1])
+    assert os.path.exists(shared[1])
+
+
+def test_garbage_collection_keeps_referenced_and_fresh_files(db, new_session):
+    session_id = new_session()
+    referenced = stored_file(b"referenced")
+    add_contract(db, session_id, *referenced)
+    db.commit()
+    orphan = stored_file(b"orphan from before cleanup existed")
+    fresh_orphan = stored_file(b"row not committed yet")
+    leftover_tmp = contract_store.new_temp_path()
+    old = time.time() - contract_store.STORE_GC_GRACE_SECONDS - 60
+    for path in (referenced[1], orphan[1], leftover_tmp):
+        os.utime(path, (old, old))
+
+    removed = contract_store.collect_garbage(db)
+
+    assert removed >= 2
+    assert os.path.exists(referenced[1])
+    assert os.path.exists(fresh_orphan[1])
+    assert not os.path.exists(orphan[1])
+    assert not os.path.exists(leftover_tmp)
@@ -0,0 +1,75 @@
+import uuid
+from datetime import datetime, timedelta
+
+import models
+import session_listing
+
+
+def add_sessions(db, user_id: int, updated: list[datetime], archived: bool = False) -> list[str]:
+    template = db.query(models.ContractTemplate).filter_by(code="nadannya_poslug").one()
+    ids = []
+    for updated_at in updated:
+        session_id = str(uuid.uuid4())
+        if archived:
+            db.add(models.ArchivedSession(id=session_id, template_code=template.code, user_id=user_id,
+                                          status="completed", answers={}, created_at=updated_at, updated_at=updated_at))
+        else:
+            db.add(models.ContractSession(id=session_id, template_id=template.id, user_id=user_id, answers={},
+                                          created_at=updated_at, updated_at=updated_at))
+        ids.append(session_id)
+    db.commit()
+    return ids
+
+
+def all_pages(db, user_id: int, limit: int) -> list[list[dict]]:
+    pages, cursor = [], None
+    while True:
+        page = session_listing.list_sessions(db, user_id=user_id, cursor=cursor, limit=limit)
+        pages.append(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_pages_cover_ties_across_active_and_archived_exactly_once(db):
+    user_id = 3601
+    same_time = datetime(2025, 5, 1, 12, 0, 0)
+    ids = add_sessions(db, user_id, [same_time] * 4)
+    ids += add_sessions(db, user_id, [same_time] * 3, archived=True)
+    ids += add_sessions(db, user_id, [same_time - timedelta(seconds=1), same_time + timedelta(seconds=1)])
+
+    pages = all_pages(db, user_id, limit=2)
+
+    listed = [item["id"] for page in pages for item in page]
+    assert sorted(listed) == sorted(ids)
+    assert all(len(page) == 2 for page in pages[:-1])
+    keys = [(item["updated_at"], item["id"]) for page in pages for item in page]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_next_cursor_only_when_more_rows_exist(db):
+    user_id = 3602
+    start = datetime(2025, 6, 1)
+    add_sessions(db, user_id, [start + timedelta(minutes=i) for i in range(3)])
+
+    exact = session_listing.list_sessions(db, user_id=user_id, limit=3)
+    assert len(exact["items"]) == 3 and exact["next_cursor"] is None
+
+    first = session_listing.list_sessions(db, user_id=user_id, limit=2)
+    assert len(first["items"]) == 2 and first["next_cursor"]
+    last = session_listing.list_sessions(db, user_id=user_id, limit=2, cursor=first["next_cursor"])
+    assert len(last["items"]) == 1 and last["next_cursor"] is None
+
+
+def test_date_window_is_half_open(db):
+    user_id = 3603
+    start = datetime(2025, 7, 1)
+    add_sessions(db, user_id, [start, start + timedelta(days=1)])
+
+    page = session_listing.list_sessions(db, user_id=user_id, date_from=start, date_to=start + timedelta(days=1))
+
+    assert [item["updated_at"] for item in page["items"]] == [start]
+
+
+def test_invalid_cursor_is_rejected(client):
+    assert client.get("/sessions", params={"cursor": "not-a-cursor"}).status_code == 400
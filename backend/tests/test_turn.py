@@ -0,0 +1,110 @@
+import main
+
+
+def fake_collect(ai_data: dict):
+    async def ask_collect(*args, **kwargs):
+        return ai_data
+    return ask_collect
+
+
+def turn(client, session_id: str, text: str) -> dict:
+    response = client.post(f"/session/{session_id}/turn", json={"user_message": text, "chat_history": []})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_turn_saves_extracted_fields(client, new_session, monkeypatch):
+    session_id = new_session()
+    monkeypatch.setattr(main, "ask_collect", fake_collect({"action": "extract", "fields": {"city": "Київ"}}))
+    monkeypatch.setattr(main, "ask_clarification", fake_collect({"message": "А підприємство і дата?"}))
+
+    data = turn(client, session_id, "Київ")
+
+    assert data["updated_fields"] == ["city"]
+    assert data["current_answers"]["city"] == "Київ"
+    assert {"type": "system", "text": "Дані записано ✓"} in data["messages"]
+
+
+def test_turn_with_nothing_extracted_does_not_claim_saved(client, new_session, monkeypatch):
+    session_id = new_session()
+    monkeypatch.setattr(main, "ask_collect", fake_collect({"action": "extract", "fields": {"city": "  ", "date": None}}))
+
+    data = turn(client, session_id, "не знаю")
+
+    assert data["updated_fields"] == []
+    assert not data["current_answers"]
+    assert all(m["type"] != "system" for m in data["messages"])
+    # Без повідомлення від LLM — питаємо поля групи ще раз
+    assert data["messages"][-1]["type"] == "bot"
+    assert "Будь ласка, вкажіть" in data["messages"][-1]["text"]
+
+
+def test_concurrent_turns_of_one_session_keep_both_answers(new_session, monkeypatch):
+    import asyncio
+
+    import database
+
+    session_id = new_session()
+    both_asked = asyncio.Event()
+    extracted = iter([{"city": "Одеса"}, {"enterprise": "ТОВ Ромашка"}])
+    asked = []
+
+    async def ask_collect(*args, **kwargs):
+        # Обидва ходи завантажили сесію і чекають на LLM одночасно
+        asked.append(1)
+        fields = next(extracted)
+        if len(asked) == 2:
+            both_asked.set()
+        await both_asked.wait()
+        return {"action": "extract", "fields": fields}
+
+    monkeypatch.setattr(main, "ask_collect", ask_collect)
+    monkeypatch.setattr(main, "ask_clarification", fake_collect({"message": "Що ще?"}))
+
+    async def one_turn(text: str):
+        with database.SessionLocal() as db:
+            session = await asyncio.to_thread(main.load_session, db, session_id)
+            await main.run_turn(db, session, text, [])
+
+    async def run():
+        await asyncio.gather(one_turn("Одеса"), one_turn("ТОВ Ромашка"))
+
+    asyncio.run(run())
+
+    with database.SessionLocal() as db:
+        session = main.load_session(db, session_id)
+        assert session.answers == {"city": "Одеса", "enterprise": "ТОВ Ромашка"}
+        compiled = main.get_session_groups(session.template.code)
+        assert session.filled_bits == compiled.mask_for(["city", "enterprise"])
+
+
+def test_turn_runs_no_queries_on_the_event_loop(new_session, monkeypatch):
+    import asyncio
+    import threading
+
+    from sqlalchemy import event
+
+    import database
+
+    session_id = new_session()
+    monkeypatch.setattr(main, "ask_collect", fake_collect({"action": "extract", "fields": {"city": "Київ"}}))
+    monkeypatch.setattr(main, "ask_clarification", fake_collect({"message": "А підприємство?"}))
+    query_threads = []
+
+    def remember_thread(*args):
+        query_threads.append(threading.get_ident())
+
+    async def run():
+        with database.SessionLocal() as db:
+            session = await asyncio.to_thread(main.load_session, db, session_id)
+            event.listen(database.engine, "before_cursor_execute", remember_thread)
+            try:
+                await main.run_turn(db, session, "Київ", [])
+            finally:
+                event.remove(database.engine, "before_cursor_execute", remember_thread)
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+
+    assert query_threads
+    assert loop_thread not in query_threads
@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+import pytest
+
+import field_registry
+import validation
+
+
+def error_fields(errors: list) -> set:
+    return {error["field"] for error in errors}
+
+
+@pytest.mark.parametrize("code", [12345678, "12345678", " 12345678 ", 1234567890])
+def test_edrpou_accepts_int_and_str(code):
+    is_valid, errors = field_registry.get_template("nadannya_poslug").validate({"customer_edrpou": code})
+
+    assert "customer_edrpou" not in error_fields(errors)
+
+
+@pytest.mark.parametrize("code", [1234567, "1234567", "1234abcd"])
+def test_edrpou_rejects_wrong_codes(code):
+    is_valid, errors = field_registry.get_template("nadannya_poslug").validate({"customer_edrpou": code})
+
+    assert not is_valid
+    assert "customer_edrpou" in error_fields(errors)
+
+
+def test_auto_schema_edrpou_coerces_int():
+    model = validation.build_schema_model("imported_test", ["buyer_edrpou", "seller_edrpou"])
+
+    assert model(buyer_edrpou=87654321).buyer_edrpou == "87654321"
+    is_valid, errors = validation.validate_with_schema(model, {"buyer_edrpou": 87654321, "seller_edrpou": 123})
+    assert not is_valid
+    assert error_fields(errors) == {"seller_edrpou"}
+
+
+def test_reimported_template_with_other_fields_is_reregistered():
+    template = SimpleNamespace(code="reimported_test", json_schema={"buyer_edrpou": "ЄДРПОУ"}, docx_path=None)
+    field_registry.ensure_registered(template)
+    assert not field_registry.get_template(template.code).validate({"buyer_edrpou": "1"})[0]
+
+    # Інший процес переімпортував шаблон: код той самий, поля інші
+    template.json_schema = {"buyer_iban": "IBAN"}
+    field_registry.ensure_registered(template)
+
+    compiled = field_registry.get_template(template.code)
+    assert compiled.validate({"buyer_edrpou": "1"})[0]
+    assert not compiled.validate({"buyer_iban": "1"})[0]
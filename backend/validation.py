@@ -1,6 +1,8 @@
-from pydantic import BaseModel, Field, AfterValidator, ValidationError, field_validator
+from pydantic import BaseModel, ConfigDict, Field, AfterValidator, BeforeValidator, ValidationError, create_model, field_validator
 from typing_extensions import Annotated
-from typing import Dict, Type
+from typing import Dict, Iterable, Type
+import hashlib
+import keyword
 import re
 
 # --- 1. М'ЯКІ ВАЛІДАТОРИ (Виправляють, а не сварять) ---
@@ -100,7 +102,8 @@ SoftPIB = Annotated[str, AfterValidator(validate_pib_soft)]
 SoftCity = Annotated[str, AfterValidator(validate_city_soft)]
 SimpleAddress = Annotated[str, AfterValidator(validate_address_simple)]
 UaPhoneType = Annotated[str, AfterValidator(validate_ua_phone)]
-ValidOrganizationCode = Annotated[str, AfterValidator(validate_edrpou_tin_checksum)]
+# LLM часто повертає код числом: без приведення до рядка pydantic відхиляє int ще до перевірки
+ValidOrganizationCode = Annotated[str, BeforeValidator(str), AfterValidator(validate_edrpou_tin_checksum)]
 SimpleIban = Annotated[str, AfterValidator(validate_iban_simple)]
 
 # --- 3. СХЕМА ДОГОВОРУ ---
@@ -120,8 +123,9 @@ class NadannyaPoslugSchema(BaseModel):
     performer_phone_number: UaPhoneType
 
     # Реквізити
-    customer_edrpou: ValidOrganizationCode = Field(alias="customer_unified_state_register_of_organizations")
-    performer_edrpou: ValidOrganizationCode = Field(alias="performer_unified_state_register_of_organizations")
+    # Ключі як у шаблоні .docx: з аліасом помилки приходили під іншим ключем і відкидались
+    customer_edrpou: ValidOrganizationCode = Field(description="ЄДРПОУ Замовника")
+    performer_edrpou: ValidOrganizationCode = Field(description="ЄДРПОУ Виконавця")
 
     customer_iban: SimpleIban
     performer_iban: SimpleIban
@@ -158,10 +162,65 @@ TEMPLATE_REGISTRY: Dict[str, Type[BaseModel]] = {
     "Надання_послуг": NadannyaPoslugSchema,
 }
 
-# --- 5. ГОЛОВНА ФУНКЦІЯ ВАЛІДАЦІЇ ---
-
-def validate_session_answers(template_code: str, answers: dict):
+# --- 5. АВТО-СХЕМИ ДЛЯ ІМПОРТОВАНИХ ШАБЛОНІВ ---
+# Для шаблонів без ручної схеми тип поля вгадується з назви плейсхолдера.
+# Поля, які не підпадають під жодне правило, не перевіряються.
+
+FIELD_NAME_RULES = (
+    (re.compile(r"(^|_)iban($|_)"), SimpleIban),
+    (re.compile(r"phone"), UaPhoneType),
+    (re.compile(r"edrpou|unified_state_register|(^|_)(tin|ipn|inn)($|_)"), ValidOrganizationCode),
+    (re.compile(r"(^|_)full_name($|_)|(^|_)pib($|_)"), SoftPIB),
+    (re.compile(r"(^|_)city($|_)"), SoftCity),
+    (re.compile(r"address"), SimpleAddress),
+)
+
+def guess_field_type(field_name: str):
+    for pattern, field_type in FIELD_NAME_RULES:
+        if pattern.search(field_name):
+            return field_type
+    return None
+
+def schema_hash(field_names: Iterable[str]) -> str:
+    return hashlib.sha256("\n".join(sorted(field_names)).encode()).hexdigest()
+
+def build_schema_model(template_code: str, field_names: Iterable[str]) -> Type[BaseModel] | None:
+    """pydantic-модель з полів, для яких є правило. None — якщо перевіряти нічого."""
+    fields = {}
+    for name in field_names:
+        field_type = guess_field_type(name)
+        if field_type is None or not name.isidentifier() or keyword.iskeyword(name) or name.startswith("_"):
+            continue
+        fields[name] = (field_type | None, None)
+    if not fields:
+        return None
+    return create_model(
+        f"AutoSchema_{template_code}",
+        __config__=ConfigDict(extra="ignore"),
+        **fields
+    )
+
+# Ключ — хеш набору полів: шаблони з однаковими полями ділять одну модель,
+# а зміна полів після переімпорту дає нову
+_AUTO_SCHEMAS: Dict[str, Type[BaseModel] | None] = {}
+
+def get_schema_model(template_code: str, field_names: Iterable[str] = ()) -> Type[BaseModel] | None:
+    """Ручна схема з TEMPLATE_REGISTRY, інакше — авто-схема з назв полів (будується один раз)."""
     schema_class = TEMPLATE_REGISTRY.get(template_code)
+    if schema_class is not None:
+        return schema_class
+
+    field_names = sorted({name.lower() for name in field_names})
+    key = schema_hash(field_names)
+    if key not in _AUTO_SCHEMAS:
+        _AUTO_SCHEMAS[key] = build_schema_model(template_code, field_names)
+    return _AUTO_SCHEMAS[key]
+
+# --- 6. ГОЛОВНА ФУНКЦІЯ ВАЛІДАЦІЇ ---
+# Схему шаблону шукає field_registry.get_template(code).validate — тут тільки сама перевірка
+
+def validate_with_schema(schema_class: Type[BaseModel] | None, answers: dict):
+    """Повертає (is_valid, errors). Без схеми — все валідно."""
     if not schema_class:
         return True, []
 
@@ -340,6 +340,7 @@ const styles = `
 `;
 
 const API_URL = "http://127.0.0.1:8000";
+const WS_URL = API_URL.replace(/^http/, "ws");
 
 function App() {
   const [step, setStep] = useState("welcome");
@@ -361,6 +362,11 @@ function App() {
   const [downloadUrl, setDownloadUrl] = useState(null);
 
   const messagesEndRef = useRef(null);
+  // WebSocket-канал сесії: один хід = одне повідомлення, історію тримає сервер.
+  // Якщо з'єднання немає — працюємо через REST, як раніше.
+  const wsRef = useRef(null);
+
+  useEffect(() => () => wsRef.current?.close(), []);
 
   useEffect(() => {
     fetch(`${API_URL}/templates`)
@@ -393,6 +399,7 @@ function App() {
       ]);
 
       setStep("chat");
+      openChannel(data.session_id);
     } catch (e) {
       console.error(e);
       alert("Помилка старту сесії");
@@ -400,6 +407,58 @@ function App() {
     setLoading(false);
   };
 
+  const openChannel = (id) => {
+    wsRef.current?.close();
+    const ws = new WebSocket(`${WS_URL}/session/${id}/ws`);
+    wsRef.current = ws;
+
+    ws.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      switch (data.type) {
+        case "message":
+          setMessages((prev) => [...prev, data.message]);
+          break;
+        case "progress":
+          if (data.progress) setCurrentGroupIndex(data.progress.current_group_index);
+          break;
+        case "phase":
+          // Кінець ходу
+          if (data.phase === "review") setIsReviewMode(true);
+          if (data.phase === "generate") {
+            setMessages((prev) => [...prev, { type: "system", text: "Генерую файл..." }]);
+          } else {
+            setLoading(false);
+          }
+          break;
+        case "document_ready":
+          setDownloadUrl(data.session_id);
+          setMessages((prev) => [...prev, { type: "bot", text: "Готово! Натисніть кнопку нижче." }]);
+          setLoading(false);
+          break;
+        case "error":
+          setMessages((prev) => [
+            ...prev,
+            {
+              type: "error",
+              text:
+                data.code === "rate_limited"
+                  ? `Забагато повідомлень поспіль. Спробуйте через ${data.retry_after} с.`
+                  : "Помилка сервера",
+            },
+          ]);
+          setLoading(false);
+          break;
+        default:
+          break;
+      }
+    };
+
+    ws.onclose = () => {
+      if (wsRef.current === ws) wsRef.current = null;
+      setLoading(false);
+    };
+  };
+
   const handleSend = async () => {
     if (!inputValue.trim()) return;
     const text = inputValue;
@@ -407,6 +466,12 @@ function App() {
     setMessages((prev) => [...prev, { type: "user", text }]);
     setLoading(true);
 
+    if (wsRef.current?.readyState === WebSocket.OPEN) {
+      // Відповіді прийдуть подіями в openChannel
+      wsRef.current.send(JSON.stringify({ type: "message", text }));
+      return;
+    }
+
     try {
       // Підготовка історії чату (потрібна і для збору, і для перевірки)
       const chatHistory = messages.map((m) => ({
@@ -595,7 +660,7 @@ function App() {
 
   const handleDownload = async () => {
     try {
-      const res = await fetch(`${API_URL}/session/${downloadUrl}/generate`, { method: "POST" });
+      const res = await fetch(`${API_URL}/session/${downloadUrl}/document`);
       if (!res.ok) throw new Error("Download failed");
 
       const blob = await res.blob();